@@ -0,0 +1,250 @@
+import csv
+import io
+import logging
+import random
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from database_config import DatabaseManager, DatabaseError, DRIVER_ERRORS, PERSON_COLUMNS
+from utils.enums import ReferenceTables
+
+MALE_SURNAMES = [
+    "Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов",
+    "Михайлов", "Новиков", "Федоров", "Морозов", "Волков", "Алексеев", "Лебедев",
+    "Семенов", "Егоров", "Павлов", "Козлов", "Степанов", "Николаев", "Орлов",
+    "Андреев", "Макаров", "Никитин", "Захаров", "Зайцев", "Соловьев", "Борисов",
+    "Яковлев", "Григорьев", "Романов", "Воробьев", "Сергеев", "Кузьмин", "Фролов",
+    "Александров", "Дмитриев", "Королев", "Гусев", "Киселев", "Ильин", "Максимов",
+    "Поляков", "Сорокин", "Виноградов", "Ковалев", "Белов", "Медведев", "Антонов",
+    "Тарасов", "Жуков", "Баранов", "Филиппов", "Комаров", "Давыдов", "Беляев",
+    "Герасимов", "Богданов", "Осипов", "Сидоров", "Матвеев", "Титов", "Марков",
+    "Миронов", "Крылов", "Куликов", "Карпов", "Власов", "Мельников", "Денисов",
+    "Гаврилов", "Тихонов", "Казаков", "Афанасьев", "Данилов", "Савельев", "Тимофеев",
+    "Фомин", "Чернов", "Абрамов", "Мартынов", "Ефимов", "Федотов", "Щербаков",
+    "Назаров", "Калинин", "Исаев", "Чернышев", "Быков", "Маслов", "Родионов",
+    "Коновалов", "Лазарев", "Воронин", "Климов", "Филатов", "Пономарев", "Голубев",
+    "Кудрявцев", "Прохоров", "Наумов", "Потапов", "Журавлев", "Овчинников", "Трофимов",
+    "Леонов", "Соболев", "Ермаков", "Колесников", "Гончаров", "Емельянов", "Никифоров",
+    "Грачев", "Котов", "Гришин", "Ефремов", "Архипов", "Громов", "Кириллов",
+    "Малышев", "Панов", "Моисеев", "Румянцев", "Акимов", "Кондратьев", "Бирюков",
+    "Горбунов", "Анисимов", "Еремин", "Тихомиров", "Галкин", "Лукьянов", "Михеев",
+    "Скворцов", "Юдин", "Белоусов", "Нестеров", "Симонов", "Прокофьев", "Харитонов",
+    "Князев", "Цветков", "Левин", "Митрофанов", "Воронов", "Аксенов", "Софронов",
+    "Мальцев", "Логинов", "Горшков", "Савин", "Краснов", "Майоров", "Демидов",
+    "Елисеев", "Рыбаков", "Сафонов", "Плотников", "Демин", "Хохлов", "Жданов",
+    "Островский", "Вишневский", "Покровский", "Ковальский", "Завьялов", "Шестаков",
+]
+
+MALE_NAMES = [
+    "Александр", "Алексей", "Анатолий", "Андрей", "Антон", "Аркадий", "Арсений",
+    "Артем", "Борис", "Вадим", "Валентин", "Валерий", "Василий", "Виктор", "Виталий",
+    "Владимир", "Владислав", "Вячеслав", "Геннадий", "Георгий", "Глеб", "Григорий",
+    "Даниил", "Денис", "Дмитрий", "Евгений", "Егор", "Иван", "Игорь", "Илья",
+    "Кирилл", "Константин", "Лев", "Леонид", "Максим", "Марк", "Матвей", "Михаил",
+    "Никита", "Николай", "Олег", "Павел", "Петр", "Роман", "Руслан", "Семен",
+    "Сергей", "Станислав", "Степан", "Тимофей", "Федор", "Юрий", "Ярослав",
+]
+
+FEMALE_NAMES = [
+    "Александра", "Алина", "Алла", "Анастасия", "Анна", "Валентина", "Валерия",
+    "Вера", "Вероника", "Виктория", "Галина", "Дарья", "Евгения", "Екатерина",
+    "Елена", "Елизавета", "Жанна", "Зинаида", "Зоя", "Инна", "Ирина", "Кира",
+    "Ксения", "Лариса", "Лидия", "Любовь", "Людмила", "Маргарита", "Марина",
+    "Мария", "Надежда", "Наталья", "Нина", "Оксана", "Ольга", "Полина", "Раиса",
+    "Светлана", "София", "Тамара", "Татьяна", "Ульяна", "Юлия", "Яна",
+]
+
+# Отчества, которые не строятся по общему правилу
+IRREGULAR_PATRONYMICS = {
+    "Илья": ("Ильич", "Ильинична"),
+    "Никита": ("Никитич", "Никитична"),
+    "Лев": ("Львович", "Львовна"),
+    "Михаил": ("Михайлович", "Михайловна"),
+    "Павел": ("Павлович", "Павловна"),
+    "Петр": ("Петрович", "Петровна"),
+    "Даниил": ("Даниилович", "Данииловна"),
+}
+
+STREETS = [
+    "Ленина", "Советская", "Мира", "Молодежная", "Центральная", "Школьная",
+    "Садовая", "Лесная", "Новая", "Набережная", "Заречная", "Гагарина",
+    "Полевая", "Октябрьская", "Первомайская", "Комсомольская", "Пушкина",
+    "Юбилейная", "Солнечная", "Кирова", "Зеленая", "Строителей", "Победы",
+    "Луговая", "Речная", "Северная", "Южная", "Восточная", "Западная",
+    "Пролетарская", "Чехова", "Горького", "Лермонтова", "Чапаева", "Калинина",
+    "Маяковского", "Суворова", "Московская", "Рабочая", "Вокзальная",
+    "Партизанская", "Береговая", "Весенняя", "Дорожная", "Интернациональная",
+    "Кооперативная", "Линейная", "Майская", "Нагорная", "Озерная",
+    "Парковая", "Пионерская", "Почтовая", "Рябиновая", "Сиреневая", "Тополиная",
+    "Трудовая", "Фрунзе", "Цветочная", "Энтузиастов",
+]
+
+STREET_TYPES = ["улица", "проспект", "переулок", "бульвар", "проезд"]
+
+COPY_QUERY = (
+    f"COPY person ({', '.join(PERSON_COLUMNS.values())}) FROM STDIN WITH (FORMAT csv)"
+)
+
+
+def female_surname(surname: str) -> str:
+    """Женская форма фамилии"""
+    if surname.endswith("ский"):
+        return surname[:-2] + "ая"
+    if surname.endswith(("ов", "ев", "ин", "ын")):
+        return surname + "а"
+    return surname
+
+
+def patronymics(name: str) -> Tuple[str, str]:
+    """Мужское и женское отчество от мужского имени"""
+    if name in IRREGULAR_PATRONYMICS:
+        return IRREGULAR_PATRONYMICS[name]
+    if name.endswith("й"):
+        stem = name[:-1]
+        return stem + "евич", stem + "евна"
+    if name.endswith("ь"):
+        stem = name[:-1]
+        return stem + "евич", stem + "евна"
+    return name + "ович", name + "овна"
+
+
+@dataclass
+class Dictionaries:
+    """Значения справочников синтетического набора"""
+    male_surnames: List[str]
+    female_surnames: List[str]
+    male_names: List[str]
+    female_names: List[str]
+    male_patronymics: List[str]
+    female_patronymics: List[str]
+    streets: List[str]
+
+    def values(self) -> Dict[str, List[str]]:
+        """Значения по ключам ReferenceTables"""
+        return {
+            ReferenceTables.FAM.key: self.male_surnames + self.female_surnames,
+            ReferenceTables.NAME.key: self.male_names + self.female_names,
+            ReferenceTables.SECOND_NAME.key: self.male_patronymics + self.female_patronymics,
+            ReferenceTables.STREET.key: self.streets,
+        }
+
+
+def build_dictionaries(street_count: int = 300) -> Dictionaries:
+    """Справочники: фамилии и отчества в обеих формах, улицы разных типов"""
+    male_patronymics, female_patronymics = zip(*(patronymics(name) for name in MALE_NAMES))
+    streets = [f"{kind} {street}" for kind in STREET_TYPES for street in STREETS]
+    return Dictionaries(
+        male_surnames=list(MALE_SURNAMES),
+        female_surnames=[female_surname(surname) for surname in MALE_SURNAMES],
+        male_names=list(MALE_NAMES),
+        female_names=list(FEMALE_NAMES),
+        male_patronymics=list(male_patronymics),
+        female_patronymics=list(female_patronymics),
+        streets=streets[:street_count],
+    )
+
+
+def phone_number(rng: random.Random) -> str:
+    """Мобильный номер в формате +7 9XX XXX-XX-XX"""
+    number = rng.randrange(10 ** 9)
+    return f"+7 9{number // 10 ** 7:02d} {number // 10 ** 4 % 1000:03d}-" \
+           f"{number // 100 % 100:02d}-{number % 100:02d}"
+
+
+def generate_persons(count: int, ids: Dict[str, Dict[str, int]],
+                     dictionaries: Dictionaries, seed: int = 0) -> Iterator[list]:
+    """Строки для таблицы person в порядке PERSON_COLUMNS"""
+    rng = random.Random(seed)
+    surnames, names = ids[ReferenceTables.FAM.key], ids[ReferenceTables.NAME.key]
+    middle_names, streets = ids[ReferenceTables.SECOND_NAME.key], ids[ReferenceTables.STREET.key]
+    street_ids = [streets[street] for street in dictionaries.streets]
+    by_gender = [
+        ([surnames[v] for v in dictionaries.male_surnames],
+         [names[v] for v in dictionaries.male_names],
+         [middle_names[v] for v in dictionaries.male_patronymics]),
+        ([surnames[v] for v in dictionaries.female_surnames],
+         [names[v] for v in dictionaries.female_names],
+         [middle_names[v] for v in dictionaries.female_patronymics]),
+    ]
+    for _ in range(count):
+        surname_ids, name_ids, middle_name_ids = by_gender[rng.random() < 0.53]
+        yield [
+            rng.choice(surname_ids),
+            rng.choice(name_ids),
+            # Отчество указано не у всех
+            rng.choice(middle_name_ids) if rng.random() < 0.95 else None,
+            rng.choice(street_ids),
+            str(rng.randint(1, 150)),
+            str(rng.randint(1, 5)) if rng.random() < 0.15 else None,
+            str(rng.randint(1, 300)) if rng.random() < 0.9 else None,
+            phone_number(rng) if rng.random() < 0.8 else None,
+        ]
+
+
+def populate(db: DatabaseManager, size: int, seed: int = 0, chunk_size: int = 100_000,
+             reset: bool = False, street_count: int = 300) -> Dict[str, Dict[str, int]]:
+    """Заполнение базы синтетическим набором из size людей
+
+    Справочники дополняются недостающими значениями, люди загружаются
+    через COPY порциями по chunk_size в отдельных транзакциях.
+    Возвращает id значений справочников.
+    """
+    dictionaries = build_dictionaries(street_count)
+    if reset:
+        tables = ["person"] + [ref.table for ref in ReferenceTables]
+        if db.config.driver == "sqlite":
+            for table in tables:
+                db.execute_query(f"DELETE FROM {table}")
+        else:
+            db.execute_query(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY")
+        for ref in ReferenceTables:
+            db.reference_changed(ref.key)
+
+    ids = {}
+    for key, values in dictionaries.values().items():
+        ids[key] = db.resolve_reference_values(key, values)
+
+    rows = generate_persons(size, ids, dictionaries, seed)
+    loaded = 0
+    while loaded < size:
+        count = min(chunk_size, size - loaded)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for _ in range(count):
+            writer.writerow(next(rows))
+        buffer.seek(0)
+        _copy(db, buffer)
+        loaded += count
+        logging.info(f"Generated {loaded}/{size} persons")
+
+    db.execute_query("ANALYZE person")
+    return ids
+
+
+def _copy(db: DatabaseManager, buffer: io.StringIO) -> None:
+    with db.connection() as conn:
+        with conn.cursor() as cursor:
+            try:
+                cursor.copy_expert(COPY_QUERY, buffer)
+                conn.commit()
+            except DRIVER_ERRORS as e:
+                conn.rollback()
+                logging.error(f"Synthetic data load failed: {e}")
+                raise DatabaseError(f"Synthetic data load failed: {e}")
+
+
+def parse_size(text: str) -> int:
+    """Размер набора: число или число с суффиксом k/m (10k, 1.5m, 10M)"""
+    text = text.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    if multiplier > 1:
+        text = text[:-1]
+    return int(float(text) * multiplier)
+
+
+def count_persons(db: DatabaseManager) -> Optional[int]:
+    """Число людей в базе (None, если таблицы еще нет)"""
+    try:
+        return db.execute_query("SELECT count(*) FROM person")[0][0]
+    except DatabaseError:
+        return None
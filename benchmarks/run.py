@@ -0,0 +1,251 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from database_config import DatabaseConfig, DatabaseManager, DatabaseError, PERSON_LISTING_QUERY
+from benchmarks.data_generator import count_persons, parse_size, populate
+from utils.enums import ReferenceTables
+from utils.schema import migrate
+
+# Значение справочника, которое создается и удаляется замерами handle_parent_table
+PROBE_VALUE = "__benchmark_probe__"
+
+
+def summarize(timings: List[float]) -> Dict[str, Any]:
+    """Сводка по списку замеров (мс)"""
+    timings = sorted(timings)
+    return {
+        "repeat": len(timings),
+        "min_ms": timings[0],
+        "median_ms": statistics.median(timings),
+        "mean_ms": statistics.fmean(timings),
+        "p95_ms": timings[min(len(timings) - 1, int(0.95 * len(timings)))],
+        "max_ms": timings[-1],
+    }
+
+
+def measure(func: Callable[[], Any], repeat: int = 5, warmup: int = 1) -> Dict[str, Any]:
+    """Замер функции: статистика времени (мс) по repeat запускам после прогрева"""
+    for _ in range(warmup):
+        func()
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    stats = summarize(timings)
+    if isinstance(result, (list, tuple)):
+        stats["rows"] = len(result)
+    return stats
+
+
+def database_benchmarks(db: DatabaseManager, repeat: int,
+                        max_full_rows: int, size: int) -> Dict[str, Dict[str, Any]]:
+    """Замеры операций DatabaseManager"""
+    results = {}
+    street = ReferenceTables.STREET
+    some_street = db.get_reference_data(street.key)[0][1]
+
+    if size <= max_full_rows:
+        results["execute_query.listing_full"] = measure(
+            lambda: db.execute_query(PERSON_LISTING_QUERY), repeat)
+    results["execute_query.listing_page"] = measure(
+        lambda: db.fetch_person_page(page_size=100).rows, repeat)
+    results["execute_query.count"] = measure(
+        lambda: db.execute_query("SELECT count(*) FROM person"), repeat)
+
+    def search():
+        cursor = db.open_person_search(some_street.split()[-1][:4])
+        try:
+            return cursor.fetch(100)
+        finally:
+            cursor.close()
+    results["execute_query.search_first_page"] = measure(search, repeat)
+
+    results["handle_parent_table.select_all"] = measure(
+        lambda: db.handle_parent_table(street.table, street.column, "SELECT"), repeat)
+    results["handle_parent_table.select_value"] = measure(
+        lambda: db.handle_parent_table(street.table, street.column, "SELECT", some_street), repeat)
+
+    # INSERT, UPDATE и DELETE идут циклом над пробным значением, чтобы база
+    # после замера осталась прежней; DELETE проверяет внешний ключ person.street_id
+    cycle = {"insert": [], "update": [], "delete": []}
+    renamed = PROBE_VALUE + "_renamed"
+    db.handle_parent_table(street.table, street.column, "DELETE", PROBE_VALUE)
+    db.handle_parent_table(street.table, street.column, "DELETE", renamed)
+    for _ in range(repeat):
+        for name, args in (("insert", ("INSERT", PROBE_VALUE)),
+                           ("update", ("UPDATE", PROBE_VALUE, renamed)),
+                           ("delete", ("DELETE", renamed))):
+            start = time.perf_counter()
+            db.handle_parent_table(street.table, street.column, *args)
+            cycle[name].append((time.perf_counter() - start) * 1000)
+    db.reference_changed(street.key)
+    for name, timings in cycle.items():
+        results[f"handle_parent_table.{name}"] = summarize(timings)
+
+    def cold_reference(key):
+        db.reference_changed(key)
+        return db.get_reference_data(key)
+    for ref in ReferenceTables:
+        results[f"references.{ref.key}.cold"] = measure(lambda ref=ref: cold_reference(ref.key), repeat)
+        results[f"references.{ref.key}.warm"] = measure(
+            lambda ref=ref: db.get_reference_data(ref.key), repeat)
+
+    keys = [ref.key for ref in ReferenceTables]
+
+    def cold_bundle():
+        for key in keys:
+            db.reference_changed(key)
+        return db.get_reference_bundle(keys)
+    results["references.bundle.cold"] = measure(cold_bundle, repeat)
+    return results
+
+
+def table_benchmarks(db: DatabaseManager, repeat: int, rows: int) -> Dict[str, Dict[str, Any]]:
+    """Замеры обновления таблицы (пропускаются без PyQt5)"""
+    try:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt5 import QtWidgets
+        from utils.table_managers import TableManager
+    except ImportError as e:
+        logging.warning(f"Skipping table benchmarks: {e}")
+        return {}
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    data = db.execute_query(f"{PERSON_LISTING_QUERY} ORDER BY p.id LIMIT %s", (rows,))
+    manager = TableManager(QtWidgets.QTableView())
+
+    # Полная перезагрузка модели (прежнее поведение update_data)
+    def reset():
+        manager.model.set_rows(data)
+        app.processEvents()
+    result = measure(reset, repeat)
+    result["rows"] = len(data)
+    results = {"table_manager.update_data": result}
+
+    # Обновление после правки одной строки: сравнение по ключу вместо сброса
+    edited = list(data)
+    if edited:
+        middle = len(edited) // 2
+        edited[middle] = (*edited[middle][:-1], "edited")
+    versions = [edited, data]
+    manager.update_data(data)
+
+    def refresh():
+        versions.reverse()
+        manager.update_data(versions[0])
+        app.processEvents()
+    result = measure(refresh, repeat)
+    result["rows"] = len(data)
+    results["table_manager.update_data_one_change"] = result
+    return results
+
+
+def git_revision() -> Optional[str]:
+    """Текущая ревизия рабочей копии (None вне git)"""
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Замеры, медиана которых выросла больше чем в threshold раз относительно базовых"""
+    regressions = []
+    for name, stats in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base and base["median_ms"] > 0:
+            ratio = stats["median_ms"] / base["median_ms"]
+            if ratio > threshold:
+                regressions.append(f"{name}: {base['median_ms']:.2f} -> {stats['median_ms']:.2f} ms "
+                                   f"(x{ratio:.2f})")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Замеры производительности операций с базой")
+    parser.add_argument("--size", type=parse_size, default="10k",
+                        help="число людей в наборе: 10k ... 10M")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--regenerate", action="store_true",
+                        help="пересоздать набор, даже если размер совпадает")
+    parser.add_argument("--max-full-rows", type=parse_size, default="1m",
+                        help="до какого размера замерять выборку всего списка")
+    parser.add_argument("--table-rows", type=parse_size, default="100k",
+                        help="строк для замера TableManager.update_data")
+    parser.add_argument("--pool", action="store_true", help="замерять с пулом соединений")
+    parser.add_argument("--output", help="файл JSON (по умолчанию stdout)")
+    parser.add_argument("--baseline", help="JSON прошлого запуска для сравнения")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="допустимый рост медианы относительно базового запуска")
+    parser.add_argument("--driver", choices=["postgresql", "sqlite"], default=DatabaseConfig.driver)
+    parser.add_argument("--sqlite-path", default=DatabaseConfig.sqlite_path)
+    parser.add_argument("--host", default=DatabaseConfig.host)
+    parser.add_argument("--name", default="pl_bench", help="отдельная база: набор ее перезаписывает")
+    parser.add_argument("--user", default=DatabaseConfig.user)
+    parser.add_argument("--password", default=DatabaseConfig.password)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+    config = DatabaseConfig(host=args.host, name=args.name, user=args.user, password=args.password,
+                            driver=args.driver, sqlite_path=args.sqlite_path,
+                            pool_enabled=args.pool, slow_query_threshold_ms=0.0)
+    db = DatabaseManager(config)
+    try:
+        schema = migrate(db)
+        if args.regenerate or count_persons(db) != args.size:
+            start = time.perf_counter()
+            populate(db, args.size, args.seed, reset=True)
+            logging.info(f"Dataset generated in {time.perf_counter() - start:.1f} s")
+        results = database_benchmarks(db, args.repeat, args.max_full_rows, args.size)
+        results.update(table_benchmarks(db, args.repeat, args.table_rows))
+    except DatabaseError as e:
+        logging.error(f"Benchmark failed: {e}")
+        return 1
+    finally:
+        db.close()
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "size": args.size,
+            "seed": args.seed,
+            "driver": args.driver,
+            "pool": args.pool,
+            "schema_version": schema.current_version,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(report, json.load(file), args.threshold)
+        for line in regressions:
+            logging.warning(f"Regression: {line}")
+        return 2 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,30 @@
-import psycopg2
-from dataclasses import dataclass
-from contextlib import contextmanager
+try:
+    import psycopg2
+except ImportError:  # без psycopg2 доступен только встроенный SQLite
+    psycopg2 = None
+import sqlite3
+from dataclasses import dataclass, replace
+from contextlib import contextmanager, ExitStack
 import logging
-from typing import Optional, List, Any
+import threading
+import uuid
+import time
+import re
+import json
+import base64
+from functools import lru_cache
+from typing import Optional, List, Any, Dict, Sequence, Iterator, Tuple, Iterable, Hashable, Callable
+from utils.connection_pool import ConnectionPool, PoolTimeout
+from models.data_models import QueryPage, PersonData
+from utils.enums import ReferenceTables
+from utils.reference_cache import ReferenceCache, REFERENCE_VERSION_DDL
+from utils.statement_cache import PreparedStatementCache
+from utils.query_stats import QueryStats, QueryEvent, normalize_sql
+from utils.result_cache import ResultCache
+from utils.sqlite_backend import SqliteCursor, connect_sqlite
+
+# Ошибки драйверов, которые переводятся в DatabaseError
+DRIVER_ERRORS = (sqlite3.Error,) + ((psycopg2.Error,) if psycopg2 is not None else ())
 
 @dataclass
 class DatabaseConfig:
@@ -11,81 +33,1327 @@ class DatabaseConfig:
     name: str = "pl_first"
     user: str = "postgres"
     password: str = "1478"
+    # Драйвер: "postgresql" (сервер) или "sqlite" (встроенная база в файле)
+    driver: str = "postgresql"
+    # Файл базы SQLite; по умолчанию <name>.sqlite3
+    sqlite_path: str = ""
+    # Сколько ждать освобождения базы, занятой записью другого соединения (сек.)
+    sqlite_busy_timeout: float = 5.0
+    # Пул соединений (по умолчанию выключен: соединение на каждый запрос)
+    pool_enabled: bool = False
+    pool_min_size: int = 1
+    pool_max_size: int = 10
+    pool_idle_timeout: float = 300.0
+    pool_checkout_timeout: float = 30.0
+    pool_health_check: bool = True
+    pool_reset_on_return: bool = True
+    # Кеш справочников: интервал сверки версий и срок жизни без них (сек.)
+    reference_cache_enabled: bool = True
+    reference_cache_check_interval: float = 5.0
+    reference_cache_ttl: float = 300.0
+    # Кеш подготовленных операторов на соединение (0 - выключен).
+    # Работает только с пулом PostgreSQL: без него соединение живет один запрос
+    statement_cache_size: int = 0
+    # Статистика запросов и порог журнала медленных запросов (мс, 0 - выключен)
+    query_stats_enabled: bool = True
+    slow_query_threshold_ms: float = 500.0
+    # Применение миграций схемы (utils/schema.py) при запуске
+    auto_migrate: bool = True
+    # Локальный снимок списка для мгновенного запуска (utils/local_snapshot.py,
+    # только для PostgreSQL); пустой путь - файл в каталоге кеша пользователя
+    local_snapshot_enabled: bool = True
+    local_snapshot_path: str = ""
+    # Сессии записи (DatabaseManager.session): размер пакета execute_values /
+    # execute_batch и автоматический сброс через столько секунд (0 - выключен)
+    write_batch_size: int = 500
+    write_flush_interval: float = 0.0
+    # Обновление списка по уведомлениям об изменениях (LISTEN/NOTIFY, только
+    # PostgreSQL); уведомления, пришедшие с паузой меньше debounce, - одна пачка
+    change_notifications_enabled: bool = True
+    change_notify_debounce_ms: int = 200
+    # Кеш результатов читающих запросов execute_query (по умолчанию выключен):
+    # объем в байтах и срок жизни записи (сек.); запись в таблицу сбрасывает
+    # зависящие от нее результаты, изменения других клиентов - только ttl
+    # или уведомления об изменениях
+    result_cache_enabled: bool = False
+    result_cache_max_bytes: int = 32 * 1024 * 1024
+    result_cache_ttl: float = 30.0
+
+# Основной список людей: первичный ключ и колонки в порядке TableColumns
+PERSON_LISTING_COLUMNS = """
+    p.id,
+           COALESCE(f.fam, '') AS fam,
+           COALESCE(n.names, '') AS names,
+           COALESCE(s.second_name, '') AS second_name,
+           COALESCE(st.street, '') AS street,
+           COALESCE(p.bldng, '') AS bldng,
+           COALESCE(p.bldng_k, '') AS bldng_k,
+           COALESCE(p.appr, '') AS appr,
+           COALESCE(p.telef, '') AS telef
+"""
+PERSON_LISTING_TABLES = """
+    person p
+    LEFT JOIN fam f ON f.id = p.fam_id
+    LEFT JOIN names n ON n.id = p.name_id
+    LEFT JOIN second_name s ON s.id = p.second_name_id
+    LEFT JOIN street st ON st.id = p.street_id
+"""
+PERSON_LISTING_QUERY = f"SELECT {PERSON_LISTING_COLUMNS} FROM {PERSON_LISTING_TABLES}"
+
+# Выражения PERSON_LISTING_QUERY, из которых получены колонки списка
+# (TableColumns.db_field). Условия и сортировка строятся по ним, а не по
+# колонкам-результатам COALESCE, чтобы их могли обслужить индексы
+PERSON_LISTING_SOURCES = {
+    "fam": "f.fam",
+    "names": "n.names",
+    "second_name": "s.second_name",
+    "street": "st.street",
+    "bldng": "p.bldng",
+    "bldng_k": "p.bldng_k",
+    "appr": "p.appr",
+    "telef": "p.telef",
+}
+
+# Соответствие полей PersonData колонкам таблицы person
+PERSON_COLUMNS = {
+    "fam_id": "fam_id",
+    "name_id": "name_id",
+    "second_name_id": "second_name_id",
+    "street_id": "street_id",
+    "building": "bldng",
+    "building_korp": "bldng_k",
+    "apartment": "appr",
+    "phone": "telef",
+}
+
+# Поиск подстроки по справочникам и телефону. Каждая ветка UNION
+# обслуживается своим триграммным индексом (см. utils.schema.SEARCH_INDEX_DDL),
+# поэтому ILIKE '%...%' не приводит к полному просмотру таблиц
+PERSON_SEARCH_CONDITION = """
+    p.id IN (
+        SELECT hit.id FROM person hit JOIN fam d ON d.id = hit.fam_id
+        WHERE d.fam ILIKE %(pattern)s
+        UNION
+        SELECT hit.id FROM person hit JOIN names d ON d.id = hit.name_id
+        WHERE d.names ILIKE %(pattern)s
+        UNION
+        SELECT hit.id FROM person hit JOIN second_name d ON d.id = hit.second_name_id
+        WHERE d.second_name ILIKE %(pattern)s
+        UNION
+        SELECT hit.id FROM person hit JOIN street d ON d.id = hit.street_id
+        WHERE d.street ILIKE %(pattern)s
+        UNION
+        SELECT hit.id FROM person hit WHERE hit.telef ILIKE %(pattern)s
+    )
+"""
+PERSON_SEARCH_QUERY = f"{PERSON_LISTING_QUERY} WHERE {PERSON_SEARCH_CONDITION} ORDER BY p.id"
+
+# Допустимые имена колонок для построения ORDER BY / WHERE
+IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# Дискриминатор строк со счетчиками версий в общем запросе справочников
+REFERENCE_VERSIONS_MARKER = "__versions__"
+
+def like_pattern(text: str) -> str:
+    """Шаблон LIKE для поиска подстроки с экранированием спецсимволов"""
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def person_filter_conditions(filters: Optional[Dict[str, str]],
+                             search: str = "") -> Tuple[List[str], List[str]]:
+    """Условия к PERSON_LISTING_QUERY по колонкам списка людей (поиск
+    подстроки без учета регистра) и их параметры
+
+    Ключи filters - имена колонок TableColumns.db_field. Условия ставятся на
+    исходные колонки (PERSON_LISTING_SOURCES), поэтому их обслуживают
+    триграммные индексы (миграции 5 и 11). search -
+    строка общего поиска (PERSON_SEARCH_CONDITION), совмещаемая с фильтрами.
+    """
+    conditions, params = [], []
+    for db_field, value in (filters or {}).items():
+        if db_field not in PERSON_LISTING_SOURCES:
+            raise ValueError(f"Unknown column: {db_field}")
+        if value:
+            conditions.append(f"{PERSON_LISTING_SOURCES[db_field]} ILIKE %s")
+            params.append(like_pattern(value))
+    if search:
+        condition = PERSON_SEARCH_CONDITION.replace("%(pattern)s", "%s")
+        conditions.append(condition)
+        params += [like_pattern(search)] * condition.count("%s")
+    return conditions, params
+
+def person_filter_clause(filters: Optional[Dict[str, str]]) -> Tuple[str, List[str]]:
+    """Условие WHERE к PERSON_LISTING_QUERY по колонкам списка людей"""
+    conditions, params = person_filter_conditions(filters)
+    return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
 
 class DatabaseError(Exception):
     """Кастомные ошибки базы данных"""
     pass
 
+class ConcurrentModificationError(DatabaseError):
+    """Запись изменена другим клиентом после того, как была прочитана"""
+    pass
+
+def encode_page_token(direction: str, keys: Sequence[Any]) -> str:
+    """Упаковка позиции страницы в непрозрачный токен"""
+    payload = json.dumps({"d": direction, "k": list(keys)}, default=str)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def decode_page_token(token: str) -> Tuple[str, List[Any]]:
+    """Распаковка токена страницы"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        direction, keys = payload["d"], payload["k"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid page token: {e}")
+    if direction not in ("next", "prev") or not isinstance(keys, list):
+        raise ValueError("Invalid page token")
+    return direction, keys
+
+def connect(config: DatabaseConfig, timeout: Optional[int] = None):
+    """Открытие нового соединения с базой данных
+
+    timeout - предел ожидания соединения с сервером PostgreSQL (сек.).
+    """
+    if config.driver == "sqlite":
+        return connect_sqlite(config.sqlite_path or f"{config.name}.sqlite3",
+                              config.sqlite_busy_timeout)
+    if config.driver != "postgresql":
+        raise DatabaseError(f"Unsupported database driver: {config.driver}")
+    if psycopg2 is None:
+        raise DatabaseError("psycopg2 is required for the postgresql driver")
+    options = {"connect_timeout": timeout} if timeout else {}
+    return psycopg2.connect(
+        host=config.host,
+        database=config.name,
+        user=config.user,
+        password=config.password,
+        **options
+    )
+
 @contextmanager
 def database_connection(config: DatabaseConfig):
     """Контекстный менеджер для работы с базой данных"""
     conn = None
     try:
-        conn = psycopg2.connect(
-            host=config.host,
-            database=config.name,
-            user=config.user,
-            password=config.password
-        )
+        conn = connect(config)
         yield conn
-    except psycopg2.Error as e:
+    except DRIVER_ERRORS as e:
         logging.error(f"Database connection error: {e}")
         raise DatabaseError(f"Failed to connect to database: {e}")
     finally:
         if conn:
             conn.close()
 
+@lru_cache(maxsize=256)
+def parent_table_query(table: str, column: str, operation: str, with_value: bool) -> str:
+    """Текст запроса к родительской таблице (строится один раз на сочетание)"""
+    if not IDENTIFIER_PATTERN.match(table) or not IDENTIFIER_PATTERN.match(column):
+        raise ValueError(f"Invalid table or column name: {table}.{column}")
+    operations = {
+        'INSERT': f"INSERT INTO {table} ({column}) VALUES (%s)",
+        'DELETE': f"DELETE FROM {table} WHERE {column} = %s",
+        'UPDATE': f"UPDATE {table} SET {column} = %s WHERE {column} = %s",
+        'SELECT': f"SELECT {column} FROM {table}" + (f" WHERE {column} = %s" if with_value else "")
+    }
+    query = operations.get(operation)
+    if not query:
+        raise ValueError(f"Unsupported operation: {operation}")
+    return query
+
+class ServerCursor:
+    """Именованный серверный курсор для постраничного чтения больших выборок
+
+    Держит собственное соединение (из пула или новое) открытым до close().
+    Читает снимок данных на момент открытия: изменения других клиентов
+    после него курсор не увидит.
+    """
+
+    # Видит ли курсор изменения, сделанные после его открытия
+    live = False
+
+    def __init__(self, manager: 'DatabaseManager', query: str,
+                 params: Optional[Any] = None, itersize: int = 1000,
+                 prefetch: int = 0):
+        self._stack = ExitStack()
+        self._conn = self._stack.enter_context(manager.connection())
+        self._done = False
+        self._buffer: List[tuple] = []
+        try:
+            self._cursor = self._conn.cursor(name=f"stream_{uuid.uuid4().hex}")
+            self._cursor.itersize = itersize
+            self._cursor.execute(query, params)
+            # Первая порция читается сразу (в фоновом потоке), чтобы модель
+            # показала ее без обращения к серверу из потока GUI
+            if prefetch:
+                self._buffer = self._cursor.fetchmany(prefetch)
+        except DRIVER_ERRORS as e:
+            self._stack.close()
+            logging.error(f"Query execution error: {e}")
+            raise DatabaseError(f"Query execution failed: {e}")
+        if prefetch and len(self._buffer) < prefetch:
+            self._release()
+
+    @property
+    def exhausted(self) -> bool:
+        return self._done and not self._buffer
+
+    def fetch(self, size: int) -> List[tuple]:
+        """Чтение следующей порции строк"""
+        rows, self._buffer = self._buffer[:size], self._buffer[size:]
+        missing = size - len(rows)
+        if missing and not self._done:
+            try:
+                batch = self._cursor.fetchmany(missing)
+            except DRIVER_ERRORS as e:
+                self.close()
+                logging.error(f"Query execution error: {e}")
+                raise DatabaseError(f"Query execution failed: {e}")
+            rows += batch
+            if len(batch) < missing:
+                self._release()
+        return rows
+
+    def close(self) -> None:
+        """Закрытие курсора и возврат соединения"""
+        self._buffer = []
+        self._release()
+
+    def _release(self) -> None:
+        """Закрытие серверной части; уже прочитанные строки остаются в буфере"""
+        if self._done:
+            return
+        self._done = True
+        try:
+            if not self._conn.closed:
+                self._cursor.close()
+                self._conn.rollback()
+        except DRIVER_ERRORS as e:
+            logging.warning(f"Error closing server cursor: {e}")
+        finally:
+            self._stack.close()
+
+class PageCursor:
+    """Курсор поверх keyset-пагинации с интерфейсом ServerCursor
+
+    Не держит соединение между порциями: каждая порция - отдельный запрос.
+    fetch_page(page_size, token) читает страницу, например через
+    DatabaseManager.fetch_page. Каждая страница читает текущие данные.
+    """
+
+    live = True
+
+    def __init__(self, fetch_page: Callable[[int, Optional[str]], QueryPage]):
+        self._fetch_page = fetch_page
+        self._token: Optional[str] = None
+        self.exhausted = False
+
+    def fetch(self, size: int) -> List[tuple]:
+        """Чтение следующей страницы"""
+        if self.exhausted:
+            return []
+        page = self._fetch_page(size, self._token)
+        self._token = page.next_token
+        if self._token is None:
+            self.exhausted = True
+        return page.rows
+
+    def close(self) -> None:
+        self.exhausted = True
+
+class PrefetchedCursor:
+    """Курсор, первая порция которого уже прочитана
+
+    Сначала отдает прочитанные строки, затем читает из исходного курсора.
+    """
+
+    def __init__(self, cursor, rows: List[tuple]):
+        self._cursor = cursor
+        self._buffer = rows
+
+    @property
+    def exhausted(self) -> bool:
+        return self._cursor.exhausted and not self._buffer
+
+    @property
+    def live(self) -> bool:
+        return self._cursor.live
+
+    def fetch(self, size: int) -> List[tuple]:
+        rows, self._buffer = self._buffer[:size], self._buffer[size:]
+        if len(rows) < size and not self._cursor.exhausted:
+            rows += self._cursor.fetch(size - len(rows))
+        return rows
+
+    def close(self) -> None:
+        self._buffer = []
+        self._cursor.close()
+
 class DatabaseManager:
     """Менеджер для работы с базой данных"""
     def __init__(self, config: DatabaseConfig):
         self.config = config
+        self._pool: Optional[ConnectionPool] = None
+        self._pool_lock = threading.Lock()
+        self.statement_cache: Optional[PreparedStatementCache] = None
+        if (config.statement_cache_size > 0 and config.pool_enabled
+                and config.driver == "postgresql"):
+            self.statement_cache = PreparedStatementCache(config.statement_cache_size)
+        self.query_stats: Optional[QueryStats] = None
+        if config.query_stats_enabled:
+            self.query_stats = QueryStats(config.slow_query_threshold_ms)
+        self.result_cache: Optional[ResultCache] = None
+        if config.result_cache_enabled:
+            self.result_cache = ResultCache(config.result_cache_max_bytes, config.result_cache_ttl)
+        self.reference_cache: Optional[ReferenceCache] = None
+        if config.reference_cache_enabled:
+            self.reference_cache = ReferenceCache(
+                check_interval=config.reference_cache_check_interval,
+                ttl=config.reference_cache_ttl
+            )
+            if config.driver == "sqlite":
+                # Счетчики версий построены на триггерах PostgreSQL; локальная
+                # база обычно однопользовательская, хватает ttl
+                self.reference_cache.disable_versioning()
+        # Есть ли в person колонка row_version (миграция 7); None - не проверялось
+        self.row_versioning: Optional[bool] = None
+        # Соединения, занятые запросами с меткой (см. run_cancellable)
+        self._query_tag = threading.local()
+        self._tagged: Dict[str, List[Any]] = {}
+        self._tagged_lock = threading.Lock()
+
+    @property
+    def pool(self) -> Optional[ConnectionPool]:
+        """Пул соединений; создается при первом обращении"""
+        if self._pool is not None or not self.config.pool_enabled:
+            return self._pool
+        with self._pool_lock:
+            if self._pool is not None:
+                return self._pool
+            try:
+                self._pool = ConnectionPool(
+                    lambda: connect(self.config),
+                    min_size=self.config.pool_min_size,
+                    max_size=self.config.pool_max_size,
+                    idle_timeout=self.config.pool_idle_timeout,
+                    checkout_timeout=self.config.pool_checkout_timeout,
+                    health_check=self.config.pool_health_check,
+                    reset_on_return=self.config.pool_reset_on_return
+                )
+                if self.statement_cache is not None:
+                    self._pool.add_close_listener(self.statement_cache.forget)
+            except DRIVER_ERRORS as e:
+                logging.error(f"Database connection error: {e}")
+                raise DatabaseError(f"Failed to connect to database: {e}")
+        return self._pool
+
+    @contextmanager
+    def connection(self):
+        """Соединение из пула или новое, если пул выключен"""
+        pool = self.pool
+        if pool is None:
+            with database_connection(self.config) as conn, self._tagged_connection(conn):
+                yield conn
+            return
+
+        try:
+            conn = pool.getconn()
+        except DRIVER_ERRORS + (PoolTimeout,) as e:
+            logging.error(f"Database connection error: {e}")
+            raise DatabaseError(f"Failed to connect to database: {e}")
+        try:
+            with self._tagged_connection(conn):
+                yield conn
+        finally:
+            pool.putconn(conn)
+
+    @contextmanager
+    def _tagged_connection(self, conn):
+        """Учет соединения под меткой потока, пока оно занято"""
+        tag = getattr(self._query_tag, "tag", None)
+        if tag is None:
+            yield
+            return
+        with self._tagged_lock:
+            self._tagged.setdefault(tag, []).append(conn)
+        self._query_tag.connections.append(conn)
+        try:
+            yield
+        finally:
+            self._untag(tag, conn)
+
+    def _untag(self, tag: str, conn) -> None:
+        with self._tagged_lock:
+            connections = self._tagged.get(tag, [])
+            if conn in connections:
+                connections.remove(conn)
+            if not connections:
+                self._tagged.pop(tag, None)
+
+    def run_cancellable(self, tag: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Выполнение func(*args, **kwargs) с запросами, которые прерывает cancel_queries(tag)
+
+        Соединение, которое func оставляет открытым (например, в ServerCursor),
+        после возврата из func под меткой уже не числится.
+        """
+        self._query_tag.tag, self._query_tag.connections = tag, []
+        try:
+            return func(*args, **kwargs)
+        finally:
+            for conn in self._query_tag.connections:
+                self._untag(tag, conn)
+            self._query_tag.tag = None
+
+    def cancel_queries(self, tag: str) -> int:
+        """Прерывание на сервере запросов, выполняемых через run_cancellable(tag)
+
+        Возвращает число прерванных соединений. Прерванный запрос завершается
+        ошибкой DatabaseError в своем потоке.
+        """
+        cancelled = 0
+        # Под блокировкой: соединение не вернется в пул и не получит чужой
+        # запрос, пока его прерывают
+        with self._tagged_lock:
+            for conn in self._tagged.get(tag, []):
+                try:
+                    conn.cancel()
+                    cancelled += 1
+                except DRIVER_ERRORS as e:
+                    logging.warning(f"Query cancel failed: {e}")
+        if cancelled:
+            logging.info(f"Cancelled {cancelled} running queries of '{tag}'")
+        return cancelled
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Статистика пула соединений (пустая, если пул выключен)"""
+        return self._pool.get_stats() if self._pool else {}
+
+    def statement_cache_stats(self) -> Dict[str, Any]:
+        """Статистика кеша подготовленных операторов (пустая, если он выключен)"""
+        return self.statement_cache.get_stats() if self.statement_cache else {}
+
+    def result_cache_stats(self) -> Dict[str, Any]:
+        """Статистика кеша результатов (пустая, если он выключен)"""
+        return self.result_cache.get_stats() if self.result_cache else {}
+
+    def tables_changed(self, *tables: str) -> None:
+        """Таблицы изменены в обход execute_query: сброс зависящих результатов
+
+        Без аргументов кеш результатов сбрасывается целиком.
+        """
+        if self.result_cache is None:
+            return
+        if tables:
+            self.result_cache.invalidate_tables(tables)
+        else:
+            self.result_cache.clear()
+
+    def dump_query_stats(self, limit: int = 20) -> str:
+        """Текстовый отчет по запросам, пулу и кешам"""
+        sections = []
+        if self.query_stats is not None:
+            sections.append("Запросы:\n" + self.query_stats.format_report(limit))
+        for title, stats in (("Пул соединений", self.pool_stats()),
+                             ("Подготовленные операторы", self.statement_cache_stats()),
+                             ("Кеш результатов", self.result_cache_stats())):
+            if stats:
+                sections.append(f"{title}:\n" + "\n".join(
+                    f"  {name}: {value:.4g}" if isinstance(value, float) else f"  {name}: {value}"
+                    for name, value in stats.items()
+                ))
+        return "\n\n".join(sections) or "Статистика выключена"
+
+    def close(self) -> None:
+        """Закрытие всех соединений пула"""
+        if self._pool:
+            self._pool.closeall()
+            self._pool = None
+
+    def session(self, batch_size: Optional[int] = None,
+                flush_interval: Optional[float] = None, on_flush_failed=None):
+        """Сессия записи: изменения копятся и сохраняются одной транзакцией
+
+        Параметры по умолчанию берутся из write_batch_size и write_flush_interval.
+        """
+        # Импорт здесь: utils.write_session сам зависит от этого модуля
+        from utils.write_session import WriteSession
+        return WriteSession(
+            self,
+            batch_size=self.config.write_batch_size if batch_size is None else batch_size,
+            flush_interval=self.config.write_flush_interval if flush_interval is None else flush_interval,
+            on_flush_failed=on_flush_failed
+        )
+
+    def execute_query(self, query: str, params: Optional[tuple] = None,
+                      prepare_key: Optional[Hashable] = None) -> List[tuple]:
+        """Выполнение SQL запроса
+
+        prepare_key - ключ часто выполняемого оператора: при включенном кеше
+        он подготавливается на соединении один раз и дальше вызывается через EXECUTE.
+        При включенном кеше результатов повторное чтение отдается из него.
+        """
+        generation = -1
+        if self.result_cache is not None:
+            cached, generation = self.result_cache.get(query, params)
+            if cached is not None:
+                return cached
+        event = None
+        if self.query_stats is not None:
+            event = QueryEvent(query, params, normalize_sql(query))
+        started = time.perf_counter()
+        connected = None
+        try:
+            with self.connection() as conn:
+                connected = time.perf_counter()
+                with conn.cursor() as cursor:
+                    try:
+                        if prepare_key is not None and self.statement_cache is not None:
+                            self.statement_cache.execute(cursor, prepare_key, query, params)
+                        else:
+                            cursor.execute(query, params)
+                        conn.commit()
+                        executed = time.perf_counter()
+                        affected = cursor.rowcount
+                        # У операторов без результата (INSERT без RETURNING, DDL) нет description
+                        rows = cursor.fetchall() if cursor.description is not None else []
+                    except DRIVER_ERRORS as e:
+                        conn.rollback()
+                        if event is not None:
+                            event.error = str(e)
+                        logging.error(f"Query execution error: {e}")
+                        raise DatabaseError(f"Query execution failed: {e}")
+        except DatabaseError as e:
+            if event is not None:
+                event.error = event.error or str(e)
+                finished = time.perf_counter()
+                if connected is None:
+                    event.connect_time = finished - started
+                else:
+                    event.connect_time = connected - started
+                    event.execute_time = finished - connected
+                self.query_stats.record(event)
+            raise
+
+        if self.result_cache is not None:
+            if generation >= 0:
+                self.result_cache.put(query, params, rows, generation)
+            else:
+                self.result_cache.invalidate_query(query)
+        if event is not None:
+            event.connect_time = connected - started
+            event.execute_time = executed - connected
+            event.fetch_time = time.perf_counter() - executed
+            event.rows = len(rows) if rows else max(affected, 0)
+            self.query_stats.record(event)
+        return rows
+
+    def open_cursor(self, query: str, params: Optional[Any] = None,
+                    itersize: int = 1000, prefetch: int = 0) -> ServerCursor:
+        """Открытие серверного курсора для потокового чтения"""
+        return ServerCursor(self, query, params, itersize, prefetch)
+
+    def open_person_listing(self, itersize: int = 1000, prefetch: int = 0) -> ServerCursor:
+        """Потоковое чтение основного списка людей"""
+        return self.open_cursor(PERSON_LISTING_QUERY + " ORDER BY p.id",
+                                itersize=itersize, prefetch=prefetch)
+
+    def open_person_search(self, text: str, itersize: int = 1000,
+                           prefetch: int = 0) -> ServerCursor:
+        """Потоковое чтение людей, у которых фамилия, имя, отчество,
+        улица или телефон содержат text (без учета регистра)"""
+        return self.open_cursor(PERSON_SEARCH_QUERY, {"pattern": like_pattern(text)},
+                                itersize=itersize, prefetch=prefetch)
+
+    def get_person_rows(self, ids: Iterable[int], chunk_size: int = 500) -> List[tuple]:
+        """Строки основного списка для заданных id, упорядоченные по id"""
+        ids = sorted(ids)
+        rows = []
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            rows += self.execute_query(
+                f"{PERSON_LISTING_QUERY} WHERE p.id IN ({', '.join(['%s'] * len(chunk))}) ORDER BY p.id",
+                tuple(chunk)
+            )
+        return rows
+
+    def fetch_page(self, query: str, order_by: Sequence[str] = ("id",),
+                   page_size: int = 100, token: Optional[str] = None,
+                   params: Optional[tuple] = None, descending: bool = False) -> QueryPage:
+        """Keyset-пагинация произвольного запроса
+
+        order_by - колонки результата query, вместе образующие уникальный
+        и непустой ключ сортировки. Вместо OFFSET страница отбирается
+        условием (k1, k2, ...) > (последний ключ), поэтому стоимость любой
+        страницы одинакова при наличии индекса по ключу. descending -
+        сортировка по убыванию всех колонок ключа.
+        """
+        if page_size < 1:
+            raise ValueError(f"Invalid page size: {page_size}")
+        if not order_by or not all(IDENTIFIER_PATTERN.match(col) for col in order_by):
+            raise ValueError(f"Invalid sort key: {order_by}")
+        return self._keyset_page("page_src.*", f"({query}) AS page_src",
+                                 [f"page_src.{col}" for col in order_by],
+                                 page_size, token, params, descending)
+
+    def _keyset_page(self, columns: str, source: str, key_expressions: Sequence[str],
+                     page_size: int, token: Optional[str], params: Optional[Sequence[Any]] = None,
+                     descending: bool = False, conditions: Sequence[str] = ()) -> QueryPage:
+        """Страница SELECT columns FROM source WHERE conditions по ключу key_expressions
+
+        params - параметры conditions. Условие страницы и сортировка ставятся
+        на сами выражения ключа, поэтому их может обслужить индекс по ним.
+        """
+        direction, keys = decode_page_token(token) if token else ("next", [])
+        if keys and len(keys) != len(key_expressions):
+            raise ValueError("Page token does not match sort key")
 
-    def execute_query(self, query: str, params: Optional[tuple] = None) -> List[tuple]:
-        """Выполнение SQL запроса"""
-        with database_connection(self.config) as conn:
+        key_columns = ", ".join(key_expressions)
+        backward = direction == "prev"
+        # Порядок выборки: назад по возрастанию - то же, что вперед по убыванию
+        reverse = backward != descending
+        conditions = list(conditions)
+        if keys:
+            placeholders = ", ".join(["%s"] * len(keys))
+            conditions.append(f"({key_columns}) {'<' if reverse else '>'} ({placeholders})")
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = ", ".join(f"{expression}{' DESC' if reverse else ''}" for expression in key_expressions)
+        # Ключ выбирается отдельно перед строкой, чтобы не зависеть от ее состава
+        page_query = f"SELECT {key_columns}, {columns} FROM {source}{where} ORDER BY {order} LIMIT %s"
+
+        rows = self.execute_query(page_query, tuple(params or ()) + tuple(keys) + (page_size + 1,))
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backward:
+            rows.reverse()
+
+        key_count = len(key_expressions)
+        page = QueryPage(rows=[tuple(row[key_count:]) for row in rows])
+        # При движении назад следующая страница есть всегда, вперед - предыдущая,
+        # если запрос начинался не с начала
+        has_next = has_more if not backward else True
+        has_prev = has_more if backward else bool(keys)
+        if rows:
+            if has_next:
+                page.next_token = encode_page_token("next", rows[-1][:key_count])
+            if has_prev:
+                page.prev_token = encode_page_token("prev", rows[0][:key_count])
+        return page
+
+    def iter_pages(self, query: str, order_by: Sequence[str] = ("id",),
+                   page_size: int = 1000, params: Optional[tuple] = None) -> Iterator[List[tuple]]:
+        """Последовательный обход всех страниц запроса"""
+        token = None
+        while True:
+            page = self.fetch_page(query, order_by, page_size, token, params)
+            if page.rows:
+                yield page.rows
+            token = page.next_token
+            if token is None:
+                return
+
+    def fetch_person_page(self, token: Optional[str] = None,
+                          page_size: int = 100) -> QueryPage:
+        """Страница основного списка людей по первичному ключу"""
+        return self.fetch_page(PERSON_LISTING_QUERY, ("id",), page_size, token)
+
+    def open_page_cursor(self, query: str, order_by: Sequence[str] = ("id",),
+                         params: Optional[tuple] = None, descending: bool = False) -> PageCursor:
+        """Курсор для модели таблицы на основе keyset-пагинации"""
+        return PageCursor(lambda size, token: self.fetch_page(query, order_by, size, token,
+                                                              params, descending))
+
+    def open_person_view(self, sort_field: Optional[str] = None, descending: bool = False,
+                         filters: Optional[Dict[str, str]] = None, search: str = "",
+                         prefetch: int = 0) -> PageCursor:
+        """Список людей с сортировкой, фильтрами и поиском на сервере
+
+        sort_field и ключи filters - TableColumns.db_field, search - строка
+        общего поиска, как у open_person_search. Строки читаются страницами
+        по ключу (sort_field, id) по мере прокрутки. Запрос не оборачивается
+        в подзапрос: ключ и условия ставятся на исходные выражения, поэтому
+        сортировку по колонкам person обслуживают индексы миграции 10, а
+        фильтры и поиск - триграммные индексы. Сортировка по справочникам
+        (фамилия, имя, отчество, улица) индекса не имеет: текст значения
+        лежит в другой таблице, и каждая страница сортирует весь
+        отфильтрованный список заново.
+        """
+        if sort_field is not None and sort_field not in PERSON_LISTING_SOURCES:
+            raise ValueError(f"Unknown column: {sort_field}")
+        conditions, params = person_filter_conditions(filters, search)
+        # Выражение совпадает с индексом (COALESCE(колонка, ''), id); колонки
+        # справочников сортируются после соединения, без индекса
+        key = ([f"COALESCE({PERSON_LISTING_SOURCES[sort_field]}, '')"] if sort_field else []) + ["p.id"]
+        cursor = PageCursor(lambda size, token: self._keyset_page(
+            PERSON_LISTING_COLUMNS, PERSON_LISTING_TABLES, key, size, token, params, descending, conditions
+        ))
+        if prefetch:
+            # Первая страница читается сразу (в фоновом потоке), как у ServerCursor
+            cursor = PrefetchedCursor(cursor, cursor.fetch(prefetch))
+        return cursor
+
+    def get_reference_data(self, ref_type: str) -> List[Tuple[int, str]]:
+        """Значения справочника в виде (id, значение), отсортированные по значению"""
+        ref = ReferenceTables.from_key(ref_type)
+        return self.get_reference_bundle([ref.key])[ref.key]
+
+    def get_reference_bundle(self, ref_types: Iterable[str]) -> Dict[str, List[Tuple[int, str]]]:
+        """Загрузка нескольких справочников за один запрос
+
+        Недостающие в кеше справочники выбираются одним UNION ALL с колонкой-
+        дискриминатором; туда же при необходимости добавляется сверка версий.
+        """
+        refs = list(dict.fromkeys(ReferenceTables.from_key(ref_type) for ref_type in ref_types))
+        cache = self.reference_cache
+        if cache is not None and cache.versioned is None and cache.needs_version_check():
+            # Однократно выясняем, есть ли в базе счетчики версий
+            self.refresh_reference_versions()
+        with_versions = bool(cache is not None and cache.versioned and cache.needs_version_check())
+
+        result: Dict[str, List[Tuple[int, str]]] = {}
+        missing = []
+        for ref in refs:
+            rows = cache.get(ref.key) if cache is not None else None
+            if rows is None:
+                missing.append(ref)
+            else:
+                result[ref.key] = rows
+        if not missing and not with_versions:
+            return result
+
+        parts = [f"SELECT %s::text, id::bigint, {ref.column}::text FROM {ref.table}" for ref in missing]
+        params = [ref.key for ref in missing]
+        if with_versions:
+            parts.append("SELECT %s::text, version, table_name FROM reference_versions")
+            params.append(REFERENCE_VERSIONS_MARKER)
+        rows = self.execute_query(" UNION ALL ".join(parts) + " ORDER BY 1, 3, 2", tuple(params))
+
+        loaded: Dict[str, List[Tuple[int, str]]] = {ref.key: [] for ref in missing}
+        versions = []
+        for ref_key, ref_id, value in rows:
+            if ref_key == REFERENCE_VERSIONS_MARKER:
+                versions.append((value, ref_id))
+            else:
+                loaded[ref_key].append((ref_id, value))
+
+        stale = []
+        if cache is not None:
+            if with_versions:
+                cache.apply_versions(versions)
+                # Взятые из кеша справочники, измененные другими клиентами
+                stale = [key for key in result if cache.get(key) is None]
+            for key, key_rows in loaded.items():
+                cache.put(key, key_rows)
+        result.update(loaded)
+
+        if stale:
+            result.update(self.get_reference_bundle(stale))
+        return result
+
+    def refresh_reference_versions(self) -> None:
+        """Сверка кеша справочников со счетчиками версий в базе"""
+        cache = self.reference_cache
+        if cache is None or cache.versioned is False:
+            return
+        try:
+            versions = self.execute_query("SELECT table_name, version FROM reference_versions")
+        except DatabaseError as e:
+            logging.warning(f"Reference versions unavailable, cache falls back to ttl: {e}")
+            cache.disable_versioning()
+            return
+        cache.apply_versions(versions)
+
+    def install_reference_versioning(self) -> None:
+        """Создание таблицы и триггеров счетчиков версий справочников"""
+        for statement in REFERENCE_VERSION_DDL:
+            self.execute_query(statement)
+        if self.reference_cache is not None:
+            self.reference_cache.versioned = None
+            self.reference_cache.invalidate()
+
+    def _write_reference(self, ref: ReferenceTables, query: str,
+                         params: tuple) -> Tuple[List[tuple], Optional[int]]:
+        """Изменение справочника с чтением его версии тем же оператором"""
+        cache = self.reference_cache
+        if cache is None or not cache.versioned:
+            return self.execute_query(query, params, prepare_key=query), None
+
+        versioned_query = (
+            f"WITH changed AS ({query}) "
+            f"SELECT (SELECT version FROM reference_versions WHERE table_name = %s), changed.* "
+            f"FROM (SELECT 1) AS one LEFT JOIN changed ON TRUE"
+        )
+        rows = self.execute_query(versioned_query, params + (ref.table,),
+                                  prepare_key=versioned_query)
+        version = rows[0][0] if rows else None
+        return [row[1:] for row in rows if row[1] is not None], version
+
+    def insert_reference(self, ref_type: str, value: str) -> int:
+        """Добавление значения в справочник"""
+        ref = ReferenceTables.from_key(ref_type)
+        rows, version = self._write_reference(
+            ref, f"INSERT INTO {ref.table} ({ref.column}) VALUES (%s) RETURNING id", (value,)
+        )
+        ref_id = rows[0][0]
+        if self.reference_cache is not None:
+            self.reference_cache.apply_insert(ref.key, ref_id, value, version)
+        return ref_id
+
+    def update_reference(self, ref_type: str, old_value: str, new_value: str) -> None:
+        """Переименование значения справочника"""
+        ref = ReferenceTables.from_key(ref_type)
+        _, version = self._write_reference(
+            ref, f"UPDATE {ref.table} SET {ref.column} = %s WHERE {ref.column} = %s RETURNING id",
+            (new_value, old_value)
+        )
+        if self.reference_cache is not None:
+            self.reference_cache.apply_update(ref.key, old_value, new_value, version)
+
+    def delete_reference(self, ref_type: str, value: str) -> None:
+        """Удаление значения из справочника"""
+        ref = ReferenceTables.from_key(ref_type)
+        _, version = self._write_reference(
+            ref, f"DELETE FROM {ref.table} WHERE {ref.column} = %s RETURNING id", (value,)
+        )
+        if self.reference_cache is not None:
+            self.reference_cache.apply_delete(ref.key, value, version)
+
+    @staticmethod
+    def resolve_reference_values_with(cursor, ref: ReferenceTables,
+                                      values: Iterable[str]) -> Tuple[Dict[str, int], int]:
+        """Перевод набора значений справочника в id одним оператором
+
+        Отсутствующие значения создаются тем же оператором. Выполняется на
+        переданном курсоре, чтобы входить в транзакцию вызывающего.
+        Возвращает соответствие значение -> id и число созданных записей.
+        """
+        values = list(dict.fromkeys(value for value in values if value))
+        if not values:
+            return {}, 0
+        if isinstance(cursor, SqliteCursor):
+            return DatabaseManager._resolve_sqlite(cursor, ref, values)
+        cursor.execute(
+            f"""
+            WITH input(value) AS (SELECT DISTINCT unnest(%s::text[])),
+            inserted AS (
+                INSERT INTO {ref.table} ({ref.column})
+                SELECT value FROM input i
+                WHERE NOT EXISTS (SELECT 1 FROM {ref.table} t WHERE t.{ref.column} = i.value)
+                ON CONFLICT DO NOTHING
+                RETURNING id, {ref.column}
+            )
+            SELECT id, {ref.column}, TRUE FROM inserted
+            UNION ALL
+            SELECT t.id, t.{ref.column}, FALSE FROM {ref.table} t
+            JOIN input i ON t.{ref.column} = i.value
+            ORDER BY 1
+            """,
+            (values,)
+        )
+        mapping: Dict[str, int] = {}
+        created = 0
+        for ref_id, value, is_new in cursor.fetchall():
+            mapping.setdefault(value, ref_id)
+            created += bool(is_new)
+        return mapping, created
+
+    @staticmethod
+    def _resolve_sqlite(cursor, ref: ReferenceTables,
+                        values: List[str]) -> Tuple[Dict[str, int], int]:
+        """Вариант resolve_reference_values_with для SQLite
+
+        SQLite не допускает INSERT внутри WITH, поэтому операторов два;
+        список значений передается одним параметром JSON.
+        """
+        payload = json.dumps(values, ensure_ascii=False)
+        cursor.execute(
+            f"""
+            INSERT INTO {ref.table} ({ref.column})
+            SELECT DISTINCT i.value FROM json_each(%s) i
+            WHERE NOT EXISTS (SELECT 1 FROM {ref.table} t WHERE t.{ref.column} = i.value)
+            """,
+            (payload,)
+        )
+        created = max(cursor.rowcount, 0)
+        cursor.execute(
+            f"SELECT id, {ref.column} FROM {ref.table} "
+            f"WHERE {ref.column} IN (SELECT value FROM json_each(%s)) ORDER BY id",
+            (payload,)
+        )
+        mapping: Dict[str, int] = {}
+        for ref_id, value in cursor.fetchall():
+            mapping.setdefault(value, ref_id)
+        return mapping, created
+
+    @staticmethod
+    def lookup_reference_values_with(cursor, ref: ReferenceTables,
+                                     values: Iterable[str]) -> Dict[str, int]:
+        """Id существующих значений справочника (без создания недостающих)"""
+        values = list(dict.fromkeys(value for value in values if value))
+        if not values:
+            return {}
+        if isinstance(cursor, SqliteCursor):
+            cursor.execute(
+                f"SELECT id, {ref.column} FROM {ref.table} "
+                f"WHERE {ref.column} IN (SELECT value FROM json_each(%s)) ORDER BY id",
+                (json.dumps(values, ensure_ascii=False),)
+            )
+        else:
+            cursor.execute(
+                f"SELECT id, {ref.column} FROM {ref.table} WHERE {ref.column} = ANY(%s) ORDER BY id",
+                (values,)
+            )
+        mapping: Dict[str, int] = {}
+        for ref_id, value in cursor.fetchall():
+            mapping.setdefault(value, ref_id)
+        return mapping
+
+    def resolve_reference_values(self, ref_type: str, values: Iterable[str]) -> Dict[str, int]:
+        """Перевод значений справочника в id с созданием недостающих"""
+        ref = ReferenceTables.from_key(ref_type)
+        with self.connection() as conn:
             with conn.cursor() as cursor:
                 try:
-                    cursor.execute(query, params)
+                    mapping, created = self.resolve_reference_values_with(cursor, ref, values)
                     conn.commit()
-                    try:
-                        return cursor.fetchall()
-                    except psycopg2.ProgrammingError:
-                        return []
-                except psycopg2.Error as e:
+                except DRIVER_ERRORS as e:
                     conn.rollback()
                     logging.error(f"Query execution error: {e}")
                     raise DatabaseError(f"Query execution failed: {e}")
+        if created:
+            self.reference_changed(ref.key)
+        return mapping
+
+    def reference_changed(self, ref_type: str) -> None:
+        """Справочник изменен в обход кеша: сбрасываем закешированную копию"""
+        ref = ReferenceTables.from_key(ref_type)
+        if self.reference_cache is not None:
+            self.reference_cache.invalidate(ref.key)
+        self.tables_changed(ref.table)
+
+    @staticmethod
+    def _person_value(field_name: str, value: Any) -> Tuple[str, Any]:
+        """SQL-выражение и параметр для одного поля PersonData
+
+        Поля справочников могут содержать как id, так и отображаемый текст;
+        текст переводится в id подзапросом к справочнику. Значению, которого
+        в справочнике нет, соответствует id 0: в условии оно не совпадает ни
+        с одной записью, а запись его отклоняется внешним ключом. Новые
+        значения перед записью переводятся в id через resolve_references.
+        """
+        for ref in ReferenceTables:
+            if ref.person_field == field_name:
+                if isinstance(value, str):
+                    if not value:
+                        return "%s", None
+                    return f"COALESCE((SELECT id FROM {ref.table} WHERE {ref.column} = %s ORDER BY id LIMIT 1), 0)", value
+                return "%s", value
+        if field_name not in PERSON_COLUMNS:
+            raise ValueError(f"Unknown person field: {field_name}")
+        return "%s", value or None
+
+    def _person_values(self, data: PersonData) -> Tuple[List[str], List[Any]]:
+        """SQL-выражения и параметры для всех полей PersonData (в порядке PERSON_COLUMNS)"""
+        expressions, params = [], []
+        for field_name in PERSON_COLUMNS:
+            expression, param = self._person_value(field_name, getattr(data, field_name))
+            expressions.append(expression)
+            params.append(param)
+        return expressions, params
+
+    @staticmethod
+    def _reference_insert(ref: ReferenceTables) -> str:
+        """Добавление значения справочника, если его еще нет (параметр значения дважды)
+
+        Проверка NOT EXISTS обходится без уникального индекса, а ON CONFLICT
+        при уникальном индексе (миграция 8) защищает от одновременной вставки.
+        """
+        return (f"INSERT INTO {ref.table} ({ref.column}) SELECT %s "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {ref.table} WHERE {ref.column} = %s) "
+                f"ON CONFLICT DO NOTHING")
+
+    @classmethod
+    def _reference_statement(cls, refs: Iterable[ReferenceTables]) -> Tuple[str, Dict[ReferenceTables, str], str]:
+        """WITH-часть, создающая недостающие значения справочников, и выражения их id
+
+        Для каждого справочника INSERT ... RETURNING возвращает id нового
+        значения, а id существующего находит запасной SELECT (при повторах
+        в справочнике без уникального индекса - наименьший). Параметры:
+        значение дважды на каждый справочник для WITH, затем один раз на
+        каждое выражение id. Последнее выражение - число созданных значений.
+        """
+        refs = list(refs)
+        ctes = [f"new_{ref.key} AS ({cls._reference_insert(ref)} RETURNING id)" for ref in refs]
+        expressions = {
+            ref: f"COALESCE((SELECT id FROM new_{ref.key}), "
+                 f"(SELECT id FROM {ref.table} WHERE {ref.column} = %s ORDER BY id LIMIT 1))"
+            for ref in refs
+        }
+        created = " + ".join(f"(SELECT count(*) FROM new_{ref.key})" for ref in refs)
+        return "WITH " + ", ".join(ctes), expressions, created
+
+    @staticmethod
+    def _reference_texts(data: PersonData) -> Dict[ReferenceTables, str]:
+        """Поля справочников PersonData, заданные текстом"""
+        return {ref: getattr(data, ref.person_field) for ref in ReferenceTables
+                if isinstance(getattr(data, ref.person_field), str) and getattr(data, ref.person_field)}
+
+    def resolve_references(self, values: Dict[str, str]) -> Dict[str, int]:
+        """Перевод значений нескольких справочников в id одним оператором
+
+        values - ключ справочника -> текст; недостающие значения создаются.
+        """
+        refs = {ReferenceTables.from_key(key): value for key, value in values.items() if value}
+        if not refs:
+            return {}
+        if self.config.driver == "sqlite":
+            with self._transaction() as cursor:
+                ids, created = self._resolve_references_sqlite(cursor, refs)
+        else:
+            with_clause, expressions, created = self._reference_statement(refs)
+            query = f"{with_clause} SELECT {', '.join(expressions[ref] for ref in refs)}, {created}"
+            params = [value for value in refs.values() for _ in range(2)] + list(refs.values())
+            row = self.execute_query(query, tuple(params), prepare_key=query)[0]
+            ids, created = row[:-1], row[-1]
+        if created:
+            self._references_changed(refs)
+        return {ref.key: ref_id for ref, ref_id in zip(refs, ids)}
+
+    @staticmethod
+    def _resolve_references_sqlite(cursor, refs: Dict[ReferenceTables, str]) -> Tuple[List[int], int]:
+        """Вариант resolve_references для SQLite: INSERT внутри WITH там недоступен"""
+        ids, created = [], 0
+        for ref, value in refs.items():
+            cursor.execute(DatabaseManager._reference_insert(ref), (value, value))
+            created += max(cursor.rowcount, 0)
+            cursor.execute(f"SELECT id FROM {ref.table} WHERE {ref.column} = %s ORDER BY id LIMIT 1", (value,))
+            ids.append(cursor.fetchone()[0])
+        return ids, created
+
+    def _references_changed(self, refs: Iterable[ReferenceTables]) -> None:
+        for ref in refs:
+            self.reference_changed(ref.key)
+
+    @contextmanager
+    def _transaction(self):
+        """Курсор в транзакции: фиксация при успехе, откат и DatabaseError при ошибке драйвера"""
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                try:
+                    yield cursor
+                    conn.commit()
+                except DRIVER_ERRORS as e:
+                    conn.rollback()
+                    logging.error(f"Query execution error: {e}")
+                    raise DatabaseError(f"Query execution failed: {e}")
+
+    def insert_record(self, data: PersonData) -> int:
+        """Добавление записи о человеке
+
+        Значения справочников, заданные текстом, переводятся в id (недостающие
+        создаются) тем же оператором, что добавляет человека: один обмен с сервером.
+        """
+        refs = self._reference_texts(data)
+        expressions, params = self._person_values(data)
+        columns = ", ".join(PERSON_COLUMNS.values())
+        if not refs:
+            query = f"INSERT INTO person ({columns}) VALUES ({', '.join(expressions)}) RETURNING id"
+            return self.execute_query(query, tuple(params), prepare_key=query)[0][0]
+
+        if self.config.driver == "sqlite":
+            with self._transaction() as cursor:
+                ids, created = self._resolve_references_sqlite(cursor, refs)
+                resolved = dict(zip(refs, ids))
+                values = [resolved.get(ref, param) for ref, param in zip(ReferenceTables, params)]
+                values += params[len(ReferenceTables):]
+                cursor.execute(f"INSERT INTO person ({columns}) "
+                               f"VALUES ({', '.join(['%s'] * len(values))}) RETURNING id", tuple(values))
+                person_id = cursor.fetchone()[0]
+            self.tables_changed("person")
+            if created:
+                self._references_changed(refs)
+            return person_id
+
+        with_clause, ref_expressions, created = self._reference_statement(refs)
+        values = []
+        # Параметры в порядке текста: значения справочников для WITH, затем поля
+        query_params = [value for value in refs.values() for _ in range(2)]
+        for ref, expression, param in zip(ReferenceTables, expressions, params):
+            if ref in refs:
+                values.append(ref_expressions[ref])
+                query_params.append(refs[ref])
+            else:
+                values.append(expression)
+                query_params.append(param)
+        values += expressions[len(ReferenceTables):]
+        query_params += params[len(ReferenceTables):]
+        query = (f"{with_clause} INSERT INTO person ({columns}) "
+                 f"SELECT {', '.join(values)} RETURNING id, {created}")
+        person_id, created = self.execute_query(query, tuple(query_params), prepare_key=query)[0]
+        if created:
+            self._references_changed(refs)
+        return person_id
+
+    def update_record(self, old_data: PersonData, new_data: PersonData) -> int:
+        """Обновление записей, совпадающих со старыми значениями
+
+        Новые значения справочников, заданные текстом, создаются, если их нет.
+        """
+        refs = self._reference_texts(new_data)
+        if refs:
+            ids = self.resolve_references({ref.key: value for ref, value in refs.items()})
+            new_data = replace(new_data, **{ref.person_field: ids[ref.key] for ref in refs})
+        new_expressions, new_params = self._person_values(new_data)
+        old_expressions, old_params = self._person_values(old_data)
+        columns = list(PERSON_COLUMNS.values())
+        assignments = ", ".join(f"{col} = {expr}" for col, expr in zip(columns, new_expressions))
+        conditions = " AND ".join(
+            f"{col} IS NOT DISTINCT FROM {expr}" for col, expr in zip(columns, old_expressions)
+        )
+        rows = self.execute_query(
+            f"UPDATE person SET {assignments} WHERE {conditions} RETURNING id",
+            tuple(new_params + old_params)
+        )
+        return len(rows)
+
+    def has_row_version(self) -> bool:
+        """Есть ли в person версия строки; без нее изменения не проверяются на конфликт"""
+        if self.row_versioning is None:
+            if self.config.driver == "sqlite":
+                query = "SELECT count(*) FROM pragma_table_info('person') WHERE name = 'row_version'"
+            else:
+                query = ("SELECT count(*) FROM information_schema.columns WHERE table_schema = current_schema() "
+                         "AND table_name = 'person' AND column_name = 'row_version'")
+            self.row_versioning = bool(self.execute_query(query)[0][0])
+            if not self.row_versioning:
+                logging.warning("person.row_version is missing, updates are not checked for conflicts")
+        return self.row_versioning
+
+    def get_person(self, person_id: int) -> Optional[Tuple[PersonData, Optional[int]]]:
+        """Запись о человеке (id справочников) и версия строки (None, если версий
+        в схеме нет); None, если записи нет"""
+        versioned = self.has_row_version()
+        version_column = ", row_version" if versioned else ""
+        rows = self.execute_query(
+            f"SELECT {', '.join(PERSON_COLUMNS.values())}{version_column} FROM person WHERE id = %s",
+            (person_id,), prepare_key=f"get_person:{versioned}"
+        )
+        if not rows:
+            return None
+        if not versioned:
+            return PersonData(*rows[0]), None
+        *values, version = rows[0]
+        return PersonData(*values), version
+
+    def update_person(self, person_id: int, changes: Dict[str, Any],
+                      expected_version: Optional[int] = None) -> Optional[int]:
+        """Изменение записи по первичному ключу
+
+        changes - только изменившиеся поля PersonData. Значения справочников,
+        заданные текстом, переводятся в id (недостающие создаются) тем же
+        оператором, как в insert_record. Если передан expected_version, запись
+        меняется лишь при совпадении версии строки, иначе выбрасывается
+        ConcurrentModificationError. Возвращает новую версию; None, если
+        версий строк в схеме нет (миграция 7 не применена) - тогда запись
+        меняется без проверки.
+        """
+        versioned = self.has_row_version()
+        refs = {ref: changes[ref.person_field] for ref in ReferenceTables
+                if isinstance(changes.get(ref.person_field), str) and changes[ref.person_field]}
+        ref_fields = {ref.person_field: ref for ref in refs}
+
+        def statement(ref_values: Dict[ReferenceTables, Tuple[str, Any]]) -> Tuple[str, List[Any]]:
+            """UPDATE и его параметры; ref_values - выражение и параметр для справочников из refs"""
+            assignments, params = [], []
+            for field_name, value in changes.items():
+                if field_name in ref_fields:
+                    expression, param = ref_values[ref_fields[field_name]]
+                else:
+                    expression, param = self._person_value(field_name, value)
+                assignments.append(f"{PERSON_COLUMNS[field_name]} = {expression}")
+                params.append(param)
+            if versioned:
+                assignments.append("row_version = row_version + 1")
+            query = f"UPDATE person SET {', '.join(assignments)} WHERE id = %s"
+            params.append(person_id)
+            if versioned and expected_version is not None:
+                query += " AND row_version = %s"
+                params.append(expected_version)
+            return query + (" RETURNING row_version" if versioned else " RETURNING id"), params
+
+        created = 0
+        if self.config.driver == "sqlite":
+            with self._transaction() as cursor:
+                ids, created = self._resolve_references_sqlite(cursor, refs) if refs else ([], 0)
+                query, params = statement({ref: ("%s", ref_id) for ref, ref_id in zip(refs, ids)})
+                cursor.execute(query, tuple(params))
+                row = cursor.fetchone()
+            self.tables_changed("person")
+        elif refs:
+            with_clause, expressions, created_count = self._reference_statement(refs)
+            query, params = statement({ref: (expressions[ref], value) for ref, value in refs.items()})
+            # Параметры в порядке текста: значения справочников для WITH, затем SET и WHERE
+            params = [value for value in refs.values() for _ in range(2)] + params
+            rows = self.execute_query(f"{with_clause} {query}, {created_count}", tuple(params))
+            row = rows[0] if rows else None
+            # Без обновленной строки число созданных значений неизвестно
+            created = row[-1] if row else len(refs)
+        else:
+            query, params = statement({})
+            rows = self.execute_query(query, tuple(params))
+            row = rows[0] if rows else None
+        if created:
+            self._references_changed(refs)
+        if row:
+            return row[0] if versioned else None
+        if not versioned:
+            raise DatabaseError(f"Person {person_id} not found")
+
+        current = self.execute_query("SELECT row_version FROM person WHERE id = %s", (person_id,))
+        if not current:
+            raise DatabaseError(f"Person {person_id} not found")
+        raise ConcurrentModificationError(
+            f"Person {person_id} was modified concurrently "
+            f"(expected version {expected_version}, current {current[0][0]})"
+        )
 
     def handle_parent_table(self, table: str, column: str, operation: str,
                           old_value: Optional[str] = None,
                           new_value: Optional[str] = None) -> Any:
         """Обработка операций с родительскими таблицами"""
-        operations = {
-            'INSERT': f"INSERT INTO {table} ({column}) VALUES (%s)",
-            'DELETE': f"DELETE FROM {table} WHERE {column} = %s",
-            'UPDATE': f"UPDATE {table} SET {column} = %s WHERE {column} = %s",
-            'SELECT': f"SELECT {column} FROM {table}" + (" WHERE {column} = %s" if old_value else "")
-        }
-
-        query = operations.get(operation)
-        if not query:
-            raise ValueError(f"Unsupported operation: {operation}")
+        query = parent_table_query(table, column, operation, bool(old_value))
 
         params = tuple(filter(None, [new_value, old_value])) if operation == 'UPDATE' else (old_value,) if old_value else None
 
         try:
-            return self.execute_query(query, params)
+            return self.execute_query(query, params,
+                                      prepare_key=(table, column, operation, bool(old_value)))
         except DatabaseError as e:
             logging.error(f"Parent table operation failed: {e}")
             return f"Error: table [{table}] or column [{column}] might not exist"
 
-def init_database(config: DatabaseConfig) -> None:
+def init_database(config: DatabaseConfig, manager: Optional[DatabaseManager] = None) -> None:
     """Инициализация базы данных при запуске"""
-    manager = DatabaseManager(config)
+    manager = manager or DatabaseManager(config)
     try:
         # Проверка подключения
         manager.execute_query("SELECT 1")
         logging.info("Database connection successful")
     except DatabaseError as e:
         logging.error(f"Database initialization failed: {e}")
-        raise
\ No newline at end of file
+        raise
+
+    if config.auto_migrate:
+        # Импорт здесь: utils.schema сам зависит от этого модуля
+        from utils.schema import migrate
+        try:
+            report = migrate(manager)
+        except DatabaseError as e:
+            # Без миграций приложение работает, только медленнее
+            logging.warning(f"Schema migration skipped: {e}")
+            return
+        if report.applied:
+            logging.info(
+                f"Schema migrated {report.previous_version} -> {report.current_version}; "
+                f"created indexes: {', '.join(report.created_indexes) or 'none'}"
+            )
\ No newline at end of file
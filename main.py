@@ -1,19 +1,63 @@
+import logging
 import sys
-from PyQt5.QtWidgets import QApplication
-from windows.main_window import MainWindow
-from database_config import DatabaseConfig, init_database
+from utils.startup_profiler import StartupProfiler, PROFILE_FLAG, profiling_requested
 
 
 def main():
+    # Замер запуска: python main.py --profile-startup или PL_PROFILE_STARTUP=1
+    profiler = StartupProfiler(profiling_requested())
+    if profiler.enabled:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+    argv = [arg for arg in sys.argv if arg != PROFILE_FLAG]
     try:
-        # Инициализация базы данных
+        # Модули импортируются здесь, чтобы их время попало в замер;
+        # диалоги окно импортирует само при первом открытии
+        with profiler.phase("import PyQt5"):
+            from PyQt5.QtWidgets import QApplication
+            from PyQt5.QtCore import QTimer
+        with profiler.phase("import database_config"):
+            from database_config import DatabaseConfig, DatabaseManager, init_database
+            from utils.db_worker import DatabaseExecutor
+        with profiler.phase("import main_window"):
+            from windows.main_window import MainWindow
+            from utils.local_snapshot import LocalSnapshot, default_snapshot_path
+
+        with profiler.phase("QApplication"):
+            app = QApplication(argv)
         db_config = DatabaseConfig()
-        init_database(db_config)
 
-        # Запуск приложения
-        app = QApplication(sys.argv)
-        window = MainWindow()
-        window.show()
+        # Окно создается и показывается до любого обращения к серверу
+        with profiler.phase("MainWindow"):
+            executor = DatabaseExecutor.instance()
+            db_manager = DatabaseManager(db_config)
+            snapshot = None
+            if db_config.driver == "postgresql" and db_config.local_snapshot_enabled:
+                snapshot = LocalSnapshot(db_config.local_snapshot_path or default_snapshot_path(db_config))
+            window = MainWindow(db_manager, executor, snapshot)
+        with profiler.phase("show"):
+            window.show()
+        # Первый проход цикла событий начинается с отрисовки окна
+        QTimer.singleShot(0, lambda: profiler.mark("first paint"))
+        # Список из прошлого сеанса показывается сразу, до ответа сервера
+        with profiler.phase("local snapshot"):
+            window.load_snapshot()
+
+        def on_started(_):
+            profiler.report()
+            window.load_data()
+            window.start_change_listener()
+
+        def on_start_failed(message: str):
+            profiler.report()
+            window.on_startup_failed(message)
+
+        # Подключение и миграции в фоне: окно не ждет сервер
+        executor.submit(
+            "startup", profiler.wrap("init_database (background)", init_database),
+            db_config, db_manager,
+            on_finished=on_started,
+            on_failed=on_start_failed
+        )
         sys.exit(app.exec_())
 
     except Exception as e:
@@ -22,4 +66,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, List
 from utils.enums import FieldTypes
 
 @dataclass
@@ -15,9 +15,9 @@ class FormField:
     required: bool = False
     default_value: Optional[str] = None
 
-@dataclass
+@dataclass(slots=True)
 class PersonData:
-    """Модель данных о человеке"""
+    """Модель данных о человеке (без __dict__: экземпляров может быть много)"""
     fam_id: Optional[int]
     name_id: Optional[int]
     second_name_id: Optional[int]
@@ -32,4 +32,11 @@ class QueryResult:
     """Модель результата запроса"""
     success: bool
     data: Optional[list] = None
-    error: Optional[str] = None
\ No newline at end of file
+    error: Optional[str] = None
+
+@dataclass
+class QueryPage:
+    """Страница результата с токенами продолжения"""
+    rows: List[tuple]
+    next_token: Optional[str] = None
+    prev_token: Optional[str] = None
@@ -24,7 +24,7 @@ class InsertDialogConfig(BaseWindowConfig):
     """Конфигурация окна добавления"""
     title: str = "Добавление записи"
     width: int = 438
-    height: int = 381
+    height: int = 420
     field_height: int = 25
 
 @dataclass
@@ -0,0 +1,154 @@
+import json
+import logging
+import select
+import time
+from dataclasses import dataclass, field
+from typing import Set
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from database_config import DatabaseConfig, DRIVER_ERRORS, connect
+from utils.enums import ReferenceTables
+from utils.schema import CHANGE_CHANNEL
+
+# Пауза между попытками переподключения (сек.)
+RECONNECT_DELAY = 5.0
+# Предел ожидания соединения с сервером (сек.): дольше поток не занят ничем,
+# кроме проверки флага остановки
+CONNECT_TIMEOUT = 5
+# Сколько stop ждет завершения потока (мс)
+STOP_TIMEOUT_MS = 1000
+
+# Потоки, не успевшие остановиться за STOP_TIMEOUT_MS: ссылка держится, пока
+# они не завершатся, иначе Qt уничтожил бы работающий поток вместе с окном
+_stopping: Set["ChangeListener"] = set()
+
+
+@dataclass
+class ChangeBatch:
+    """Изменения, накопленные за одну паузу в потоке уведомлений
+
+    reload - изменения людей без списка id (массовый оператор, TRUNCATE):
+    список нужно перечитать целиком. renamed - справочники, значения
+    которых изменились (затрагивает отображение многих строк).
+    """
+    upserted: Set[int] = field(default_factory=set)
+    deleted: Set[int] = field(default_factory=set)
+    references: Set[str] = field(default_factory=set)
+    renamed: Set[str] = field(default_factory=set)
+    reload: bool = False
+
+    def add(self, payload: dict) -> None:
+        """Учет одного уведомления {"table", "op", "ids"}"""
+        table, operation, ids = payload.get("table"), payload.get("op"), payload.get("ids")
+        if table == "person":
+            if ids is None:
+                self.reload = True
+            elif operation == "DELETE":
+                self.deleted.update(ids)
+                self.upserted.difference_update(ids)
+            else:
+                self.upserted.update(ids)
+                self.deleted.difference_update(ids)
+            return
+        for ref in ReferenceTables:
+            if ref.table == table:
+                self.references.add(ref.key)
+                if operation in ("UPDATE", "TRUNCATE"):
+                    self.renamed.add(ref.key)
+
+    def __bool__(self) -> bool:
+        return bool(self.upserted or self.deleted or self.references or self.reload)
+
+
+class ChangeListener(QThread):
+    """Фоновое соединение, слушающее уведомления об изменениях (LISTEN)
+
+    Уведомления копятся, пока поток не затихнет на debounce_ms (но не
+    дольше max_delay_ms), и отдаются сигналом changed одной пачкой
+    ChangeBatch в потоке GUI. После обрыва соединение восстанавливается, а
+    сигнал reconnected сообщает, что часть уведомлений могла потеряться.
+    """
+
+    changed = pyqtSignal(object)
+    reconnected = pyqtSignal()
+
+    def __init__(self, config: DatabaseConfig, debounce_ms: int = 200,
+                 max_delay_ms: int = 2000, parent=None):
+        super().__init__(parent)
+        self.config = config
+        self.debounce = debounce_ms / 1000
+        self.max_delay = max_delay_ms / 1000
+        self._running = True
+
+    def stop(self, timeout_ms: int = STOP_TIMEOUT_MS) -> bool:
+        """Остановка потока; ждет не дольше timeout_ms
+
+        False - поток еще подключается к серверу (не дольше CONNECT_TIMEOUT);
+        он отсоединяется от родителя и завершится сам.
+        """
+        self._running = False
+        if self.wait(timeout_ms):
+            return True
+        logging.warning("Change listener is still connecting, leaving it to finish in background")
+        self.setParent(None)
+        _stopping.add(self)
+        self.finished.connect(lambda: _stopping.discard(self))
+        return False
+
+    def run(self) -> None:
+        connected_before = False
+        while self._running:
+            conn = None
+            try:
+                conn = connect(self.config, CONNECT_TIMEOUT)
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANGE_CHANNEL}")
+                if connected_before:
+                    self.reconnected.emit()
+                connected_before = True
+                self._listen(conn)
+            except DRIVER_ERRORS as e:
+                logging.warning(f"Change listener connection lost: {e}")
+            except Exception as e:
+                # Любая другая ошибка не должна останавливать поток: после
+                # паузы соединение открывается заново
+                logging.error(f"Change listener failed: {e}", exc_info=True)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except DRIVER_ERRORS:
+                        pass
+            deadline = time.monotonic() + RECONNECT_DELAY
+            while self._running and time.monotonic() < deadline:
+                self.msleep(100)
+
+    def _listen(self, conn) -> None:
+        batch = ChangeBatch()
+        first = last = None
+        while self._running:
+            if first is None:
+                timeout = 0.5
+            else:
+                now = time.monotonic()
+                timeout = max(0.0, min(last + self.debounce, first + self.max_delay) - now)
+            if select.select([conn], [], [], timeout)[0]:
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    try:
+                        batch.add(json.loads(notify.payload))
+                    except (ValueError, AttributeError) as e:
+                        logging.warning(f"Malformed change notification: {e}")
+                        continue
+                    last = time.monotonic()
+                    first = first or last
+            if first is not None:
+                now = time.monotonic()
+                if now >= last + self.debounce or now >= first + self.max_delay:
+                    if batch:
+                        self.changed.emit(batch)
+                    batch = ChangeBatch()
+                    first = last = None
@@ -0,0 +1,209 @@
+import threading
+import time
+import logging
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Deque, Dict, Tuple
+
+
+class PoolTimeout(Exception):
+    """Не удалось получить соединение из пула за отведенное время"""
+    pass
+
+
+@dataclass
+class PoolStats:
+    """Статистика использования пула соединений"""
+    checkouts: int = 0
+    connections_created: int = 0
+    connections_closed: int = 0
+    health_check_failures: int = 0
+    timeouts: int = 0
+    total_wait_time: float = 0.0
+    max_wait_time: float = 0.0
+
+    @property
+    def average_wait_time(self) -> float:
+        return self.total_wait_time / self.checkouts if self.checkouts else 0.0
+
+
+class ConnectionPool:
+    """Потокобезопасный пул соединений с проверкой и сбросом состояния"""
+
+    def __init__(self,
+                 connect: Callable[[], Any],
+                 min_size: int = 1,
+                 max_size: int = 10,
+                 idle_timeout: float = 300.0,
+                 checkout_timeout: float = 30.0,
+                 health_check: bool = True,
+                 reset_on_return: bool = True):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min={min_size}, max={max_size}")
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.health_check = health_check
+        self.reset_on_return = reset_on_return
+
+        # Condition по умолчанию построен на RLock, поэтому допускает вложенный захват
+        self._lock = threading.Condition()
+        # Свободные соединения с временем возврата; берем с конца (LIFO),
+        # чтобы простаивающие дольше всех оставались в начале и закрывались первыми
+        self._idle: Deque[Tuple[Any, float]] = deque()
+        self._in_use = 0
+        self._closed = False
+        self._close_listeners: list = []
+        self.stats = PoolStats()
+
+        for _ in range(min_size):
+            self._idle.append((self._create(), time.monotonic()))
+
+    def _create(self) -> Any:
+        """Открытие нового соединения"""
+        conn = self._connect()
+        with self._lock:
+            self.stats.connections_created += 1
+        return conn
+
+    def _discard(self, conn: Any) -> None:
+        """Закрытие соединения, выбывающего из пула"""
+        for listener in self._close_listeners:
+            listener(conn)
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception as e:
+            logging.warning(f"Error closing pooled connection: {e}")
+        self.stats.connections_closed += 1
+
+    def add_close_listener(self, listener: Callable[[Any], None]) -> None:
+        """Подписка на закрытие соединений (например, для сброса кешей)"""
+        self._close_listeners.append(listener)
+
+    def _is_alive(self, conn: Any) -> bool:
+        """Проверка работоспособности соединения перед выдачей"""
+        if conn.closed:
+            return False
+        if not self.health_check:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            logging.warning(f"Pooled connection failed health check: {e}")
+            self.stats.health_check_failures += 1
+            return False
+
+    def _prune_idle(self) -> None:
+        """Закрытие соединений, простаивающих дольше idle_timeout"""
+        if not self.idle_timeout:
+            return
+        deadline = time.monotonic() - self.idle_timeout
+        while (self._idle and self._idle[0][1] < deadline
+               and len(self._idle) + self._in_use > self.min_size):
+            conn, _ = self._idle.popleft()
+            self._discard(conn)
+
+    def getconn(self) -> Any:
+        """Получение соединения из пула"""
+        started = time.monotonic()
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+
+                self._prune_idle()
+                if self._idle:
+                    conn, _ = self._idle.pop()
+                    self._in_use += 1
+                    break
+
+                if self._in_use < self.max_size:
+                    # Слот резервируется до подключения, чтобы не превысить max_size
+                    self._in_use += 1
+                    conn = None
+                    break
+
+                remaining = self.checkout_timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self.stats.timeouts += 1
+                    raise PoolTimeout(
+                        f"No free connection within {self.checkout_timeout}s "
+                        f"(max_size={self.max_size})"
+                    )
+                self._lock.wait(remaining)
+
+        try:
+            if conn is not None and not self._is_alive(conn):
+                with self._lock:
+                    self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._create()
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+
+        waited = time.monotonic() - started
+        with self._lock:
+            self.stats.checkouts += 1
+            self.stats.total_wait_time += waited
+            self.stats.max_wait_time = max(self.stats.max_wait_time, waited)
+        return conn
+
+    def _reset(self, conn: Any) -> bool:
+        """Возврат соединения в исходное состояние; False, если оно непригодно"""
+        if conn.closed:
+            return False
+        try:
+            if self.reset_on_return:
+                # Откат незавершенной транзакции и RESET ALL для параметров сессии
+                conn.reset()
+            else:
+                conn.rollback()
+            return True
+        except Exception as e:
+            logging.warning(f"Failed to reset pooled connection: {e}")
+            return False
+
+    def putconn(self, conn: Any) -> None:
+        """Возврат соединения в пул"""
+        usable = self._reset(conn)
+        with self._lock:
+            self._in_use -= 1
+            if usable and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._discard(conn)
+            self._prune_idle()
+            self._lock.notify()
+
+    def closeall(self) -> None:
+        """Закрытие всех свободных соединений и пула"""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._discard(conn)
+            self._lock.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Снимок статистики пула"""
+        with self._lock:
+            stats = asdict(self.stats)
+            stats.update(
+                average_wait_time=self.stats.average_wait_time,
+                idle=len(self._idle),
+                in_use=self._in_use,
+                min_size=self.min_size,
+                max_size=self.max_size,
+            )
+            return stats
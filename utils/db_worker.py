@@ -0,0 +1,168 @@
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+import itertools
+import logging
+import threading
+
+
+@dataclass
+class DatabaseRequest:
+    """Запрос к базе, ожидающий выполнения в пуле потоков"""
+    key: str
+    func: Callable[..., Any]
+    args: Tuple[Any, ...] = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    on_finished: Optional[Callable[[Any], None]] = None
+    on_failed: Optional[Callable[[str], None]] = None
+    on_stale: Optional[Callable[[Any], None]] = None
+    generation: int = 0
+
+
+class TaskSignals(QObject):
+    """Сигналы, через которые рабочие потоки передают результат в поток GUI"""
+    done = pyqtSignal(int, object)
+    error = pyqtSignal(int, str)
+
+
+class DatabaseTask(QRunnable):
+    """Задача пула: выполняет самый свежий запрос по своему ключу"""
+
+    def __init__(self, executor: "DatabaseExecutor", key: str):
+        super().__init__()
+        self.executor = executor
+        self.key = key
+
+    def run(self):
+        request = self.executor._take(self.key)
+        if request is None:
+            return
+        try:
+            result = request.func(*request.args, **request.kwargs)
+        except Exception as e:
+            logging.error(f"Background database task '{request.key}' failed: {e}")
+            self.executor._signals.error.emit(request.generation, str(e))
+        else:
+            self.executor._signals.done.emit(request.generation, result)
+
+
+class DatabaseExecutor(QObject):
+    """Выполнение операций с базой вне потока GUI
+
+    Результаты возвращаются через сигналы Qt (и необязательные обратные
+    вызовы) в потоке, где создан исполнитель. Запросы с одинаковым ключом
+    объединяются: пока запрос ждет в очереди, новый заменяет его, а
+    результат уже выполняющегося устаревшего запроса отбрасывается
+    (on_stale позволяет освободить его, например закрыть курсор).
+    Записи без ключа выполняются каждая отдельно.
+    """
+
+    started = pyqtSignal(str)
+    finished = pyqtSignal(str, object)
+    failed = pyqtSignal(str, str)
+    busy_changed = pyqtSignal(bool)
+
+    _instance: Optional["DatabaseExecutor"] = None
+
+    def __init__(self, max_threads: int = 4, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._lock = threading.Lock()
+        self._pending: Dict[str, DatabaseRequest] = {}
+        self._queued: set = set()
+        self._active: Dict[int, DatabaseRequest] = {}
+        self._latest: Dict[str, int] = {}
+        self._counter = itertools.count(1)
+        self._signals = TaskSignals()
+        self._signals.done.connect(self._on_done)
+        self._signals.error.connect(self._on_error)
+
+    @classmethod
+    def instance(cls) -> "DatabaseExecutor":
+        """Общий исполнитель приложения"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @property
+    def busy(self) -> bool:
+        return bool(self._active)
+
+    def submit(self, key: Optional[str], func: Callable[..., Any], *args,
+               on_finished: Optional[Callable[[Any], None]] = None,
+               on_failed: Optional[Callable[[str], None]] = None,
+               on_stale: Optional[Callable[[Any], None]] = None,
+               **kwargs) -> int:
+        """Постановка операции в очередь; возвращает номер запроса"""
+        generation = next(self._counter)
+        key = key or f"task-{generation}"
+        request = DatabaseRequest(key, func, args, kwargs, on_finished, on_failed,
+                                  on_stale, generation)
+
+        was_busy = self.busy
+        with self._lock:
+            replaced = self._pending.get(key)
+            if replaced is not None:
+                self._active.pop(replaced.generation, None)
+            self._pending[key] = request
+            self._latest[key] = generation
+            self._active[generation] = request
+            enqueue = key not in self._queued
+            self._queued.add(key)
+
+        if enqueue:
+            self.pool.start(DatabaseTask(self, key))
+        if not was_busy:
+            self.busy_changed.emit(True)
+        return generation
+
+    def cancel(self, key: str) -> None:
+        """Отмена запроса: ожидающий не будет выполнен, результат выполняющегося отброшен"""
+        with self._lock:
+            request = self._pending.pop(key, None)
+            if request is not None:
+                self._active.pop(request.generation, None)
+            self._latest[key] = 0
+        if not self.busy:
+            self.busy_changed.emit(False)
+
+    def _take(self, key: str) -> Optional[DatabaseRequest]:
+        """Извлечение запроса рабочим потоком"""
+        with self._lock:
+            self._queued.discard(key)
+            request = self._pending.pop(key, None)
+        if request is not None:
+            self.started.emit(key)
+        return request
+
+    def _complete(self, generation: int) -> Tuple[Optional[DatabaseRequest], bool]:
+        """Снятие запроса с учета; возвращает запрос и признак актуальности результата"""
+        with self._lock:
+            request = self._active.pop(generation, None)
+            current = request is not None and self._latest.get(request.key) == generation
+        if not self.busy:
+            self.busy_changed.emit(False)
+        return request, current
+
+    def _on_done(self, generation: int, result: Any) -> None:
+        request, current = self._complete(generation)
+        if not current:
+            if request is not None and request.on_stale:
+                request.on_stale(result)
+            return
+        self.finished.emit(request.key, result)
+        if request.on_finished:
+            request.on_finished(result)
+
+    def _on_error(self, generation: int, message: str) -> None:
+        request, current = self._complete(generation)
+        if not current:
+            return
+        self.failed.emit(request.key, message)
+        if request.on_failed:
+            request.on_failed(message)
+
+    def wait(self, timeout_ms: int = -1) -> bool:
+        """Ожидание завершения всех задач (например, при закрытии приложения)"""
+        return self.pool.waitForDone(timeout_ms)
@@ -38,4 +38,25 @@ class TableColumns(Enum):
     def __init__(self, db_field: str, title: str, index: int):
         self.db_field = db_field
         self.title = title
-        self.index = index
\ No newline at end of file
+        self.index = index
+
+class ReferenceTables(Enum):
+    """Справочные таблицы"""
+    FAM = ("fam", "fam", "fam", "fam_id")
+    NAME = ("name", "names", "names", "name_id")
+    SECOND_NAME = ("second_name", "second_name", "second_name", "second_name_id")
+    STREET = ("street", "street", "street", "street_id")
+
+    def __init__(self, key: str, table: str, column: str, person_field: str):
+        self.key = key
+        self.table = table
+        self.column = column
+        self.person_field = person_field
+
+    @classmethod
+    def from_key(cls, key: str) -> "ReferenceTables":
+        """Поиск справочника по имени поля формы или таблицы"""
+        for ref in cls:
+            if key in (ref.key, ref.table):
+                return ref
+        raise ValueError(f"Unknown reference type: {key}")
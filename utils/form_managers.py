@@ -1,9 +1,11 @@
 from PyQt5.QtWidgets import (QWidget, QLabel, QComboBox, QLineEdit,
-                             QPushButton, QHBoxLayout, QVBoxLayout)
-from PyQt5.QtCore import Qt, QRect
+                             QPushButton, QHBoxLayout, QVBoxLayout, QCompleter)
+from PyQt5.QtCore import Qt, QRect, QStringListModel
 from PyQt5.QtGui import QFont
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable
 from dataclasses import dataclass
+from utils.enums import FieldTypes
+from utils.prefix_index import PrefixIndex
 
 
 @dataclass
@@ -15,6 +17,66 @@ class FormConfig:
     button_min_height: int = 40
     field_height: int = 25
     margin: int = 10
+    # Справочники больше порога показываются через подсказки по префиксу
+    completer_threshold: int = 1000
+    completer_max_matches: int = 50
+
+
+class ReferenceComboBox(QComboBox):
+    """Список значений справочника
+
+    Небольшие справочники заполняются как обычный QComboBox. Для больших
+    элементы не создаются: значения хранятся в PrefixIndex, а при вводе
+    всплывающая подсказка показывает первые max_matches совпадений.
+    """
+
+    def __init__(self, parent: Optional[QWidget] = None,
+                 threshold: int = 1000, max_matches: int = 50):
+        super().__init__(parent)
+        self.threshold = threshold
+        self.max_matches = max_matches
+        self.index = PrefixIndex()
+        self._matches = QStringListModel(self)
+
+    @property
+    def completer_mode(self) -> bool:
+        return len(self.index) > 0
+
+    def set_values(self, values: Iterable[str], add_empty: bool = False) -> None:
+        """Заполнение значениями справочника"""
+        values = list(values)
+        self.clear()
+        if len(values) <= self.threshold:
+            self.index = PrefixIndex()
+            self.setEditable(False)
+            self.addItems([""] + values if add_empty else values)
+            return
+
+        self.index = PrefixIndex(values)
+        if not self.isEditable():
+            # Поле ввода создается заново при каждом включении редактирования
+            self.setEditable(True)
+            self.setInsertPolicy(QComboBox.NoInsert)
+            completer = QCompleter(self._matches, self)
+            completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+            completer.setCaseSensitivity(Qt.CaseInsensitive)
+            self.setCompleter(completer)
+            self.lineEdit().textEdited.connect(self.update_matches)
+        self.setEditText("")
+
+    def update_matches(self, text: str) -> None:
+        """Обновление подсказок для введенного префикса"""
+        self._matches.setStringList(self.index.matches(text, self.max_matches) if text else [])
+        if text:
+            self.completer().complete()
+
+    def set_current_value(self, value: str) -> None:
+        """Выбор значения (в режиме подсказок - установка текста)"""
+        if self.completer_mode:
+            self.setEditText(value if value in self.index else "")
+            return
+        index = self.findText(value)
+        self.setCurrentIndex(index if index >= 0 else 0)
 
 
 class FormManager:
@@ -52,7 +114,11 @@ class FormManager:
                            geometry: Optional[QRect] = None,
                            placeholder: str = "") -> QWidget:
         """Создание поля ввода с дополнительными параметрами"""
-        widget = QComboBox(parent) if is_combo else QLineEdit(parent)
+        if isinstance(is_combo, FieldTypes):
+            is_combo = is_combo == FieldTypes.COMBO
+        widget = ReferenceComboBox(parent, self.config.completer_threshold,
+                                   self.config.completer_max_matches) \
+            if is_combo else QLineEdit(parent)
 
         if geometry:
             widget.setGeometry(geometry)
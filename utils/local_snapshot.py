@@ -0,0 +1,262 @@
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from database_config import (DatabaseConfig, DatabaseManager, DatabaseError, DRIVER_ERRORS,
+                             PageCursor, PERSON_COLUMNS, PERSON_LISTING_QUERY)
+from utils.enums import ReferenceTables
+
+# Отметки изменений для инкрементальной синхронизации: время последнего
+# изменения строки (ставит триггер) и журнал удаленных id
+CHANGE_TRACKING_DDL = [
+    # DEFAULT now() не переписывает таблицу при добавлении колонки
+    "ALTER TABLE person ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now()",
+    "CREATE INDEX IF NOT EXISTS person_updated_at_idx ON person (updated_at)",
+    """
+    CREATE TABLE IF NOT EXISTS person_deletions (
+        id integer PRIMARY KEY,
+        deleted_at timestamptz NOT NULL DEFAULT clock_timestamp()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS person_deletions_deleted_at_idx ON person_deletions (deleted_at)",
+    """
+    CREATE OR REPLACE FUNCTION person_touch() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.updated_at := clock_timestamp();
+        RETURN NEW;
+    END
+    $$
+    """,
+    "DROP TRIGGER IF EXISTS person_touch ON person",
+    "CREATE TRIGGER person_touch BEFORE INSERT OR UPDATE ON person "
+    "FOR EACH ROW EXECUTE PROCEDURE person_touch()",
+    """
+    CREATE OR REPLACE FUNCTION person_tombstone() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO person_deletions (id) VALUES (OLD.id)
+        ON CONFLICT (id) DO UPDATE SET deleted_at = clock_timestamp();
+        RETURN NULL;
+    END
+    $$
+    """,
+    "DROP TRIGGER IF EXISTS person_tombstone ON person",
+    "CREATE TRIGGER person_tombstone AFTER DELETE ON person "
+    "FOR EACH ROW EXECUTE PROCEDURE person_tombstone()",
+]
+
+SYNC_STATE_DDL = "CREATE TABLE IF NOT EXISTS sync_state (key text PRIMARY KEY, value text NOT NULL)"
+
+# Изменения перечитываются с запасом: строка получает updated_at до фиксации
+# своей транзакции и может стать видимой позже более новых строк
+SYNC_OVERLAP_SECONDS = 60
+# Больше стольких измененных строк модель проще перечитать целиком
+DELTA_ROWS_LIMIT = 5000
+
+PERSON_SYNC_COLUMNS = ["id"] + list(PERSON_COLUMNS.values())
+
+
+def cache_dir() -> str:
+    """Каталог кеша пользователя для данных приложения"""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "pl_first")
+
+
+def default_snapshot_path(config: DatabaseConfig) -> str:
+    """Файл снимка для базы из config (у каждой базы свой)"""
+    return os.path.join(cache_dir(), f"{config.host}_{config.name}.sqlite3")
+
+
+@dataclass
+class SyncResult:
+    """Изменения, внесенные в снимок синхронизацией
+
+    reload - снимок построен заново или изменились справочники (то есть
+    отображение многих строк): модель проще перечитать целиком.
+    """
+    reload: bool = False
+    upserts: List[tuple] = field(default_factory=list)
+    deleted: List[Any] = field(default_factory=list)
+
+
+class LocalSnapshot:
+    """Локальная копия списка людей и справочников в файле SQLite
+
+    Окно показывает список из снимка сразу при запуске, а sync() в фоне
+    приносит с сервера только строки, измененные после прошлой
+    синхронизации (по person.updated_at и журналу person_deletions).
+    Время запуска поэтому не зависит от размера таблицы.
+    """
+
+    def __init__(self, path: str, batch_size: int = 10000):
+        self.path = path
+        self.batch_size = batch_size
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = DatabaseManager(DatabaseConfig(
+            driver="sqlite", sqlite_path=path, pool_enabled=True, pool_max_size=4,
+            reference_cache_enabled=False, slow_query_threshold_ms=0.0
+        ))
+        self._prepared = False
+        self._sync_lock = threading.Lock()
+
+    def _prepare(self) -> None:
+        """Создание схемы снимка при первом обращении"""
+        if self._prepared:
+            return
+        # Импорт здесь: utils.schema сам импортирует этот модуль
+        from utils.schema import migrate
+        migrate(self.db)
+        self.db.execute_query(SYNC_STATE_DDL)
+        self._prepared = True
+
+    def _state(self) -> Dict[str, str]:
+        self._prepare()
+        return dict(self.db.execute_query("SELECT key, value FROM sync_state"))
+
+    @property
+    def ready(self) -> bool:
+        """Есть ли в снимке хотя бы одна завершенная синхронизация"""
+        try:
+            return "watermark" in self._state()
+        except DatabaseError:
+            return False
+
+    def open_listing(self) -> Optional[PageCursor]:
+        """Курсор по списку из снимка или None, если снимок еще пуст
+
+        Keyset-курсор не держит транзакцию чтения между порциями и не
+        мешает синхронизации писать в файл.
+        """
+        if not self.ready:
+            return None
+        return self.db.open_page_cursor(PERSON_LISTING_QUERY, ("id",))
+
+    def sync(self, server: DatabaseManager) -> SyncResult:
+        """Перенос изменений с сервера в снимок
+
+        Сервер читается в одной транзакции REPEATABLE READ, поэтому
+        справочники и люди согласованы между собой.
+        """
+        with self._sync_lock:
+            state = self._state()
+            with server.connection() as remote, self.db.connection() as local:
+                try:
+                    result, new_state = self._sync(remote, local, state)
+                    local.commit()
+                except DRIVER_ERRORS as e:
+                    local.rollback()
+                    logging.error(f"Snapshot sync failed: {e}")
+                    raise DatabaseError(f"Snapshot sync failed: {e}")
+                except DatabaseError:
+                    local.rollback()
+                    raise
+                finally:
+                    remote.rollback()
+
+        if not result.reload:
+            result.upserts = self.db.get_person_rows([row[0] for row in result.upserts])
+        logging.info(
+            f"Snapshot synced: {'full reload' if result.reload else f'{len(result.upserts)} changed'}, "
+            f"{len(result.deleted)} deleted, watermark {new_state['watermark']}"
+        )
+        return result
+
+    def _sync(self, remote, local, state: Dict[str, str]) -> Tuple[SyncResult, Dict[str, str]]:
+        result = SyncResult(reload="watermark" not in state)
+        with remote.cursor() as server, local.cursor() as cursor:
+            server.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            server.execute("SELECT now(), to_regclass('reference_versions') IS NOT NULL, "
+                           "to_regclass('person_deletions') IS NOT NULL")
+            server_time, versioned, tracked = server.fetchone()
+            if not tracked:
+                raise DatabaseError("Server schema has no change tracking, apply migrations first")
+            # Порядок применения справочников и людей неважен: внешние ключи
+            # проверяются при фиксации
+            cursor.execute("PRAGMA defer_foreign_keys = ON")
+
+            versions = json.loads(state.get("reference_versions", "{}"))
+            if versioned:
+                server.execute("SELECT table_name, version FROM reference_versions")
+                current = {table: version for table, version in server.fetchall()}
+            else:
+                current = {}
+            for ref in ReferenceTables:
+                if versioned and not result.reload and versions.get(ref.table) == current.get(ref.table):
+                    continue
+                if self._sync_reference(server, cursor, ref):
+                    result.reload = True
+
+            if "watermark" in state:
+                server.execute(
+                    "SELECT id FROM person_deletions WHERE deleted_at > %s::timestamptz - %s * interval '1 second'",
+                    (state["watermark"], SYNC_OVERLAP_SECONDS)
+                )
+                result.deleted = [row[0] for row in server.fetchall()]
+                cursor.executemany("DELETE FROM person WHERE id = %s", [(key,) for key in result.deleted])
+                condition = " WHERE updated_at > %s::timestamptz - %s * interval '1 second'"
+                params = (state["watermark"], SYNC_OVERLAP_SECONDS)
+            else:
+                cursor.execute("DELETE FROM person")
+                condition, params = "", None
+
+        upsert = (f"INSERT OR REPLACE INTO person ({', '.join(PERSON_SYNC_COLUMNS)}) "
+                  f"VALUES ({', '.join(['%s'] * len(PERSON_SYNC_COLUMNS))})")
+        with remote.cursor(name=f"snapshot_{uuid.uuid4().hex}") as stream, local.cursor() as cursor:
+            stream.itersize = self.batch_size
+            stream.execute(f"SELECT {', '.join(PERSON_SYNC_COLUMNS)} FROM person{condition}", params)
+            while True:
+                rows = stream.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                cursor.executemany(upsert, rows)
+                if not result.reload:
+                    result.upserts.extend(rows)
+                    if len(result.upserts) > DELTA_ROWS_LIMIT:
+                        result.reload = True
+                        result.upserts = []
+
+            new_state = {
+                "watermark": server_time.isoformat(),
+                "reference_versions": json.dumps(current),
+            }
+            cursor.executemany("INSERT OR REPLACE INTO sync_state (key, value) VALUES (%s, %s)",
+                               list(new_state.items()))
+        return result, new_state
+
+    @staticmethod
+    def _sync_reference(server, cursor, ref: ReferenceTables) -> bool:
+        """Замена справочника снимка серверной версией; True, если он изменился"""
+        server.execute(f"SELECT id, {ref.column} FROM {ref.table} ORDER BY id")
+        rows = server.fetchall()
+        cursor.execute(f"SELECT id, {ref.column} FROM {ref.table} ORDER BY id")
+        if cursor.fetchall() == rows:
+            return False
+        insert = f"INSERT INTO {ref.table} (id, {ref.column}) VALUES (%s, %s)"
+        cursor.execute(f"DELETE FROM {ref.table}")
+        try:
+            cursor.executemany(insert, rows)
+        except sqlite3.IntegrityError as e:
+            # На сервере еще есть повторы значений (миграция 8 там не
+            # применена); снимку, повторяющему сервер, уникальность не нужна
+            logging.warning(f"Repeated values in {ref.table}, snapshot keeps them: {e}")
+            cursor.execute(f"DROP INDEX IF EXISTS {ref.table}_{ref.column}_key")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {ref.table}_{ref.column}_idx "
+                           f"ON {ref.table} ({ref.column})")
+            cursor.execute(f"DELETE FROM {ref.table}")
+            cursor.executemany(insert, rows)
+        return True
+
+    def close(self) -> None:
+        self.db.close()
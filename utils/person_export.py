@@ -0,0 +1,121 @@
+import argparse
+import csv
+import logging
+import sys
+import time
+from typing import Dict, List, Optional, TextIO, Tuple, Union
+
+try:
+    import psycopg2.extensions
+except ImportError:  # без psycopg2 доступен только встроенный SQLite
+    psycopg2 = None
+
+from database_config import (DatabaseConfig, DatabaseManager, DatabaseError, DRIVER_ERRORS,
+                             PERSON_LISTING_QUERY, person_filter_clause)
+from utils.enums import TableColumns
+
+# Строк за одно чтение при выгрузке из SQLite
+EXPORT_CHUNK_SIZE = 5000
+
+
+def _export_select(filters: Optional[Dict[str, str]]) -> Tuple[str, List[str]]:
+    """SELECT выгрузки списка людей и его параметры"""
+    where, params = person_filter_clause(filters)
+    columns = ", ".join(f"listing.{column.db_field}" for column in TableColumns)
+    return (f"SELECT {columns} FROM ({PERSON_LISTING_QUERY}{where}) AS listing"
+            f" ORDER BY listing.id"), params
+
+
+def build_export_query(conn, filters: Optional[Dict[str, str]] = None) -> str:
+    """COPY-запрос выгрузки списка людей с подставленными параметрами фильтра
+
+    COPY не принимает параметры, поэтому значения подставляются через
+    mogrify - с тем же экранированием, что и в обычных запросах.
+    """
+    query, params = _export_select(filters)
+    with conn.cursor() as cursor:
+        select = cursor.mogrify(query, params)
+    encoding = psycopg2.extensions.encodings.get(conn.encoding, "utf-8")
+    return f"COPY ({select.decode(encoding)}) TO STDOUT WITH (FORMAT csv)"
+
+
+def export_persons_csv(db: DatabaseManager, target: Union[str, TextIO],
+                       filters: Optional[Dict[str, str]] = None,
+                       encoding: str = "utf-8") -> int:
+    """Потоковая выгрузка списка людей в CSV; возвращает число строк
+
+    Сервер отдает данные порциями, которые сразу пишутся в файл,
+    поэтому расход памяти не зависит от размера выгрузки.
+    """
+    if isinstance(target, str):
+        with open(target, "w", newline="", encoding=encoding) as file:
+            return export_persons_csv(db, file, filters)
+
+    writer = csv.writer(target)
+    writer.writerow([column.title for column in TableColumns])
+    with db.connection() as conn:
+        with conn.cursor() as cursor:
+            try:
+                if db.config.driver == "sqlite":
+                    # COPY TO STDOUT есть только у PostgreSQL: читаем порциями
+                    query, params = _export_select(filters)
+                    cursor.execute(query, params)
+                    count = 0
+                    while True:
+                        rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+                        if not rows:
+                            break
+                        writer.writerows(rows)
+                        count += len(rows)
+                    conn.rollback()
+                    return count
+                cursor.copy_expert(build_export_query(conn, filters), target)
+                conn.rollback()
+            except DRIVER_ERRORS as e:
+                conn.rollback()
+                logging.error(f"Export failed: {e}")
+                raise DatabaseError(f"Export failed: {e}")
+            return cursor.rowcount
+
+
+def parse_filters(items: List[str]) -> Dict[str, str]:
+    """Разбор фильтров вида колонка=значение"""
+    filters = {}
+    for item in items:
+        column, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"Invalid filter: {item}")
+        filters[column.strip()] = value
+    return filters
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Выгрузка списка людей в CSV")
+    parser.add_argument("path", help="файл результата")
+    parser.add_argument("--filter", action="append", default=[], metavar="COLUMN=TEXT",
+                        help="поиск подстроки в колонке (fam, names, street, ...)")
+    parser.add_argument("--encoding", default="utf-8")
+    parser.add_argument("--driver", choices=["postgresql", "sqlite"], default=DatabaseConfig.driver)
+    parser.add_argument("--sqlite-path", default=DatabaseConfig.sqlite_path)
+    parser.add_argument("--host", default=DatabaseConfig.host)
+    parser.add_argument("--name", default=DatabaseConfig.name)
+    parser.add_argument("--user", default=DatabaseConfig.user)
+    parser.add_argument("--password", default=DatabaseConfig.password)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    config = DatabaseConfig(host=args.host, name=args.name, user=args.user, password=args.password,
+                            driver=args.driver, sqlite_path=args.sqlite_path)
+    started = time.monotonic()
+    try:
+        rows = export_persons_csv(DatabaseManager(config), args.path,
+                                  parse_filters(args.filter), args.encoding)
+    except (DatabaseError, ValueError, OSError) as e:
+        logging.error(f"Export failed: {e}")
+        return 1
+    logging.info(f"Exported {rows} rows in {time.monotonic() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
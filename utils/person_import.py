@@ -0,0 +1,270 @@
+import argparse
+import csv
+import io
+import logging
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple, Union
+
+from database_config import (DatabaseConfig, DatabaseManager, DatabaseError,
+                             DRIVER_ERRORS, PERSON_COLUMNS)
+from utils.enums import TableColumns, ReferenceTables
+
+# Колонки CSV в порядке по умолчанию (без заголовка) - как в основной таблице
+CSV_COLUMNS = [column.db_field for column in TableColumns]
+
+# Колонки справочников и соответствующие справочники
+REFERENCE_COLUMNS = {
+    TableColumns.SURNAME.db_field: ReferenceTables.FAM,
+    TableColumns.NAME.db_field: ReferenceTables.NAME,
+    TableColumns.PATRONYMIC.db_field: ReferenceTables.SECOND_NAME,
+    TableColumns.STREET.db_field: ReferenceTables.STREET,
+}
+
+# Обязательные колонки - те же, что проверяет InsertDialog
+REQUIRED_COLUMNS = [TableColumns.SURNAME.db_field, TableColumns.NAME.db_field,
+                    TableColumns.STREET.db_field, TableColumns.HOUSE.db_field]
+
+PHONE_PATTERN = re.compile(r"^[\d\s()+\-]*$")
+
+COPY_QUERY = f"COPY person ({', '.join(PERSON_COLUMNS.values())}) FROM STDIN WITH (FORMAT csv)"
+
+
+@dataclass
+class RejectedRow:
+    """Отклоненная строка файла"""
+    line: int
+    reason: str
+    values: List[str]
+
+
+@dataclass
+class ImportReport:
+    """Итоги импорта"""
+    rows_read: int = 0
+    rows_loaded: int = 0
+    rejected: List[RejectedRow] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_loaded / self.elapsed if self.elapsed else 0.0
+
+
+ParsedRow = Tuple[int, Dict[str, str]]
+
+
+class PersonCsvImporter:
+    """Массовая загрузка людей из CSV
+
+    Файл читается потоково порциями по chunk_size строк. Для каждой порции
+    значения справочников переводятся в id по одному оператору на справочник
+    (недостающие создаются тем же оператором), а строки загружаются через
+    COPY FROM STDIN в одной транзакции.
+    """
+
+    def __init__(self, db: DatabaseManager, chunk_size: int = 5000,
+                 delimiter: str = ",", has_header: bool = True):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.delimiter = delimiter
+        self.has_header = has_header
+
+    def import_file(self, source: Union[str, TextIO], encoding: str = "utf-8") -> ImportReport:
+        """Импорт файла по пути или из открытого текстового потока"""
+        if isinstance(source, str):
+            with open(source, newline="", encoding=encoding) as file:
+                return self.import_stream(file)
+        return self.import_stream(source)
+
+    def import_stream(self, file: TextIO) -> ImportReport:
+        """Импорт из текстового потока"""
+        report = ImportReport()
+        started = time.monotonic()
+        for chunk in self._read_chunks(file, report):
+            self._load_chunk(chunk, report)
+            report.elapsed = time.monotonic() - started
+            logging.info(
+                f"Imported {report.rows_loaded} of {report.rows_read} rows "
+                f"({report.rows_per_second:.0f} rows/s, {len(report.rejected)} rejected)"
+            )
+        report.elapsed = time.monotonic() - started
+        return report
+
+    def _read_chunks(self, file: TextIO, report: ImportReport) -> Iterator[List[ParsedRow]]:
+        """Потоковое чтение и проверка строк, порциями"""
+        reader = csv.reader(file, delimiter=self.delimiter)
+        columns = CSV_COLUMNS
+        if self.has_header:
+            header = next(reader, None)
+            if header is None:
+                return
+            columns = self._map_header(header)
+
+        chunk: List[ParsedRow] = []
+        for values in reader:
+            if not any(value.strip() for value in values):
+                continue
+            report.rows_read += 1
+            line = reader.line_num
+            reason = self._validate(values, columns)
+            if reason:
+                report.rejected.append(RejectedRow(line, reason, values))
+                continue
+            chunk.append((line, {
+                column: value.strip() for column, value in zip(columns, values) if column
+            }))
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _map_header(header: List[str]) -> List[Optional[str]]:
+        """Сопоставление заголовка файла с колонками (по имени в базе или заголовку)"""
+        aliases = {}
+        for column in TableColumns:
+            aliases[column.db_field.lower()] = column.db_field
+            aliases[column.title.lower()] = column.db_field
+        columns = [aliases.get(name.strip().lower()) for name in header]
+        missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+        if missing:
+            raise ValueError(f"CSV header lacks required columns: {', '.join(missing)}")
+        return columns
+
+    @staticmethod
+    def _validate(values: List[str], columns: List[Optional[str]]) -> Optional[str]:
+        """Проверка строки; возвращает причину отказа или None"""
+        if len(values) != len(columns):
+            return f"expected {len(columns)} fields, got {len(values)}"
+        record = dict(zip(columns, values))
+        empty = [name for name in REQUIRED_COLUMNS if not record.get(name, "").strip()]
+        if empty:
+            return f"required fields are empty: {', '.join(empty)}"
+        phone = record.get(TableColumns.PHONE.db_field, "")
+        if not PHONE_PATTERN.match(phone):
+            return f"invalid phone: {phone}"
+        return None
+
+    def _load_chunk(self, chunk: List[ParsedRow], report: ImportReport) -> None:
+        """Загрузка порции; при ошибке COPY строки загружаются по одной"""
+        try:
+            self._copy_chunk(chunk)
+            report.rows_loaded += len(chunk)
+        except DatabaseError as e:
+            logging.warning(f"COPY of {len(chunk)} rows failed, retrying row by row: {e}")
+            self._insert_rows(chunk, report)
+
+    def _resolve(self, cursor, chunk: List[ParsedRow]) -> Dict[str, Dict[str, int]]:
+        """Id справочников для всех значений порции: один оператор на справочник"""
+        resolved = {}
+        for column, ref in REFERENCE_COLUMNS.items():
+            values = {record.get(column) for _, record in chunk}
+            mapping, created = self.db.resolve_reference_values_with(cursor, ref, values)
+            if created:
+                self.db.reference_changed(ref.key)
+            resolved[column] = mapping
+        return resolved
+
+    @staticmethod
+    def _person_row(record: Dict[str, str], resolved: Dict[str, Dict[str, int]]) -> list:
+        """Строка для таблицы person в порядке PERSON_COLUMNS"""
+        row = [resolved[column].get(record.get(column)) for column in REFERENCE_COLUMNS]
+        for column in (TableColumns.HOUSE, TableColumns.BUILDING,
+                       TableColumns.APARTMENT, TableColumns.PHONE):
+            row.append(record.get(column.db_field) or None)
+        return row
+
+    def _copy_chunk(self, chunk: List[ParsedRow]) -> None:
+        with self.db.connection() as conn:
+            with conn.cursor() as cursor:
+                try:
+                    resolved = self._resolve(cursor, chunk)
+                    buffer = io.StringIO()
+                    writer = csv.writer(buffer)
+                    for _, record in chunk:
+                        writer.writerow(self._person_row(record, resolved))
+                    buffer.seek(0)
+                    cursor.copy_expert(COPY_QUERY, buffer)
+                    conn.commit()
+                except DRIVER_ERRORS as e:
+                    conn.rollback()
+                    raise DatabaseError(f"Bulk load failed: {e}")
+        self.db.tables_changed("person")
+
+    def _insert_rows(self, chunk: List[ParsedRow], report: ImportReport) -> None:
+        """Построчная загрузка с точками сохранения: плохие строки отклоняются"""
+        placeholders = ", ".join(["%s"] * len(PERSON_COLUMNS))
+        query = f"INSERT INTO person ({', '.join(PERSON_COLUMNS.values())}) VALUES ({placeholders})"
+        with self.db.connection() as conn:
+            with conn.cursor() as cursor:
+                try:
+                    resolved = self._resolve(cursor, chunk)
+                    for line, record in chunk:
+                        cursor.execute("SAVEPOINT import_row")
+                        try:
+                            cursor.execute(query, self._person_row(record, resolved))
+                            cursor.execute("RELEASE SAVEPOINT import_row")
+                            report.rows_loaded += 1
+                        except DRIVER_ERRORS as e:
+                            cursor.execute("ROLLBACK TO SAVEPOINT import_row")
+                            report.rejected.append(RejectedRow(
+                                line, str(e).strip(), [record.get(column, "") for column in CSV_COLUMNS]
+                            ))
+                    conn.commit()
+                except DRIVER_ERRORS as e:
+                    conn.rollback()
+                    raise DatabaseError(f"Bulk load failed: {e}")
+        self.db.tables_changed("person")
+
+
+def write_rejects(path: str, rejected: List[RejectedRow]) -> None:
+    """Сохранение отклоненных строк с номером и причиной"""
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["line", "reason"] + CSV_COLUMNS)
+        for row in rejected:
+            writer.writerow([row.line, row.reason] + row.values)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Массовый импорт людей из CSV")
+    parser.add_argument("path", help="CSV-файл")
+    parser.add_argument("--delimiter", default=",")
+    parser.add_argument("--encoding", default="utf-8")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--no-header", action="store_true", help="колонки в порядке основной таблицы")
+    parser.add_argument("--rejects", help="файл для отклоненных строк")
+    parser.add_argument("--driver", choices=["postgresql", "sqlite"], default=DatabaseConfig.driver)
+    parser.add_argument("--sqlite-path", default=DatabaseConfig.sqlite_path)
+    parser.add_argument("--host", default=DatabaseConfig.host)
+    parser.add_argument("--name", default=DatabaseConfig.name)
+    parser.add_argument("--user", default=DatabaseConfig.user)
+    parser.add_argument("--password", default=DatabaseConfig.password)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    config = DatabaseConfig(host=args.host, name=args.name, user=args.user, password=args.password,
+                            driver=args.driver, sqlite_path=args.sqlite_path)
+    importer = PersonCsvImporter(DatabaseManager(config), args.chunk_size,
+                                 args.delimiter, not args.no_header)
+    try:
+        report = importer.import_file(args.path, args.encoding)
+    except (DatabaseError, ValueError, OSError) as e:
+        logging.error(f"Import failed: {e}")
+        return 1
+
+    if args.rejects and report.rejected:
+        write_rejects(args.rejects, report.rejected)
+    logging.info(
+        f"Done: {report.rows_loaded} loaded, {len(report.rejected)} rejected "
+        f"of {report.rows_read} in {report.elapsed:.1f}s ({report.rows_per_second:.0f} rows/s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+from bisect import bisect_left
+from typing import Iterable, List
+
+
+class PrefixIndex:
+    """Отсортированный индекс строк для поиска по префиксу без учета регистра
+
+    Хранит два параллельных списка (ключи в casefold и исходные значения);
+    поиск - bisect до первого совпадения и просмотр не более limit элементов.
+    """
+
+    __slots__ = ("_keys", "_values")
+
+    def __init__(self, values: Iterable[str] = ()):
+        pairs = sorted({(value.casefold(), value) for value in values if value})
+        self._keys = [key for key, _ in pairs]
+        self._values = [value for _, value in pairs]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __contains__(self, value: str) -> bool:
+        key = value.casefold()
+        position = bisect_left(self._keys, key)
+        while position < len(self._keys) and self._keys[position] == key:
+            if self._values[position] == value:
+                return True
+            position += 1
+        return False
+
+    def values(self) -> List[str]:
+        """Все значения в порядке сортировки"""
+        return list(self._values)
+
+    def matches(self, prefix: str, limit: int = 50) -> List[str]:
+        """Первые limit значений, начинающихся с prefix"""
+        key = prefix.casefold()
+        position = bisect_left(self._keys, key)
+        end = min(position + limit, len(self._keys))
+        result = []
+        while position < end and self._keys[position].startswith(key):
+            result.append(self._values[position])
+            position += 1
+        return result
@@ -0,0 +1,175 @@
+import logging
+import re
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+# Верхние границы корзин гистограммы задержек, мс (последняя корзина - все остальное)
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"%\(\w+\)s|%s|\$\d+")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql: str) -> str:
+    """Приведение запроса к общему виду для группировки статистики
+
+    Литералы и параметры заменяются на ?, списки значений схлопываются,
+    пробелы и комментарии убираются.
+    """
+    sql = _COMMENTS.sub(" ", sql)
+    sql = _STRINGS.sub("?", sql)
+    sql = _PLACEHOLDERS.sub("?", sql)
+    sql = _NUMBERS.sub("?", sql)
+    sql = _LISTS.sub("(?, ...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+@dataclass
+class QueryEvent:
+    """Замер одного выполнения запроса (времена в секундах)"""
+    sql: str
+    params: Any
+    normalized: str
+    connect_time: float = 0.0
+    execute_time: float = 0.0
+    fetch_time: float = 0.0
+    rows: int = 0
+    error: Optional[str] = None
+
+    @property
+    def total_time(self) -> float:
+        return self.connect_time + self.execute_time + self.fetch_time
+
+
+@dataclass
+class StatementStats:
+    """Накопленная статистика одного нормализованного запроса"""
+    count: int = 0
+    errors: int = 0
+    rows: int = 0
+    connect_time: float = 0.0
+    execute_time: float = 0.0
+    fetch_time: float = 0.0
+    max_time: float = 0.0
+    histogram: List[int] = field(default_factory=lambda: [0] * (len(HISTOGRAM_BUCKETS_MS) + 1))
+
+    @property
+    def total_time(self) -> float:
+        return self.connect_time + self.execute_time + self.fetch_time
+
+    def add(self, event: QueryEvent) -> None:
+        self.count += 1
+        self.errors += event.error is not None
+        self.rows += event.rows
+        self.connect_time += event.connect_time
+        self.execute_time += event.execute_time
+        self.fetch_time += event.fetch_time
+        self.max_time = max(self.max_time, event.total_time)
+        self.histogram[bisect_left(HISTOGRAM_BUCKETS_MS, event.total_time * 1000)] += 1
+
+    def percentile(self, fraction: float) -> float:
+        """Оценка перцентиля задержки по гистограмме, мс
+
+        Внутри корзины значение интерполируется линейно; верхняя граница
+        последней занятой корзины - наибольшее замеченное время.
+        """
+        target = fraction * self.count
+        max_ms = self.max_time * 1000
+        seen = 0
+        for index, count in enumerate(self.histogram):
+            if count and seen + count >= target:
+                lower = float(HISTOGRAM_BUCKETS_MS[index - 1]) if index else 0.0
+                upper = float(HISTOGRAM_BUCKETS_MS[index]) if index < len(HISTOGRAM_BUCKETS_MS) else max_ms
+                lower, upper = min(lower, max_ms), min(upper, max_ms)
+                return lower + (upper - lower) * max(target - seen, 0) / count
+            seen += count
+        return 0.0
+
+
+class QueryStats:
+    """Сбор статистики запросов и журнал медленных запросов
+
+    Подписчики (например, экспорт метрик) получают каждый QueryEvent
+    через add_listener; исключения подписчиков не влияют на запросы.
+    """
+
+    def __init__(self, slow_query_threshold_ms: float = 0.0):
+        self.slow_query_threshold_ms = slow_query_threshold_ms
+        self._lock = threading.Lock()
+        self._statements: Dict[str, StatementStats] = {}
+        self._listeners: List[Callable[[QueryEvent], None]] = []
+
+    def add_listener(self, listener: Callable[[QueryEvent], None]) -> None:
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[QueryEvent], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def record(self, event: QueryEvent) -> None:
+        """Учет выполненного запроса"""
+        with self._lock:
+            stats = self._statements.get(event.normalized)
+            if stats is None:
+                stats = self._statements[event.normalized] = StatementStats()
+            stats.add(event)
+
+        total_ms = event.total_time * 1000
+        if self.slow_query_threshold_ms and total_ms >= self.slow_query_threshold_ms:
+            logging.warning(
+                f"Slow query ({total_ms:.1f} ms: connect {event.connect_time * 1000:.1f}, "
+                f"execute {event.execute_time * 1000:.1f}, fetch {event.fetch_time * 1000:.1f}; "
+                f"{event.rows} rows): {_SPACES.sub(' ', event.sql).strip()} params={event.params!r}"
+            )
+
+        for listener in list(self._listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                logging.warning(f"Query stats listener failed: {e}")
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Копия статистики по нормализованным запросам"""
+        with self._lock:
+            return {
+                sql: {
+                    "count": stats.count,
+                    "errors": stats.errors,
+                    "rows": stats.rows,
+                    "total_ms": stats.total_time * 1000,
+                    "connect_ms": stats.connect_time * 1000,
+                    "execute_ms": stats.execute_time * 1000,
+                    "fetch_ms": stats.fetch_time * 1000,
+                    "max_ms": stats.max_time * 1000,
+                    "p50_ms": stats.percentile(0.5),
+                    "p95_ms": stats.percentile(0.95),
+                    "histogram": dict(zip(
+                        [f"<={bound}ms" for bound in HISTOGRAM_BUCKETS_MS] + ["inf"],
+                        stats.histogram
+                    )),
+                }
+                for sql, stats in self._statements.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._statements.clear()
+
+    def format_report(self, limit: int = 20) -> str:
+        """Текстовый отчет: самые затратные запросы по суммарному времени"""
+        items = sorted(self.snapshot().items(), key=lambda item: item[1]["total_ms"], reverse=True)
+        lines = [f"{'calls':>7} {'total ms':>10} {'p50':>7} {'p95':>7} {'max':>8} {'rows':>9}  query"]
+        for sql, stats in items[:limit]:
+            lines.append(
+                f"{stats['count']:>7} {stats['total_ms']:>10.1f} {stats['p50_ms']:>7.0f} "
+                f"{stats['p95_ms']:>7.0f} {stats['max_ms']:>8.1f} {stats['rows']:>9}  {sql[:120]}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,149 @@
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Iterable
+from utils.enums import ReferenceTables
+
+# Счетчики версий справочников: триггер увеличивает версию таблицы
+# после каждого изменяющего оператора, в том числе от других клиентов
+REFERENCE_VERSION_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS reference_versions (
+        table_name text PRIMARY KEY,
+        version bigint NOT NULL DEFAULT 0
+    )
+    """,
+    "INSERT INTO reference_versions (table_name) VALUES "
+    + ", ".join(f"('{ref.table}')" for ref in ReferenceTables)
+    + " ON CONFLICT DO NOTHING",
+    """
+    CREATE OR REPLACE FUNCTION bump_reference_version() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        UPDATE reference_versions SET version = version + 1
+        WHERE table_name = TG_TABLE_NAME;
+        RETURN NULL;
+    END
+    $$
+    """,
+] + [
+    statement
+    for ref in ReferenceTables
+    for statement in (
+        f"DROP TRIGGER IF EXISTS {ref.table}_bump_version ON {ref.table}",
+        f"CREATE TRIGGER {ref.table}_bump_version "
+        f"AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {ref.table} "
+        f"FOR EACH STATEMENT EXECUTE PROCEDURE bump_reference_version()",
+    )
+]
+
+ReferenceRow = Tuple[int, str]
+
+
+class ReferenceCache:
+    """Кеш справочников в памяти процесса
+
+    Каждый справочник загружается один раз и дальше обновляется на месте
+    после успешных изменений через DatabaseManager. Изменения других
+    клиентов обнаруживаются по счетчикам reference_versions; если таблицы
+    версий нет, записи кеша устаревают по ttl.
+    """
+
+    def __init__(self, check_interval: float = 5.0, ttl: float = 300.0):
+        self.check_interval = check_interval
+        self.ttl = ttl
+        # None - еще не проверяли, поддерживает ли база счетчики версий
+        self.versioned: Optional[bool] = None
+        self._lock = threading.RLock()
+        # Значения хранятся как (value, id), чтобы список оставался отсортированным
+        self._data: Dict[str, List[Tuple[str, int]]] = {}
+        self._loaded_at: Dict[str, float] = {}
+        self._versions: Dict[str, int] = {}
+        self._last_check = 0.0
+
+    def get(self, key: str) -> Optional[List[ReferenceRow]]:
+        """Копия данных справочника или None, если его нужно загрузить"""
+        with self._lock:
+            rows = self._data.get(key)
+            if rows is None:
+                return None
+            if (not self.versioned and self.ttl
+                    and time.monotonic() - self._loaded_at[key] > self.ttl):
+                self.invalidate(key)
+                return None
+            return [(ref_id, value) for value, ref_id in rows]
+
+    def put(self, key: str, rows: Iterable[ReferenceRow]) -> None:
+        """Сохранение загруженного справочника"""
+        with self._lock:
+            self._data[key] = sorted((row[1], row[0]) for row in rows)
+            self._loaded_at[key] = time.monotonic()
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Сброс одного справочника или всего кеша"""
+        with self._lock:
+            keys = [key] if key else list(self._data)
+            for item in keys:
+                self._data.pop(item, None)
+                self._loaded_at.pop(item, None)
+
+    def needs_version_check(self) -> bool:
+        """Пора ли сверить версии справочников с базой"""
+        return self.versioned is not False and \
+            time.monotonic() - self._last_check >= self.check_interval
+
+    def apply_versions(self, versions: Iterable[Tuple[str, int]]) -> None:
+        """Сверка версий: справочники, измененные извне, сбрасываются"""
+        with self._lock:
+            self.versioned = True
+            self._last_check = time.monotonic()
+            for table, version in versions:
+                key = ReferenceTables.from_key(table).key
+                if self._versions.get(key) != version:
+                    self.invalidate(key)
+                self._versions[key] = version
+
+    def disable_versioning(self) -> None:
+        """База не поддерживает счетчики версий: используем только ttl"""
+        with self._lock:
+            self.versioned = False
+
+    def apply_insert(self, key: str, ref_id: int, value: str,
+                     version: Optional[int] = None) -> None:
+        """Добавление значения после успешной вставки"""
+        def mutate(rows: List[Tuple[str, int]]) -> None:
+            bisect.insort(rows, (value, ref_id))
+        self._apply(key, version, mutate)
+
+    def apply_update(self, key: str, old_value: str, new_value: str,
+                     version: Optional[int] = None) -> None:
+        """Переименование значения после успешного обновления"""
+        def mutate(rows: List[Tuple[str, int]]) -> None:
+            rows[:] = sorted(
+                (new_value if value == old_value else value, ref_id) for value, ref_id in rows
+            )
+        self._apply(key, version, mutate)
+
+    def apply_delete(self, key: str, value: str,
+                     version: Optional[int] = None) -> None:
+        """Удаление значения после успешного удаления"""
+        def mutate(rows: List[Tuple[str, int]]) -> None:
+            rows[:] = [row for row in rows if row[0] != value]
+        self._apply(key, version, mutate)
+
+    def _apply(self, key: str, version: Optional[int], mutate) -> None:
+        """Изменение на месте, если между нашей и известной версией не было чужих правок
+
+        version - версия справочника, прочитанная тем же оператором до
+        срабатывания триггера, то есть без учета собственного изменения.
+        """
+        with self._lock:
+            rows = self._data.get(key)
+            if rows is None:
+                return
+            if version is not None:
+                if self._versions.get(key) != version:
+                    self.invalidate(key)
+                    return
+                self._versions[key] = version + 1
+            mutate(rows)
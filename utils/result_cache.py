@@ -0,0 +1,222 @@
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, List, Optional, Tuple
+
+from utils.enums import ReferenceTables
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_SPACES = re.compile(r"\s+")
+_READ_TABLES = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)", re.I)
+_WRITE_TABLES = re.compile(
+    r"\b(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?|COPY)\s+(?:ONLY\s+)?(\w+)", re.I
+)
+_WRITES = re.compile(r"\b(?:INSERT|UPDATE|DELETE|TRUNCATE|COPY|MERGE)\b", re.I)
+_DDL = re.compile(r"^\s*(?:CREATE|ALTER|DROP|REFRESH|COMMENT|GRANT|REVOKE)\b", re.I)
+_READS = re.compile(r"^\s*(?:SELECT|WITH|VALUES)\b", re.I)
+# Результат зависит не только от данных таблиц
+_VOLATILE = re.compile(
+    r"\b(?:now|random|nextval|currval|setval|clock_timestamp|statement_timestamp|"
+    r"current_timestamp|current_date|localtimestamp|txid_current|pg_\w+)\b|\bFOR\s+(?:UPDATE|SHARE)\b",
+    re.I
+)
+
+# Представления и таблицы, от которых они зависят
+VIEW_TABLES = {
+    "person_listing": frozenset(["person"] + [ref.table for ref in ReferenceTables]),
+}
+
+# Таблицы, которые пишут триггеры и служебный код в обход execute_query:
+# их чтение не кешируется
+UNCACHED_TABLES = frozenset([
+    "reference_versions", "schema_migrations", "person_deletions", "sync_state",
+    "sqlite_master", "information_schema",
+])
+
+
+@dataclass(frozen=True)
+class QueryTables:
+    """Разбор запроса для кеша
+
+    reads - таблицы, от которых зависит результат чтения (None - результат
+    кешировать нельзя); writes - измененные таблицы; ddl - оператор меняет
+    схему, и кеш сбрасывается целиком.
+    """
+    reads: Optional[FrozenSet[str]]
+    writes: FrozenSet[str]
+    ddl: bool
+
+
+@lru_cache(maxsize=1024)
+def query_tables(sql: str) -> QueryTables:
+    """Таблицы, которые запрос читает и изменяет (по тексту, без строковых литералов)"""
+    text = _STRINGS.sub("''", _COMMENTS.sub(" ", sql))
+    if _DDL.match(text):
+        return QueryTables(None, frozenset(), True)
+    writes = frozenset(name.lower() for name in _WRITE_TABLES.findall(text))
+    if writes or _WRITES.search(text) or not _READS.match(text) or _VOLATILE.search(text):
+        return QueryTables(None, writes, False)
+    reads = set()
+    for name in _READ_TABLES.findall(text):
+        name = name.lower()
+        reads.update(VIEW_TABLES.get(name, (name,)))
+    # Запросы без таблиц (проверка соединения SELECT 1) всегда идут на сервер
+    if not reads or reads & UNCACHED_TABLES:
+        return QueryTables(None, frozenset(), False)
+    return QueryTables(frozenset(reads), frozenset(), False)
+
+
+def _freeze(value: Any) -> Hashable:
+    """Параметры запроса в виде ключа словаря"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = tuple(_freeze(item) for item in value)
+        return tuple(sorted(items, key=repr)) if isinstance(value, (set, frozenset)) else items
+    return value
+
+
+def _result_size(rows: List[tuple]) -> int:
+    """Приблизительный объем результата в памяти, байт"""
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return size
+
+
+@dataclass
+class ResultCacheStats:
+    """Статистика кеша результатов"""
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+
+
+class _Entry:
+    __slots__ = ("rows", "size", "tables", "expires")
+
+    def __init__(self, rows: List[tuple], size: int, tables: FrozenSet[str], expires: float):
+        self.rows = rows
+        self.size = size
+        self.tables = tables
+        self.expires = expires
+
+
+class ResultCache:
+    """LRU-кеш результатов читающих запросов с ограничением памяти и сроком жизни
+
+    Ключ - текст запроса без лишних пробелов и комментариев плюс параметры.
+    Каждая запись помнит таблицы, из которых прочитан результат; запись в
+    таблицу удаляет зависящие от нее записи. Изменения других клиентов
+    кеш не видит, их ограничивает ttl (и уведомления, см. invalidate_tables).
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, ttl: float = 30.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = ResultCacheStats()
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._bytes = 0
+        # Номер последнего сброса по каждой таблице: чтение, начатое до
+        # сброса, не должно сохранить в кеш устаревший результат
+        self._generation = 0
+        self._invalidated: Dict[str, int] = {}
+        self._cleared = 0
+
+    @staticmethod
+    def key(sql: str, params: Any) -> Hashable:
+        return _SPACES.sub(" ", _COMMENTS.sub(" ", sql)).strip(), _freeze(params)
+
+    def get(self, sql: str, params: Any) -> Tuple[Optional[List[tuple]], int]:
+        """Закешированный результат (или None) и метка для последующего put()"""
+        if query_tables(sql).reads is None:
+            return None, -1
+        key = self.key(sql, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires < time.monotonic():
+                self._remove(key)
+                self.stats.expirations += 1
+                entry = None
+            if entry is None:
+                self.stats.misses += 1
+                return None, self._generation
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return list(entry.rows), -1
+
+    def put(self, sql: str, params: Any, rows: List[tuple], generation: int) -> None:
+        """Сохранение результата чтения, начатого при метке generation из get()"""
+        tables = query_tables(sql).reads
+        if tables is None or generation < 0:
+            return
+        size = _result_size(rows)
+        if size > self.max_bytes:
+            return
+        key = self.key(sql, params)
+        with self._lock:
+            if self._cleared > generation or any(
+                    self._invalidated.get(table, -1) > generation for table in tables):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(list(rows), size, tables, time.monotonic() + self.ttl)
+            self._bytes += size
+            self.stats.stores += 1
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.stats.evictions += 1
+
+    def invalidate_query(self, sql: str) -> None:
+        """Сброс записей, которые может изменить выполненный оператор"""
+        info = query_tables(sql)
+        if info.ddl:
+            self.clear()
+        elif info.writes:
+            self.invalidate_tables(info.writes)
+
+    def invalidate_tables(self, tables: Iterable[str]) -> None:
+        """Сброс записей, прочитанных из любой из таблиц"""
+        tables = {table.lower() for table in tables}
+        with self._lock:
+            self._generation += 1
+            for table in tables:
+                self._invalidated[table] = self._generation
+            stale = [key for key, entry in self._entries.items() if entry.tables & tables]
+            for key in stale:
+                self._remove(key)
+            self.stats.invalidations += len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._cleared = self._generation
+            self.stats.invalidations += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Снимок статистики кеша"""
+        with self._lock:
+            stats = asdict(self.stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats.update(
+                hit_ratio=stats["hits"] / lookups if lookups else 0.0,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_bytes=self.max_bytes,
+            )
+            return stats
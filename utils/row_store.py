@@ -0,0 +1,146 @@
+import sys
+from array import array
+from typing import Any, Dict, Iterable, List, Sequence
+
+from utils.enums import TableColumns
+
+# Колонки с небольшим числом различных значений (справочники, дом, корпус,
+# квартира) хранятся кодами в array('i'). Телефоны почти все разные: номер
+# из одних цифр хранится числом, и в словарь попадают только остальные
+ENCODED_COLUMNS = frozenset(column.index for column in TableColumns if column is not TableColumns.PHONE)
+
+# Строки из цифр без ведущего нуля такой длины помещаются в array('q')
+_MAX_PACKED_DIGITS = 18
+
+# Словарь значений колонки пересобирается из живых ячеек, когда в нем
+# набирается столько значений сверх оставшихся после прошлой сборки
+_COMPACT_SLACK = 1024
+
+
+class PersonRowStore:
+    """Компактное хранилище загруженных строк списка по колонкам
+
+    Строка списка - (id, *значения колонок TableColumns). Ключи хранятся в
+    array('q'), значения колонок из ENCODED_COLUMNS - кодами array('i') в
+    словарь значений колонки. Остальные колонки (телефон) - в array('q'):
+    строка из цифр хранится числом, прочие значения - отрицательным кодом
+    в такой же словарь. Значения, на которые после замены и удаления строк
+    никто не ссылается, удаляются пересборкой словаря. Вместо кортежа и
+    девяти объектов на строку остается около 44 байт, поэтому миллион строк
+    занимает десятки мегабайт.
+    """
+
+    def __init__(self, columns: int = len(TableColumns)):
+        self.columns = columns
+        self.clear()
+
+    def clear(self) -> None:
+        """Удаление всех строк и словарей значений"""
+        # Ключи в array('q'), пока все они целые; иначе - обычный список
+        self.keys: Sequence[Any] = array("q")
+        self._cells: List[Any] = []
+        # Значения колонки по коду и обратный словарь; код 0 всегда означает NULL.
+        # В колонках вне ENCODED_COLUMNS ячейка ссылается на код c как -(c + 1)
+        self._values: Dict[int, List[Any]] = {}
+        self._codes: Dict[int, Dict[Any, int]] = {}
+        # Размер словаря, после которого колонка пересобирается
+        self._compact_at: Dict[int, int] = {}
+        for column in range(self.columns):
+            self._cells.append(array("i" if column in ENCODED_COLUMNS else "q"))
+            self._values[column] = [None]
+            self._codes[column] = {None: 0}
+            self._compact_at[column] = _COMPACT_SLACK
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def key(self, row: int) -> Any:
+        return self.keys[row]
+
+    def value(self, row: int, column: int) -> Any:
+        cell = self._cells[column][row]
+        if column in ENCODED_COLUMNS:
+            return self._values[column][cell]
+        return str(cell) if cell >= 0 else self._values[column][-cell - 1]
+
+    def row(self, row: int) -> tuple:
+        """Значения строки в порядке колонок"""
+        return tuple(self.value(row, column) for column in range(self.columns))
+
+    def _encode(self, column: int, value: Any) -> Any:
+        packed = column not in ENCODED_COLUMNS
+        if (packed and isinstance(value, str) and value.isascii() and value.isdigit()
+                and value[0] != "0" and len(value) <= _MAX_PACKED_DIGITS):
+            return int(value)
+        codes = self._codes[column]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self._values[column])
+            self._values[column].append(sys.intern(value) if isinstance(value, str) else value)
+        return -code - 1 if packed else code
+
+    def _compact(self) -> None:
+        """Пересборка словарей, в которых накопились значения без ссылок"""
+        for column, cells in enumerate(self._cells):
+            values = self._values[column]
+            if len(values) <= self._compact_at[column]:
+                continue
+            packed = column not in ENCODED_COLUMNS
+            used = {-cell - 1 for cell in cells if cell < 0} if packed else set(cells)
+            used.add(0)
+            new_values = [values[code] for code in sorted(used)]
+            remap = {code: index for index, code in enumerate(sorted(used))}
+            if packed:
+                self._cells[column] = array("q", (cell if cell >= 0 else -remap[-cell - 1] - 1
+                                                  for cell in cells))
+            else:
+                self._cells[column] = array("i", (remap[cell] for cell in cells))
+            self._values[column] = new_values
+            self._codes[column] = {value: code for code, value in enumerate(new_values)}
+            self._compact_at[column] = 2 * len(new_values) + _COMPACT_SLACK
+
+    def _encode_keys(self, keys: List[Any]) -> Sequence[Any]:
+        if isinstance(self.keys, array):
+            if all(isinstance(key, int) and not isinstance(key, bool) for key in keys):
+                return array("q", keys)
+            self.keys = list(self.keys)
+        return keys
+
+    def insert(self, position: int, rows: Iterable[tuple]) -> None:
+        """Вставка строк вида (id, *значения) перед позицией position"""
+        rows = list(rows)
+        if not rows:
+            return
+        keys = self._encode_keys([row[0] for row in rows])
+        self.keys[position:position] = keys
+        for column, cells in enumerate(self._cells):
+            cells[position:position] = array(cells.typecode, [
+                self._encode(column, row[column + 1] if column + 1 < len(row) else None)
+                for row in rows
+            ])
+        self._compact()
+
+    def extend(self, rows: Iterable[tuple]) -> None:
+        """Добавление строк вида (id, *значения) в конец"""
+        self.insert(len(self.keys), rows)
+
+    def delete(self, first: int, last: int) -> None:
+        """Удаление строк first..last включительно"""
+        del self.keys[first:last + 1]
+        for cells in self._cells:
+            del cells[first:last + 1]
+        self._compact()
+
+    def replace(self, row: int, values: Sequence[Any]) -> None:
+        """Замена значений строки"""
+        for column, cells in enumerate(self._cells):
+            cells[row] = self._encode(column, values[column] if column < len(values) else None)
+        self._compact()
+
+    def memory_usage(self) -> int:
+        """Приблизительный объем памяти хранилища в байтах (без самих строк значений)"""
+        size = sys.getsizeof(self.keys)
+        for column, cells in enumerate(self._cells):
+            size += sys.getsizeof(cells)
+            size += sys.getsizeof(self._values[column]) + sys.getsizeof(self._codes[column])
+        return size
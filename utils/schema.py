@@ -0,0 +1,390 @@
+import argparse
+import logging
+import sys
+from dataclasses import dataclass, field
+from typing import List, Optional, Set
+
+from database_config import (DatabaseConfig, DatabaseManager, DatabaseError,
+                             DRIVER_ERRORS, PERSON_LISTING_QUERY)
+from utils.enums import ReferenceTables
+from utils.local_snapshot import CHANGE_TRACKING_DDL
+from utils.reference_cache import REFERENCE_VERSION_DDL
+
+# Ключ рекомендательной блокировки: миграции разных клиентов не идут параллельно
+MIGRATION_LOCK_ID = 0x64627072
+
+MIGRATIONS_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version integer PRIMARY KEY,
+        description text NOT NULL,
+        applied_at timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+BASE_TABLES_DDL = [
+    f"CREATE TABLE IF NOT EXISTS {ref.table} (id serial PRIMARY KEY, {ref.column} text NOT NULL)"
+    for ref in ReferenceTables
+] + [
+    """
+    CREATE TABLE IF NOT EXISTS person (
+        id serial PRIMARY KEY,
+        fam_id integer REFERENCES fam (id),
+        name_id integer REFERENCES names (id),
+        second_name_id integer REFERENCES second_name (id),
+        street_id integer REFERENCES street (id),
+        bldng text,
+        bldng_k text,
+        appr text,
+        telef text
+    )
+    """,
+]
+
+# В SQLite автоинкремент дает только INTEGER PRIMARY KEY (синоним rowid)
+SQLITE_BASE_TABLES_DDL = [
+    statement.replace("id serial PRIMARY KEY", "id INTEGER PRIMARY KEY")
+    for statement in BASE_TABLES_DDL
+]
+
+# Индексы внешних ключей person (соединения списка и проверка FK при удалении
+# значения справочника) и индексы поиска значения справочника по тексту
+INDEX_DDL = [
+    f"CREATE INDEX IF NOT EXISTS person_{ref.person_field}_idx ON person ({ref.person_field})"
+    for ref in ReferenceTables
+] + [
+    f"CREATE INDEX IF NOT EXISTS {ref.table}_{ref.column}_idx ON {ref.table} ({ref.column})"
+    for ref in ReferenceTables
+]
+
+# Представление списка в порядке TableColumns
+LISTING_VIEW_DDL = [
+    f"CREATE OR REPLACE VIEW person_listing AS {PERSON_LISTING_QUERY}",
+]
+
+SQLITE_LISTING_VIEW_DDL = [
+    f"CREATE VIEW IF NOT EXISTS person_listing AS {PERSON_LISTING_QUERY}",
+]
+
+# Триграммные GIN-индексы для поиска подстроки (ILIKE '%...%')
+# по текстам справочников и телефону
+SEARCH_INDEX_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+] + [
+    f"CREATE INDEX IF NOT EXISTS {ref.table}_{ref.column}_trgm_idx "
+    f"ON {ref.table} USING gin ({ref.column} gin_trgm_ops)"
+    for ref in ReferenceTables
+] + [
+    "CREATE INDEX IF NOT EXISTS person_telef_trgm_idx ON person USING gin (telef gin_trgm_ops)",
+]
+
+
+# Номер версии строки для оптимистической блокировки: update_person
+# увеличивает его и проверяет ожидаемое значение
+ROW_VERSION_DDL = [
+    "ALTER TABLE person ADD COLUMN IF NOT EXISTS row_version integer NOT NULL DEFAULT 1",
+]
+
+SQLITE_ROW_VERSION_DDL = [
+    "ALTER TABLE person ADD COLUMN row_version integer NOT NULL DEFAULT 1",
+]
+
+
+# Уникальность значений справочников: цель ON CONFLICT для создания
+# недостающих значений одним оператором (DatabaseManager.insert_record).
+# Сначала повторы значения сводятся к наименьшему id: ссылки person
+# переводятся на него, лишние строки удаляются. Уникальный индекс заменяет
+# обычный индекс из шага 2
+REFERENCE_UNIQUE_DDL = [
+    statement
+    for ref in ReferenceTables
+    for statement in (
+        f"UPDATE person SET {ref.person_field} = ("
+        f"SELECT min(d.id) FROM {ref.table} d JOIN {ref.table} o ON o.{ref.column} = d.{ref.column} "
+        f"WHERE o.id = person.{ref.person_field}) "
+        f"WHERE {ref.person_field} IN (SELECT dup.id FROM {ref.table} dup WHERE EXISTS ("
+        f"SELECT 1 FROM {ref.table} o WHERE o.{ref.column} = dup.{ref.column} AND o.id < dup.id))",
+        f"DELETE FROM {ref.table} WHERE EXISTS ("
+        f"SELECT 1 FROM {ref.table} o WHERE o.{ref.column} = {ref.table}.{ref.column} AND o.id < {ref.table}.id)",
+        f"CREATE UNIQUE INDEX IF NOT EXISTS {ref.table}_{ref.column}_key ON {ref.table} ({ref.column})",
+        f"DROP INDEX IF EXISTS {ref.table}_{ref.column}_idx",
+    )
+]
+
+
+# Канал уведомлений об изменениях (utils/change_listener.py)
+CHANGE_CHANNEL = "pl_changes"
+# Больше стольких id в одном уведомлении не передается (предел pg_notify -
+# 8000 байт): получатель перечитывает таблицу целиком
+CHANGE_NOTIFY_MAX_IDS = 500
+
+# Уведомления об изменениях людей и справочников. Триггеры уровня оператора
+# с таблицами переходов отправляют одно уведомление на оператор, а не на
+# строку: {"table": ..., "op": ..., "ids": [...] или null}
+CHANGE_NOTIFY_DDL = [
+    f"""
+    CREATE OR REPLACE FUNCTION notify_changes() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        ids integer[];
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            SELECT array_agg(id) INTO ids FROM (SELECT id FROM old_rows LIMIT {CHANGE_NOTIFY_MAX_IDS + 1}) s;
+        ELSIF TG_OP <> 'TRUNCATE' THEN
+            SELECT array_agg(id) INTO ids FROM (SELECT id FROM new_rows LIMIT {CHANGE_NOTIFY_MAX_IDS + 1}) s;
+        END IF;
+        -- Оператор не затронул ни одной строки
+        IF ids IS NULL AND TG_OP <> 'TRUNCATE' THEN
+            RETURN NULL;
+        END IF;
+        IF array_length(ids, 1) > {CHANGE_NOTIFY_MAX_IDS} THEN
+            ids := NULL;
+        END IF;
+        PERFORM pg_notify('{CHANGE_CHANNEL}',
+                          json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'ids', ids)::text);
+        RETURN NULL;
+    END
+    $$
+    """,
+] + [
+    statement
+    for table in ["person"] + [ref.table for ref in ReferenceTables]
+    for statement in (
+        # Таблицы переходов допускают только одно событие на триггер
+        f"DROP TRIGGER IF EXISTS {table}_notify_insert ON {table}",
+        f"CREATE TRIGGER {table}_notify_insert AFTER INSERT ON {table} "
+        f"REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE notify_changes()",
+        f"DROP TRIGGER IF EXISTS {table}_notify_update ON {table}",
+        f"CREATE TRIGGER {table}_notify_update AFTER UPDATE ON {table} "
+        f"REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE notify_changes()",
+        f"DROP TRIGGER IF EXISTS {table}_notify_delete ON {table}",
+        f"CREATE TRIGGER {table}_notify_delete AFTER DELETE ON {table} "
+        f"REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE PROCEDURE notify_changes()",
+        f"DROP TRIGGER IF EXISTS {table}_notify_truncate ON {table}",
+        f"CREATE TRIGGER {table}_notify_truncate AFTER TRUNCATE ON {table} "
+        f"FOR EACH STATEMENT EXECUTE PROCEDURE notify_changes()",
+    )
+]
+
+
+# Сортировка списка по колонкам person с ключом (значение, id) для
+# keyset-пагинации (DatabaseManager.open_person_view). Выражение совпадает
+# с колонкой PERSON_LISTING_QUERY, поэтому индекс отдает строки уже по порядку.
+# Колонки справочников сортируются по тексту после соединения: такой
+# сортировки индекс по person обслужить не может, она намеренно без индекса
+SORT_INDEX_DDL = [
+    f"CREATE INDEX IF NOT EXISTS person_{column}_sort_idx ON person ((COALESCE({column}, '')), id)"
+    for column in ("bldng", "bldng_k", "appr", "telef")
+]
+
+# Триграммные индексы для фильтров списка по остальным текстовым колонкам
+# person (телефон покрыт SEARCH_INDEX_DDL). pg_trgm создается и здесь:
+# миграция 5 могла быть пропущена
+FILTER_INDEX_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+] + [
+    f"CREATE INDEX IF NOT EXISTS person_{column}_trgm_idx ON person USING gin ({column} gin_trgm_ops)"
+    for column in ("bldng", "bldng_k", "appr")
+]
+
+
+@dataclass
+class Migration:
+    """Шаг миграции схемы
+
+    sqlite_statements - вариант для SQLite (None - те же операторы,
+    пустой список - шаг для SQLite не нужен). Ошибка необязательного шага
+    (optional) не останавливает миграцию: шаг пропускается и повторяется
+    при следующем запуске.
+    """
+    version: int
+    description: str
+    statements: List[str]
+    sqlite_statements: Optional[List[str]] = None
+    optional: bool = False
+
+    def statements_for(self, driver: str) -> List[str]:
+        if driver == "sqlite" and self.sqlite_statements is not None:
+            return self.sqlite_statements
+        return self.statements
+
+
+@dataclass
+class MigrationReport:
+    """Результат миграции"""
+    previous_version: int = 0
+    current_version: int = 0
+    applied: List[int] = field(default_factory=list)
+    # Необязательные миграции, которые не удалось применить
+    skipped: List[int] = field(default_factory=list)
+    created_indexes: List[str] = field(default_factory=list)
+
+
+MIGRATIONS = [
+    Migration(1, "Базовые таблицы", BASE_TABLES_DDL, SQLITE_BASE_TABLES_DDL),
+    Migration(2, "Индексы внешних ключей и значений справочников", INDEX_DDL),
+    Migration(3, "Счетчики версий справочников", REFERENCE_VERSION_DDL, []),
+    Migration(4, "Представление списка людей", LISTING_VIEW_DDL, SQLITE_LISTING_VIEW_DDL),
+    # pg_trgm может требовать прав суперпользователя: без них поиск работает
+    # без индексов, а следующие миграции применяются
+    Migration(5, "Триграммные индексы для поиска", SEARCH_INDEX_DDL, [], optional=True),
+    # Нужна только серверу, с которого синхронизируется локальный снимок
+    Migration(6, "Отметки изменений людей для синхронизации", CHANGE_TRACKING_DDL, []),
+    Migration(7, "Версия строки человека", ROW_VERSION_DDL, SQLITE_ROW_VERSION_DDL),
+    Migration(8, "Уникальные значения справочников", REFERENCE_UNIQUE_DDL),
+    Migration(9, "Уведомления об изменениях", CHANGE_NOTIFY_DDL, []),
+    Migration(10, "Индексы сортировки списка", SORT_INDEX_DDL),
+    Migration(11, "Триграммные индексы для фильтров списка", FILTER_INDEX_DDL, [], optional=True),
+    # Материализованную копию списка прежний шаг 4 создавал при запуске, но
+    # ее никто не читал и не обновлял
+    Migration(12, "Удаление материализованного списка людей",
+              ["DROP MATERIALIZED VIEW IF EXISTS person_listing_mat"], []),
+]
+
+
+def list_indexes(db: DatabaseManager) -> List[str]:
+    """Имена индексов текущей схемы"""
+    if db.config.driver == "sqlite":
+        # Автоматические индексы ограничений не имеют текста
+        rows = db.execute_query("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")
+        return [row[0] for row in rows]
+    rows = db.execute_query("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()")
+    return [row[0] for row in rows]
+
+
+def apply_ddl(db: DatabaseManager, statements: List[str]) -> List[str]:
+    """Выполнение DDL; возвращает имена созданных индексов"""
+    before = set(list_indexes(db))
+    for statement in statements:
+        db.execute_query(statement)
+    return sorted(set(list_indexes(db)) - before)
+
+
+def create_search_indexes(db: DatabaseManager) -> List[str]:
+    """Создание индексов для поиска по мере ввода"""
+    if db.config.driver == "sqlite":
+        logging.info("Trigram indexes are not available for SQLite")
+        return []
+    return apply_ddl(db, SEARCH_INDEX_DDL)
+
+
+def applied_versions(db: DatabaseManager) -> Set[int]:
+    """Номера примененных миграций"""
+    db.execute_query(MIGRATIONS_TABLE_DDL)
+    return {row[0] for row in db.execute_query("SELECT version FROM schema_migrations")}
+
+
+def current_version(db: DatabaseManager) -> int:
+    """Номер последней примененной миграции"""
+    return max(applied_versions(db), default=0)
+
+
+def migrate(db: DatabaseManager, target: Optional[int] = None) -> MigrationReport:
+    """Применение недостающих миграций
+
+    Каждая миграция выполняется в своей транзакции под рекомендательной
+    блокировкой, поэтому одновременный запуск с нескольких рабочих мест
+    безопасен. При ошибке применение останавливается на предыдущей версии;
+    необязательные миграции, которые не удалось применить, пропускаются.
+    """
+    applied = applied_versions(db)
+    report = MigrationReport(previous_version=max(applied, default=0))
+    report.current_version = report.previous_version
+    before = set(list_indexes(db))
+    try:
+        for migration in MIGRATIONS:
+            if migration.version in applied:
+                continue
+            if target is not None and migration.version > target:
+                break
+            try:
+                if _apply_migration(db, migration):
+                    report.applied.append(migration.version)
+                    logging.info(f"Applied migration {migration.version}: {migration.description}")
+            except DatabaseError:
+                if not migration.optional:
+                    raise
+                report.skipped.append(migration.version)
+                continue
+            report.current_version = max(report.current_version, migration.version)
+    finally:
+        report.created_indexes = sorted(set(list_indexes(db)) - before)
+    if report.applied:
+        db.tables_changed()
+        db.row_versioning = None
+    if report.applied and db.reference_cache is not None and db.config.driver == "postgresql":
+        db.reference_cache.versioned = None
+        db.reference_cache.invalidate()
+    return report
+
+
+def _apply_migration(db: DatabaseManager, migration: Migration) -> bool:
+    """Применение одной миграции; False, если ее уже применил другой клиент"""
+    with db.connection() as conn:
+        with conn.cursor() as cursor:
+            try:
+                if db.config.driver == "sqlite":
+                    # Блокировка записи до конца транзакции
+                    cursor.execute("BEGIN IMMEDIATE")
+                else:
+                    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+                cursor.execute("SELECT 1 FROM schema_migrations WHERE version = %s",
+                               (migration.version,))
+                if cursor.fetchone():
+                    conn.rollback()
+                    return False
+                for statement in migration.statements_for(db.config.driver):
+                    cursor.execute(statement)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                    (migration.version, migration.description)
+                )
+                conn.commit()
+                return True
+            except DRIVER_ERRORS as e:
+                conn.rollback()
+                if migration.optional:
+                    logging.warning(f"Optional migration {migration.version} skipped: {e}")
+                else:
+                    logging.error(f"Migration {migration.version} failed: {e}")
+                raise DatabaseError(f"Migration {migration.version} failed: {e}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Служебные операции со схемой базы")
+    parser.add_argument("command", choices=["migrate", "status", "search-indexes"])
+    parser.add_argument("--target", type=int, help="версия, до которой мигрировать")
+    parser.add_argument("--driver", choices=["postgresql", "sqlite"], default=DatabaseConfig.driver)
+    parser.add_argument("--sqlite-path", default=DatabaseConfig.sqlite_path)
+    parser.add_argument("--host", default=DatabaseConfig.host)
+    parser.add_argument("--name", default=DatabaseConfig.name)
+    parser.add_argument("--user", default=DatabaseConfig.user)
+    parser.add_argument("--password", default=DatabaseConfig.password)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    config = DatabaseConfig(host=args.host, name=args.name, user=args.user, password=args.password,
+                            driver=args.driver, sqlite_path=args.sqlite_path)
+    db = DatabaseManager(config)
+    try:
+        if args.command == "migrate":
+            report = migrate(db, args.target)
+            logging.info(
+                f"Schema version {report.previous_version} -> {report.current_version}; "
+                f"created indexes: {', '.join(report.created_indexes) or 'none'}; "
+                f"skipped: {', '.join(map(str, report.skipped)) or 'none'}"
+            )
+        elif args.command == "status":
+            applied = applied_versions(db)
+            pending = [m.version for m in MIGRATIONS if m.version not in applied]
+            logging.info(f"Schema version {max(applied, default=0)}; pending: {pending or 'none'}")
+        else:
+            created = create_search_indexes(db)
+            logging.info(f"Created indexes: {', '.join(created) or 'none'}")
+    except DatabaseError as e:
+        logging.error(f"Schema operation failed: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+import csv
+import re
+import sqlite3
+from functools import lru_cache
+from typing import Any, List, Optional, TextIO
+
+# Настройки каждого соединения. WAL позволяет читать во время записи,
+# synchronous=NORMAL в режиме WAL не нарушает целостность при сбое,
+# кеш страниц и mmap сокращают обращения к диску
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA mmap_size = 268435456",
+)
+
+# Конструкции PostgreSQL, которые переводятся в диалект SQLite; строковые
+# литералы захватываются первыми, чтобы их содержимое не менялось
+_TOKENS = re.compile(
+    r"'(?:[^']|'')*'|%%|%\((\w+)\)s|%s|::\w+(?:\[\])?|\bILIKE\b|\bIS\s+NOT\s+DISTINCT\s+FROM\b",
+    re.I
+)
+_TRANSACTION_CONTROL = re.compile(r"^\s*(BEGIN|COMMIT|ROLLBACK|END)\b", re.I)
+_RETURNING = re.compile(r"\bRETURNING\b", re.I)
+_COPY_FROM = re.compile(r"^\s*COPY\s+(\w+)\s*\(([^)]*)\)\s+FROM\s+STDIN", re.I)
+
+
+@lru_cache(maxsize=512)
+def translate(query: str) -> str:
+    """Перевод запроса из диалекта PostgreSQL/psycopg2 в SQLite
+
+    Параметры %s и %(name)s становятся ? и :name, приведения типов ::type
+    убираются, ILIKE становится LIKE (см. _like), IS NOT DISTINCT FROM - IS.
+    """
+    def replace(match):
+        token = match.group()
+        if token.startswith("'"):
+            return token
+        if token == "%%":
+            return "%"
+        if match.group(1):
+            return f":{match.group(1)}"
+        if token == "%s":
+            return "?"
+        if token.startswith("::"):
+            return ""
+        if token.upper() == "ILIKE":
+            return "LIKE"
+        return "IS"
+
+    return _TOKENS.sub(replace, query)
+
+
+@lru_cache(maxsize=256)
+def _like_regex(pattern: str, escape: str) -> "re.Pattern":
+    parts = []
+    chars = iter(pattern)
+    for char in chars:
+        if char == escape:
+            parts.append(re.escape(next(chars, "")))
+        elif char == "%":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("".join(parts), re.S | re.I)
+
+
+def _like(pattern: Optional[str], value: Any, escape: str = "\\") -> Optional[bool]:
+    """LIKE без учета регистра для любых букв (встроенный учитывает только латиницу)
+
+    Как и в PostgreSQL, обратная косая черта по умолчанию экранирует % и _.
+    """
+    if pattern is None or value is None:
+        return None
+    return _like_regex(pattern, escape).fullmatch(str(value)) is not None
+
+
+class SqliteCursor:
+    """Курсор SQLite с интерфейсом курсора psycopg2, который использует DatabaseManager"""
+
+    def __init__(self, connection: "SqliteConnection"):
+        self.connection = connection
+        self.itersize = 1000
+        self._cursor = connection.raw.cursor()
+        self._rows: Optional[List[tuple]] = None
+
+    def __enter__(self) -> "SqliteCursor":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, query: str, params: Optional[Any] = None) -> None:
+        self.connection.begin(query)
+        self._rows = None
+        self._cursor.execute(translate(query), () if params is None else params)
+        if _RETURNING.search(query):
+            # Изменяющий оператор не завершен, пока не прочитан RETURNING, и
+            # мешает commit(); psycopg2 в этом случае уже получил все строки
+            self._rows = self._cursor.fetchall()
+
+    def executemany(self, query: str, params_seq) -> None:
+        self.connection.begin(query)
+        self._cursor.executemany(translate(query), params_seq)
+
+    def fetchone(self) -> Optional[tuple]:
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size: Optional[int] = None) -> List[tuple]:
+        size = self.itersize if size is None else size
+        if self._rows is not None:
+            rows, self._rows = self._rows[:size], self._rows[size:]
+            return rows
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self) -> List[tuple]:
+        if self._rows is not None:
+            rows, self._rows = self._rows, []
+            return rows
+        return self._cursor.fetchall()
+
+    def copy_expert(self, sql: str, file: TextIO) -> None:
+        """COPY таблица (колонки) FROM STDIN WITH (FORMAT csv) через executemany
+
+        Пустые значения CSV загружаются как NULL.
+        """
+        match = _COPY_FROM.match(sql)
+        if not match:
+            raise sqlite3.NotSupportedError(f"Unsupported COPY statement: {sql}")
+        table = match.group(1)
+        columns = [column.strip() for column in match.group(2).split(",")]
+        query = (f"INSERT INTO {table} ({', '.join(columns)}) "
+                 f"VALUES ({', '.join('?' * len(columns))})")
+        self.connection.begin(query)
+        self._cursor.executemany(query, ([value or None for value in row]
+                                         for row in csv.reader(file)))
+
+    def close(self) -> None:
+        self._cursor.close()
+
+
+class SqliteConnection:
+    """Соединение SQLite с транзакциями в стиле psycopg2
+
+    Транзакция открывается неявно первым оператором и завершается
+    commit() или rollback(), поэтому DDL миграций тоже транзакционный.
+    """
+
+    driver = "sqlite"
+
+    def __init__(self, raw: sqlite3.Connection):
+        self.raw = raw
+        self.closed = False
+
+    def cursor(self, name: Optional[str] = None) -> SqliteCursor:
+        # Именованный (серверный) курсор не нужен: SQLite и так читает
+        # результат по мере выборки
+        return SqliteCursor(self)
+
+    def begin(self, query: str) -> None:
+        if not self.raw.in_transaction and not _TRANSACTION_CONTROL.match(query):
+            self.raw.execute("BEGIN")
+
+    def commit(self) -> None:
+        self.raw.commit()
+
+    def rollback(self) -> None:
+        self.raw.rollback()
+
+    def reset(self) -> None:
+        self.raw.rollback()
+
+    def cancel(self) -> None:
+        # Как psycopg2 connection.cancel(): прерывает выполняющийся запрос
+        # из другого потока
+        self.raw.interrupt()
+
+    def close(self) -> None:
+        if not self.closed:
+            self.raw.close()
+            self.closed = True
+
+
+def connect_sqlite(path: str, timeout: float = 5.0) -> SqliteConnection:
+    """Открытие файла базы SQLite с настройками SQLITE_PRAGMAS
+
+    Соединение можно передавать между потоками (пул, фоновые задачи),
+    но использовать одновременно только в одном.
+    """
+    raw = sqlite3.connect(path, timeout=timeout, isolation_level=None,
+                          check_same_thread=False, cached_statements=256)
+    try:
+        raw.create_function("like", 2, _like, deterministic=True)
+        raw.create_function("like", 3, _like, deterministic=True)
+        for pragma in SQLITE_PRAGMAS:
+            raw.execute(pragma)
+    except sqlite3.Error:
+        raw.close()
+        raise
+    return SqliteConnection(raw)
@@ -0,0 +1,83 @@
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+
+# Переменная окружения и флаг командной строки, включающие замер запуска
+PROFILE_ENV = "PL_PROFILE_STARTUP"
+PROFILE_FLAG = "--profile-startup"
+
+
+def profiling_requested(argv: Optional[List[str]] = None) -> bool:
+    """Запрошен ли замер запуска (флаг --profile-startup или PL_PROFILE_STARTUP=1)"""
+    argv = sys.argv if argv is None else argv
+    return PROFILE_FLAG in argv or os.environ.get(PROFILE_ENV, "") not in ("", "0")
+
+
+class StartupProfiler:
+    """Замер этапов запуска приложения
+
+    Этапы (импорты, создание окна, первая отрисовка, подключение к базе)
+    записываются с длительностью и временем от старта процесса замера.
+    Выключенный профайлер ничего не измеряет и ничего не выводит.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        # (этап, начало от старта, длительность), секунды
+        self.phases: List[Tuple[str, float, float]] = []
+        self._lock = threading.Lock()
+        self._reported = False
+
+    def _record(self, name: str, start: float, end: float) -> None:
+        with self._lock:
+            self.phases.append((name, start - self.origin, end - start))
+
+    @contextmanager
+    def phase(self, name: str):
+        """Замер блока кода как этапа name"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, start, time.perf_counter())
+
+    def mark(self, name: str) -> None:
+        """Отметка момента без длительности (например, первая отрисовка)"""
+        if self.enabled:
+            now = time.perf_counter()
+            self._record(name, now, now)
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        """Функция, выполнение которой замеряется как этап (в том числе в фоновом потоке)"""
+        if not self.enabled:
+            return func
+
+        def wrapper(*args, **kwargs):
+            with self.phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def format_report(self) -> str:
+        """Таблица этапов в порядке начала"""
+        with self._lock:
+            phases = sorted(self.phases, key=lambda item: item[1])
+        lines = [f"{'phase':<32} {'start ms':>10} {'took ms':>10}"]
+        for name, start, duration in phases:
+            took = f"{duration * 1000:10.1f}" if duration else f"{'-':>10}"
+            lines.append(f"{name:<32} {start * 1000:10.1f} {took}")
+        return "\n".join(lines)
+
+    def report(self) -> None:
+        """Вывод таблицы этапов в журнал (один раз)"""
+        if not self.enabled or self._reported:
+            return
+        self._reported = True
+        logging.info(f"Startup profile:\n{self.format_report()}")
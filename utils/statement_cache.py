@@ -0,0 +1,133 @@
+import itertools
+import logging
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+PLACEHOLDER_PATTERN = re.compile(r"%%|%s")
+
+
+def to_positional(query: str) -> Optional[Tuple[str, int]]:
+    """Перевод запроса с %s в синтаксис PREPARE ($1, $2, ...)
+
+    Возвращает текст и число параметров или None, если запрос использует
+    именованные параметры и подготовить его нельзя.
+    """
+    if "%(" in query:
+        return None
+    counter = itertools.count(1)
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        if match.group() == "%%":
+            return "%"
+        count = next(counter)
+        return f"${count}"
+
+    return PLACEHOLDER_PATTERN.sub(replace, query), count
+
+
+@dataclass
+class StatementCacheStats:
+    """Статистика кеша подготовленных операторов"""
+    hits: int = 0
+    prepares: int = 0
+    evictions: int = 0
+    resets: int = 0
+
+
+class _ConnectionStatements:
+    """Подготовленные операторы одного серверного процесса"""
+
+    def __init__(self, backend_pid: int):
+        self.backend_pid = backend_pid
+        self.names: "OrderedDict[Hashable, Tuple[str, int]]" = OrderedDict()
+
+
+class PreparedStatementCache:
+    """LRU-кеш серверных подготовленных операторов (PREPARE/EXECUTE)
+
+    Операторы подготавливаются один раз на соединение и дальше вызываются
+    через EXECUTE без повторного разбора и планирования. Состояние ведется
+    по каждому соединению отдельно и сбрасывается, если соединение закрыто
+    пулом или сменился серверный процесс (переподключение).
+    """
+
+    def __init__(self, max_size: int = 64):
+        self.max_size = max_size
+        self.stats = StatementCacheStats()
+        self._lock = threading.Lock()
+        self._connections: Dict[int, _ConnectionStatements] = {}
+        self._names = itertools.count(1)
+
+    def _statements_for(self, conn) -> _ConnectionStatements:
+        backend_pid = conn.get_backend_pid()
+        with self._lock:
+            statements = self._connections.get(id(conn))
+            if statements is None or statements.backend_pid != backend_pid:
+                if statements is not None:
+                    self.stats.resets += 1
+                statements = _ConnectionStatements(backend_pid)
+                self._connections[id(conn)] = statements
+            return statements
+
+    def forget(self, conn) -> None:
+        """Сброс сведений о соединении (закрыто или сброшено через DISCARD ALL)"""
+        with self._lock:
+            if self._connections.pop(id(conn), None) is not None:
+                self.stats.resets += 1
+
+    def execute(self, cursor, key: Hashable, query: str, params: Optional[tuple] = None) -> None:
+        """Выполнение запроса через подготовленный оператор
+
+        Должно вызываться в начале транзакции: если сервер потерял оператор,
+        транзакция откатывается и оператор подготавливается заново.
+        """
+        try:
+            self._execute(cursor, key, query, params)
+        except Exception as e:
+            if getattr(e, "pgcode", None) != "26000":  # invalid_sql_statement_name
+                raise
+            logging.warning(f"Prepared statement lost, re-preparing: {e}")
+            cursor.connection.rollback()
+            self.forget(cursor.connection)
+            self._execute(cursor, key, query, params)
+
+    def _execute(self, cursor, key: Hashable, query: str, params: Optional[tuple]) -> None:
+        statements = self._statements_for(cursor.connection)
+        entry = statements.names.get(key)
+        if entry is None:
+            converted = to_positional(query)
+            if converted is None:
+                cursor.execute(query, params)
+                return
+            text, count = converted
+            while len(statements.names) >= self.max_size:
+                _, (old_name, _) = statements.names.popitem(last=False)
+                cursor.execute(f"DEALLOCATE {old_name}")
+                self.stats.evictions += 1
+            name = f"dbpr_stmt_{next(self._names)}"
+            cursor.execute(f"PREPARE {name} AS {text}")
+            entry = statements.names[key] = (name, count)
+            self.stats.prepares += 1
+        else:
+            statements.names.move_to_end(key)
+            self.stats.hits += 1
+
+        name, count = entry
+        arguments = f" ({', '.join(['%s'] * count)})" if count else ""
+        cursor.execute(f"EXECUTE {name}{arguments}", params)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Снимок статистики кеша"""
+        with self._lock:
+            stats = asdict(self.stats)
+            stats.update(
+                connections=len(self._connections),
+                statements=sum(len(item.names) for item in self._connections.values()),
+                max_size=self.max_size,
+            )
+            return stats
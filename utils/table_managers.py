@@ -1,46 +1,50 @@
 from PyQt5 import QtWidgets
-from typing import List, Any
-from utils.enums import TableColumns
+from typing import List, Any, Optional
+from utils.table_models import PersonTableModel
 
 
 class TableManager:
     """Менеджер для работы с таблицами"""
 
-    def __init__(self, table_widget: QtWidgets.QTableWidget):
-        self.table = table_widget
+    def __init__(self, table_view: QtWidgets.QTableView):
+        self.table = table_view
+        self.model = PersonTableModel(parent=table_view)
         self.setup_table()
 
     def setup_table(self) -> None:
         """Настройка таблицы"""
-        self.table.setColumnCount(len(TableColumns))
-        self.table.setRowCount(0)
+        self.table.setModel(self.model)
         self.setup_headers()
 
     def setup_headers(self) -> None:
         """Настройка заголовков таблицы"""
-        for column in TableColumns:
-            item = QtWidgets.QTableWidgetItem(column.title)
-            self.table.setHorizontalHeaderItem(column.index, item)
+        # Заголовки отдает модель (PersonTableModel.headerData)
+        self.table.horizontalHeader().setVisible(True)
 
     def update_data(self, data: List[Any]) -> None:
-        """Обновление данных в таблице"""
-        self.table.setRowCount(0)
-        for row_index, row_data in enumerate(data):
-            self.table.insertRow(row_index)
-            for col_index, value in enumerate(row_data):
-                item = QtWidgets.QTableWidgetItem(str(value))
-                self.table.setItem(row_index, col_index, item)
+        """Обновление данных в таблице (строки вида (id, *значения))
+
+        Новый результат сравнивается с показанным по первичному ключу,
+        и перерисовываются только изменившиеся строки и ячейки.
+        """
+        self.model.update_rows(data)
+
+    def load_from_cursor(self, cursor) -> None:
+        """Ленивая загрузка данных из серверного курсора"""
+        self.model.set_cursor(cursor)
 
     def get_selected_row_data(self) -> List[str]:
         """Получение данных выбранной строки"""
-        row = self.table.currentRow()
+        row = self.table.currentIndex().row()
         if row >= 0:
-            return [
-                self.table.item(row, col).text()
-                for col in range(self.table.columnCount())
-            ]
+            return self.model.row_values(row)
         return []
 
+    def get_selected_row_id(self) -> Optional[Any]:
+        """Первичный ключ выбранной строки"""
+        row = self.table.currentIndex().row()
+        return self.model.row_id(row) if row >= 0 else None
+
     def clear_table(self) -> None:
         """Очистка таблицы"""
-        self.table.setRowCount(0)
\ No newline at end of file
+        self.model.clear()
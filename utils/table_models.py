@@ -0,0 +1,297 @@
+from PyQt5 import QtCore
+from PyQt5.QtCore import Qt
+from bisect import bisect_left
+from typing import List, Any, Optional, Iterable, Sequence, Dict
+import heapq
+from utils.enums import TableColumns
+from utils.row_store import PersonRowStore
+from utils.db_worker import DatabaseExecutor
+import logging
+
+
+class PersonTableModel(QtCore.QAbstractTableModel):
+    """Модель основной таблицы с ленивой подгрузкой строк
+
+    Строки источника имеют вид (id, *значения колонок TableColumns) и
+    хранятся по колонкам в PersonRowStore. Представление запрашивает только
+    видимые ячейки, а новые порции читаются из серверного курсора по мере
+    прокрутки (canFetchMore/fetchMore). С executor порции читаются в фоне и
+    добавляются по готовности; без него - сразу, в вызывающем потоке.
+    """
+
+    # Роль для получения первичного ключа строки
+    RowIdRole = Qt.UserRole + 1
+
+    def __init__(self, batch_size: int = 500, parent=None,
+                 executor: Optional[DatabaseExecutor] = None):
+        super().__init__(parent)
+        self.batch_size = batch_size
+        self.executor = executor
+        self._store = PersonRowStore()
+        self._cursor = None
+        # Курсор, порция которого читается в фоне; его закрывает завершение чтения
+        self._fetching = None
+        # Изменения строк дальше загруженной части, которые не увидит курсор
+        # со снимком данных (live = False): id -> значения, None - удалена
+        self._pending: Dict[Any, Optional[tuple]] = {}
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._store)
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(TableColumns)
+
+    def data(self, index: QtCore.QModelIndex, role: int = Qt.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            value = self._store.value(index.row(), index.column())
+            return "" if value is None else str(value)
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if role == self.RowIdRole:
+            return self._store.key(index.row())
+        return None
+
+    def headerData(self, section: int, orientation: int,
+                   role: int = Qt.DisplayRole) -> Any:
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return list(TableColumns)[section].title
+        return None
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()) -> bool:
+        if parent.isValid() or self._cursor is None or self._fetching is self._cursor:
+            return False
+        return not self._cursor.exhausted
+
+    def fetchMore(self, parent=QtCore.QModelIndex()) -> None:
+        if not self.canFetchMore(parent):
+            return
+        if self.executor is None:
+            self._fetch_now()
+            return
+        cursor = self._fetching = self._cursor
+        self.executor.submit(
+            None, cursor.fetch, self.batch_size,
+            on_finished=lambda batch: self._on_fetched(cursor, batch),
+            on_failed=lambda message: self._on_fetch_failed(cursor, message)
+        )
+
+    def _fetch_now(self) -> None:
+        """Чтение порции в вызывающем потоке"""
+        try:
+            batch = self._cursor.fetch(self.batch_size)
+        except Exception as e:
+            logging.error(f"Error fetching table rows: {e}")
+            self._cursor = None
+            return
+        self._append_fetched(batch, self._cursor.exhausted)
+
+    def _on_fetched(self, cursor, batch: List[tuple]) -> None:
+        if self._fetching is cursor:
+            self._fetching = None
+        if cursor is not self._cursor:
+            # Пока порция читалась, модель переключилась на другой источник
+            self._close(cursor)
+            return
+        self._append_fetched(batch, cursor.exhausted)
+
+    def _on_fetch_failed(self, cursor, message: str) -> None:
+        if self._fetching is cursor:
+            self._fetching = None
+        logging.error(f"Error fetching table rows: {message}")
+        self._close(cursor)
+        if cursor is self._cursor:
+            self._cursor = None
+
+    def _append_fetched(self, batch: List[tuple], exhausted: bool) -> None:
+        """Добавление прочитанной порции с учетом отложенных изменений
+
+        Курсор со снимком данных читает строки по id, поэтому отложенные
+        новые строки встают в порцию по своему id, а удаленные пропускаются.
+        """
+        if self._pending:
+            last = batch[-1][0] if batch else None
+            rows = []
+            for row in batch:
+                values = self._pending.pop(row[0], row[1:])
+                if values is not None:
+                    rows.append((row[0], *values))
+            passed = [key for key in self._pending if exhausted or (last is not None and key < last)]
+            added = sorted((key, *self._pending[key]) for key in passed if self._pending[key] is not None)
+            for key in passed:
+                del self._pending[key]
+            batch = list(heapq.merge(rows, added, key=lambda row: row[0]))
+        if batch:
+            self._append(batch)
+
+    def _append(self, rows: List[tuple]) -> None:
+        """Добавление строк вида (id, *значения) в конец модели"""
+        first = len(self._store)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(rows) - 1)
+        self._store.extend(rows)
+        self.endInsertRows()
+
+    def set_cursor(self, cursor) -> None:
+        """Переключение модели на новый источник с ленивой подгрузкой"""
+        self.beginResetModel()
+        self._close_cursor()
+        self._store.clear()
+        self._cursor = cursor
+        self.endResetModel()
+        # Первая порция обычно уже прочитана в фоне (prefetch) и берется сразу
+        if self.canFetchMore():
+            self._fetch_now()
+
+    def set_rows(self, rows: List[tuple]) -> None:
+        """Полная замена данных уже загруженными строками вида (id, *значения)"""
+        self.beginResetModel()
+        self._close_cursor()
+        self._store.clear()
+        self._store.extend(rows)
+        self.endResetModel()
+
+    def append_row(self, values: List[Any], row_id: Optional[Any] = None) -> None:
+        """Добавление одной строки"""
+        self._append([(row_id, *values)])
+
+    def apply_delta(self, upserts: Iterable[tuple], deleted_keys: Iterable[Any] = ()) -> None:
+        """Точечное применение изменений по первичному ключу
+
+        upserts - строки вида (id, *значения); строки модели упорядочены по id.
+        Изменяются только затронутые строки. Изменения строк дальше уже
+        загруженной части курсор, читающий текущие данные, прочитает сам;
+        для курсора со снимком они откладываются до подгрузки этих строк.
+        """
+        deleted = set(deleted_keys)
+        keys = self._store.keys
+        loaded_until = keys[-1] if keys else None
+        source_open = self._cursor is not None and not self._cursor.exhausted
+        defer = source_open and not self._cursor.live
+
+        def unloaded(key) -> bool:
+            return source_open and (loaded_until is None or key > loaded_until)
+
+        if deleted:
+            self._remove_positions([i for i, key in enumerate(keys) if key in deleted])
+            if defer:
+                self._pending.update((key, None) for key in deleted if unloaded(key))
+
+        keys = self._store.keys
+        positions = {key: i for i, key in enumerate(keys)}
+        inserted = []
+        for row in upserts:
+            key, values = row[0], tuple(row[1:])
+            position = positions.get(key)
+            if position is not None:
+                self._update_row(position, values)
+            elif unloaded(key):
+                if defer:
+                    self._pending[key] = values
+            else:
+                inserted.append((key, values))
+
+        for key, values in inserted:
+            try:
+                position = bisect_left(self._store.keys, key)
+            except TypeError:
+                position = len(self._store)
+            self.beginInsertRows(QtCore.QModelIndex(), position, position)
+            self._store.insert(position, [(key, *values)])
+            self.endInsertRows()
+
+    def update_rows(self, rows: List[tuple], cursor=None) -> None:
+        """Замена данных новым результатом с изменением только отличающихся строк
+
+        rows - новый результат вида (id, *значения) или его начало, если
+        остальное читается из cursor по мере прокрутки. Строки сопоставляются
+        по первичному ключу: пропавшие удаляются, новые вставляются на свои
+        места, у сохранившихся обновляются только изменившиеся ячейки.
+        Представление перерисовывает лишь затронутое. Если порядок
+        сохранившихся строк изменился (другая сортировка), модель
+        сбрасывается целиком.
+        """
+        new_keys = [row[0] for row in rows]
+        new_set = set(new_keys)
+        old_keys = set(self._store.keys)
+        kept = [key for key in self._store.keys if key in new_set]
+        if (not len(self._store) or len(new_set) != len(new_keys)
+                or [key for key in new_keys if key in old_keys] != kept):
+            # Сравнивать не с чем или строки нельзя сопоставить по ключу
+            self.set_rows(rows)
+            self._cursor = cursor
+            return
+
+        # Дальнейшие строки читаются уже из нового источника
+        self._close_cursor()
+        self._cursor = cursor
+        self._remove_positions([i for i, key in enumerate(self._store.keys) if key not in new_set])
+
+        # Оставшиеся строки идут в том же порядке, что и в новом результате
+        position = 0
+        while position < len(rows):
+            if new_keys[position] in old_keys:
+                self._update_row(position, tuple(rows[position][1:]))
+                position += 1
+                continue
+            # Подряд идущие новые строки вставляются одним блоком
+            end = position + 1
+            while end < len(rows) and new_keys[end] not in old_keys:
+                end += 1
+            self.beginInsertRows(QtCore.QModelIndex(), position, end - 1)
+            self._store.insert(position, rows[position:end])
+            self.endInsertRows()
+            position = end
+
+    def _remove_positions(self, positions: List[int]) -> None:
+        """Удаление строк по возрастающему списку позиций, с конца подряд идущими блоками"""
+        while positions:
+            last = first = positions.pop()
+            while positions and positions[-1] == first - 1:
+                first = positions.pop()
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            self._store.delete(first, last)
+            self.endRemoveRows()
+
+    def _update_row(self, position: int, values: tuple) -> None:
+        """Замена значений строки с сигналом только по изменившимся колонкам"""
+        old = self._store.row(position)
+        if old == values:
+            return
+        changed = [column for column, (a, b) in enumerate(zip(old, values)) if a != b]
+        self._store.replace(position, values)
+        if changed:
+            self.dataChanged.emit(self.index(position, changed[0]),
+                                  self.index(position, changed[-1]))
+
+    def clear(self) -> None:
+        """Очистка модели и закрытие курсора"""
+        self.set_rows([])
+
+    def row_id(self, row: int) -> Optional[Any]:
+        """Первичный ключ строки"""
+        return self._store.key(row) if 0 <= row < len(self._store) else None
+
+    def loaded_keys(self) -> Sequence[Any]:
+        """Первичные ключи загруженных строк"""
+        return self._store.keys
+
+    def row_values(self, row: int) -> List[str]:
+        """Отображаемые значения строки"""
+        if not 0 <= row < len(self._store):
+            return []
+        return ["" if value is None else str(value) for value in self._store.row(row)]
+
+    def _close_cursor(self) -> None:
+        self._pending.clear()
+        # Курсор, из которого сейчас читается порция, закроет _on_fetched
+        if self._cursor is not None and self._cursor is not self._fetching:
+            self._close(self._cursor)
+        self._cursor = None
+
+    @staticmethod
+    def _close(cursor) -> None:
+        try:
+            cursor.close()
+        except Exception as e:
+            logging.warning(f"Error closing table cursor: {e}")
@@ -0,0 +1,302 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+try:
+    from psycopg2.extras import execute_batch, execute_values
+except ImportError:  # без psycopg2 доступен только встроенный SQLite
+    execute_batch = execute_values = None
+
+from database_config import (DatabaseManager, DatabaseError, DRIVER_ERRORS,
+                             PERSON_COLUMNS, parent_table_query)
+from models.data_models import PersonData
+from utils.enums import ReferenceTables
+from utils.query_stats import QueryEvent, normalize_sql
+from utils.sqlite_backend import SqliteCursor
+
+
+@dataclass
+class _Operation:
+    """Группа однотипных изменений: один текст оператора, много наборов параметров
+
+    Для "insert" query содержит VALUES %s, а template - шаблон одной строки
+    (execute_values); для "batch" запрос выполняется для каждого набора
+    параметров (execute_batch). create и lookup - позиции параметров со
+    значениями справочников, заданными текстом: перед выполнением они
+    заменяются на id (для create недостающие значения создаются).
+    """
+    kind: str
+    query: str
+    template: Optional[str] = None
+    params: List[tuple] = field(default_factory=list)
+    returning: bool = False
+    reference: Optional[str] = None
+    create: Dict[int, ReferenceTables] = field(default_factory=dict)
+    lookup: Dict[int, ReferenceTables] = field(default_factory=dict)
+
+
+@dataclass
+class FlushResult:
+    """Итог сброса сессии"""
+    # id людей, добавленных insert(), в порядке добавления
+    inserted_ids: List[int] = field(default_factory=list)
+    # Выполнено изменений и отправлено пакетов (обращений к серверу)
+    operations: int = 0
+    batches: int = 0
+
+
+# Позиции полей справочников среди параметров строки person (порядок PERSON_COLUMNS)
+_REFERENCE_POSITIONS = {
+    list(PERSON_COLUMNS).index(ref.person_field): ref for ref in ReferenceTables
+}
+
+
+def _person_params(data: PersonData) -> tuple:
+    """Значения полей в порядке PERSON_COLUMNS; справочники - id или текст, пустое - NULL"""
+    return tuple(getattr(data, field_name) or None for field_name in PERSON_COLUMNS)
+
+
+class WriteSession:
+    """Единица работы: изменения копятся и отправляются одной транзакцией
+
+    Подряд идущие однотипные изменения объединяются: добавления уходят
+    через execute_values, изменения и удаления - через execute_batch
+    пакетами по batch_size. Порядок изменений сохраняется. При flush_interval
+    накопленное сбрасывается автоматически через столько секунд после
+    первого изменения. Выход из with без исключения вызывает flush(),
+    с исключением - отбрасывает несохраненные изменения.
+    """
+
+    def __init__(self, manager: DatabaseManager, batch_size: int = 500,
+                 flush_interval: float = 0.0,
+                 on_flush_failed: Optional[Callable[[str], None]] = None):
+        self.manager = manager
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.on_flush_failed = on_flush_failed
+        self._operations: List[_Operation] = []
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+
+    def __enter__(self) -> "WriteSession":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is None:
+            self.flush()
+        else:
+            self.discard()
+
+    @property
+    def pending(self) -> int:
+        """Число несохраненных изменений"""
+        with self._lock:
+            return sum(len(operation.params) for operation in self._operations)
+
+    def _add(self, kind: str, query: str, params: tuple, template: Optional[str] = None,
+             returning: bool = False, reference: Optional[str] = None,
+             create: Optional[Dict[int, ReferenceTables]] = None,
+             lookup: Optional[Dict[int, ReferenceTables]] = None) -> None:
+        with self._lock:
+            last = self._operations[-1] if self._operations else None
+            if last is None or (last.kind, last.query, last.template) != (kind, query, template):
+                last = _Operation(kind, query, template, returning=returning, reference=reference,
+                                  create=create or {}, lookup=lookup or {})
+                self._operations.append(last)
+            last.params.append(params)
+            if self.flush_interval > 0 and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def insert(self, data: PersonData) -> None:
+        """Добавление человека; недостающие значения справочников создаются (как insert_record)"""
+        self._add(
+            "insert",
+            f"INSERT INTO person ({', '.join(PERSON_COLUMNS.values())}) VALUES %s RETURNING id",
+            _person_params(data), template=f"({', '.join(['%s'] * len(PERSON_COLUMNS))})",
+            returning=True, create=_REFERENCE_POSITIONS
+        )
+
+    def update(self, old_data: PersonData, new_data: PersonData) -> None:
+        """Изменение записей, совпадающих со старыми значениями (как update_record)
+
+        Новые значения справочников создаются, если их нет; старое значение,
+        которого нет в справочнике, не совпадает ни с одной записью.
+        """
+        columns = list(PERSON_COLUMNS.values())
+        assignments = ", ".join(f"{col} = %s" for col in columns)
+        conditions = " AND ".join(f"{col} IS NOT DISTINCT FROM %s" for col in columns)
+        self._add("batch", f"UPDATE person SET {assignments} WHERE {conditions}",
+                  _person_params(new_data) + _person_params(old_data),
+                  create=_REFERENCE_POSITIONS,
+                  lookup={position + len(columns): ref for position, ref in _REFERENCE_POSITIONS.items()})
+
+    def delete(self, person_id: int) -> None:
+        """Удаление человека по id"""
+        self._add("batch", "DELETE FROM person WHERE id = %s", (person_id,))
+
+    def insert_reference(self, ref_type: str, value: str) -> None:
+        """Добавление значения в справочник"""
+        ref = ReferenceTables.from_key(ref_type)
+        self._add("insert", f"INSERT INTO {ref.table} ({ref.column}) VALUES %s", (value,),
+                  template="(%s)", reference=ref.key)
+
+    def update_reference(self, ref_type: str, old_value: str, new_value: str) -> None:
+        """Переименование значения справочника"""
+        ref = ReferenceTables.from_key(ref_type)
+        self._add("batch", parent_table_query(ref.table, ref.column, "UPDATE", True),
+                  (new_value, old_value), reference=ref.key)
+
+    def delete_reference(self, ref_type: str, value: str) -> None:
+        """Удаление значения из справочника"""
+        ref = ReferenceTables.from_key(ref_type)
+        self._add("batch", parent_table_query(ref.table, ref.column, "DELETE", True),
+                  (value,), reference=ref.key)
+
+    def discard(self) -> None:
+        """Отказ от несохраненных изменений"""
+        with self._lock:
+            self._cancel_timer()
+            self._operations = []
+
+    def flush(self) -> FlushResult:
+        """Отправка накопленных изменений одной транзакцией
+
+        При ошибке транзакция откатывается, а изменения остаются в сессии:
+        flush() можно повторить или вызвать discard().
+        """
+        with self._lock:
+            self._cancel_timer()
+            operations, self._operations = self._operations, []
+            if not operations:
+                return FlushResult()
+            try:
+                result, references, tables = self._execute(operations)
+            except DatabaseError:
+                self._operations = operations + self._operations
+                raise
+        self.manager.tables_changed(*tables)
+        for key in references:
+            self.manager.reference_changed(key)
+        return result
+
+    def _execute(self, operations: List[_Operation]) -> Tuple[FlushResult, Set[str], Set[str]]:
+        result = FlushResult()
+        references: Set[str] = set()
+        tables: Set[str] = set()
+        operation = None
+        started = time.perf_counter()
+        with self.manager.connection() as conn:
+            with conn.cursor() as cursor:
+                try:
+                    for operation in operations:
+                        started = time.perf_counter()
+                        params = self._resolve(cursor, operation, references)
+                        ids, batches = self._run(cursor, operation, params)
+                        self._record(operation, len(operation.params), time.perf_counter() - started)
+                        if operation.returning:
+                            result.inserted_ids.extend(ids)
+                        if operation.reference:
+                            references.add(operation.reference)
+                        else:
+                            tables.add("person")
+                        result.operations += len(operation.params)
+                        result.batches += batches
+                    conn.commit()
+                except DRIVER_ERRORS as e:
+                    conn.rollback()
+                    if operation is not None:
+                        self._record(operation, 0, time.perf_counter() - started, str(e))
+                    logging.error(f"Session flush failed: {e}")
+                    raise DatabaseError(f"Session flush failed: {e}")
+        return result, references, tables
+
+    def _resolve(self, cursor, operation: _Operation, references: Set[str]) -> List[tuple]:
+        """Параметры группы изменений с id вместо текста справочников
+
+        Значения каждого справочника по всей группе переводятся одним
+        оператором непосредственно перед ее выполнением, чтобы не нарушить
+        порядок изменений сессии. Справочники, в которые добавлены значения,
+        попадают в references.
+        """
+        if not operation.create and not operation.lookup:
+            return operation.params
+        ids: Dict[ReferenceTables, Dict[str, int]] = {}
+        for positions, create in ((operation.create, True), (operation.lookup, False)):
+            wanted: Dict[ReferenceTables, Set[str]] = {}
+            for position, ref in positions.items():
+                wanted.setdefault(ref, set()).update(
+                    row[position] for row in operation.params if isinstance(row[position], str)
+                )
+            for ref, values in wanted.items():
+                mapping = ids.setdefault(ref, {})
+                values -= mapping.keys()
+                if not values:
+                    continue
+                if create:
+                    found, created = self.manager.resolve_reference_values_with(cursor, ref, values)
+                    if created:
+                        references.add(ref.key)
+                else:
+                    found = self.manager.lookup_reference_values_with(cursor, ref, values)
+                mapping.update(found)
+
+        positions = {**operation.create, **operation.lookup}
+        rows = []
+        for row in operation.params:
+            row = list(row)
+            for position, ref in positions.items():
+                if isinstance(row[position], str):
+                    # Id справочников положительны: 0 не совпадет ни с одной записью
+                    row[position] = ids[ref].get(row[position], 0)
+            rows.append(tuple(row))
+        return rows
+
+    def _run(self, cursor, operation: _Operation, params: List[tuple]) -> Tuple[List[int], int]:
+        """Выполнение группы изменений; возвращает id из RETURNING и число пакетов"""
+        batches = -(-len(params) // self.batch_size)
+        if isinstance(cursor, SqliteCursor) or execute_values is None:
+            # SQLite не поддерживает VALUES %s; запросы локальные, цикл дешев
+            if operation.kind == "insert":
+                query = operation.query.replace("%s", operation.template, 1)
+                if not operation.returning:
+                    cursor.executemany(query, params)
+                    return [], batches
+                ids = []
+                for row in params:
+                    cursor.execute(query, row)
+                    ids.append(cursor.fetchone()[0])
+                return ids, batches
+            cursor.executemany(operation.query, params)
+            return [], batches
+
+        if operation.kind == "insert":
+            rows = execute_values(cursor, operation.query, params, template=operation.template,
+                                  page_size=self.batch_size, fetch=operation.returning)
+            return [row[0] for row in rows or []], batches
+        execute_batch(cursor, operation.query, params, page_size=self.batch_size)
+        return [], batches
+
+    def _record(self, operation: _Operation, rows: int, elapsed: float,
+                error: Optional[str] = None) -> None:
+        stats = self.manager.query_stats
+        if stats is not None:
+            stats.record(QueryEvent(operation.query, None, normalize_sql(operation.query),
+                                    execute_time=elapsed, rows=rows, error=error))
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _flush_on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except DatabaseError as e:
+            if self.on_flush_failed is not None:
+                self.on_flush_failed(str(e))
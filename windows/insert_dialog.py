@@ -3,19 +3,23 @@ from PyQt5.QtWidgets import QDialog, QMessageBox
 from utils.form_managers import FormManager
 from models.window_configs import InsertDialogConfig
 from models.data_models import FormField, PersonData
-from utils.enums import FieldTypes, FieldLabels
+from utils.enums import FieldTypes, FieldLabels, ReferenceTables
+from utils.db_worker import DatabaseExecutor
 from database_config import DatabaseManager
+from typing import Optional
 import logging
 
 
 class InsertDialog(QDialog):
     """Диалог добавления новой записи"""
 
-    def __init__(self, db_manager: DatabaseManager, parent=None):
+    def __init__(self, db_manager: DatabaseManager, parent=None,
+                 executor: Optional[DatabaseExecutor] = None):
         super().__init__(parent)
         self.db = db_manager
+        self.executor = executor or DatabaseExecutor.instance()
         self.config = InsertDialogConfig()
-        self.form_manager = FormManager(self.config)
+        self.form_manager = FormManager()
         self.setup_ui()
         self.load_reference_data()
 
@@ -34,52 +38,119 @@ class InsertDialog(QDialog):
         self.ok_button.clicked.connect(self.accept)
         self.cancel_button.clicked.connect(self.reject)
 
-        for button in self.ref_buttons:
-            button.clicked.connect(self.open_reference_dialog)
+        for name, button in self.ref_buttons.items():
+            button.clicked.connect(lambda _=False, key=name: self.open_reference_dialog(key))
 
     def create_form_fields(self):
         """Создание полей формы"""
         self.fields = [
-            FormField("fam", FieldLabels.FAM.value, FieldTypes.COMBO, 40, 30, 200, 25),
-            FormField("name", FieldLabels.NAME.value, FieldTypes.COMBO, 40, 70, 200, 25),
-            FormField("second_name", FieldLabels.SECOND_NAME.value, FieldTypes.COMBO, 40, 110, 200, 25),
-            FormField("street", FieldLabels.STREET.value, FieldTypes.COMBO, 40, 150, 200, 25),
-            FormField("building", FieldLabels.BUILDING.value, FieldTypes.LINE, 40, 190, 200, 25),
-            FormField("building_korp", FieldLabels.BUILDING_KORP.value, FieldTypes.LINE, 40, 230, 200, 25),
-            FormField("apartment", FieldLabels.APARTMENT.value, FieldTypes.LINE, 40, 270, 200, 25),
-            FormField("phone", FieldLabels.PHONE.value, FieldTypes.LINE, 40, 310, 200, 25),
+            FormField("fam", FieldLabels.FAM.value, FieldTypes.COMBO, 150, 30, 200, 25),
+            FormField("name", FieldLabels.NAME.value, FieldTypes.COMBO, 150, 70, 200, 25),
+            FormField("second_name", FieldLabels.SECOND_NAME.value, FieldTypes.COMBO, 150, 110, 200, 25),
+            FormField("street", FieldLabels.STREET.value, FieldTypes.COMBO, 150, 150, 200, 25),
+            FormField("building", FieldLabels.BUILDING.value, FieldTypes.LINE, 150, 190, 200, 25),
+            FormField("building_korp", FieldLabels.BUILDING_KORP.value, FieldTypes.LINE, 150, 230, 200, 25),
+            FormField("apartment", FieldLabels.APARTMENT.value, FieldTypes.LINE, 150, 270, 200, 25),
+            FormField("phone", FieldLabels.PHONE.value, FieldTypes.LINE, 150, 310, 200, 25),
         ]
 
         for field in self.fields:
+            self.form_manager.create_label(
+                self, field.label_text, QtCore.QRect(20, field.y, 120, field.height)
+            )
             self.form_manager.create_input_field(
                 self, field.field_type, field.name,
                 QtCore.QRect(field.x, field.y, field.width, field.height)
             )
 
+    def create_buttons(self):
+        """Создание кнопок: справочники рядом со списками, внизу - сохранение и отмена"""
+        self.ref_buttons = {}
+        for field in self.fields:
+            if field.field_type != FieldTypes.COMBO:
+                continue
+            button = self.form_manager.create_button(
+                self, "...",
+                QtCore.QRect(field.x + field.width + 10, field.y, field.height, field.height)
+            )
+            button.setMinimumSize(0, 0)
+            button.setToolTip(f"Справочник: {field.label_text}")
+            self.ref_buttons[field.name] = button
+
+        button_width = self.form_manager.config.button_min_width
+        button_height = self.form_manager.config.button_min_height
+        spacing = 20
+        start_x = (self.config.width - button_width * 2 - spacing) // 2
+        y = self.config.height - button_height - 20
+        self.ok_button = self.form_manager.create_button(
+            self, "Добавить", QtCore.QRect(start_x, y, button_width, button_height),
+            is_action_button=True
+        )
+        self.cancel_button = self.form_manager.create_button(
+            self, "Отмена",
+            QtCore.QRect(start_x + button_width + spacing, y, button_width, button_height),
+            color="#9E9E9E"
+        )
+
+    def open_reference_dialog(self, ref_type: str):
+        """Редактирование справочника; после закрытия списки формы перечитываются"""
+        # Импорт здесь: диалог справочника нужен не при каждом добавлении
+        from windows.reference_dialog import ReferenceDialog
+        ReferenceDialog(self.db, ref_type, self, self.executor).exec_()
+        self.load_reference_data()
+
     def load_reference_data(self):
         """Загрузка данных для справочников"""
-        try:
-            for field in self.fields:
-                if field.field_type == FieldTypes.COMBO:
-                    data = self.db.get_reference_data(field.name)
-                    combo = self.form_manager.widgets[field.name]
-                    combo.addItems([""] + [str(item[1]) for item in data])
-        except Exception as e:
-            logging.error(f"Error loading reference data: {e}")
-            self.show_error("Ошибка загрузки справочных данных")
+        combo_fields = [field.name for field in self.fields
+                        if field.field_type == FieldTypes.COMBO]
+        # Все справочники формы - одним запросом в фоновом потоке
+        self.executor.submit(
+            "insert_dialog:references", self.db.get_reference_bundle, combo_fields,
+            on_finished=self.fill_reference_data,
+            on_failed=self.on_reference_data_failed
+        )
+
+    def fill_reference_data(self, bundle: dict):
+        """Заполнение списков загруженными справочниками"""
+        for name, data in bundle.items():
+            combo = self.form_manager.widgets[name]
+            # Перечитанный после правки справочника список сохраняет выбор
+            current = combo.currentText()
+            combo.set_values([str(item[1]) for item in data], add_empty=True)
+            if current:
+                combo.set_current_value(current)
+
+    def on_reference_data_failed(self, message: str):
+        logging.error(f"Error loading reference data: {message}")
+        self.show_error("Ошибка загрузки справочных данных")
 
     def accept(self):
         """Обработка принятия диалога"""
-        try:
-            data = self.collect_form_data()
-            if self.validate_data(data):
-                self.db.insert_record(data)
-                super().accept()
-            else:
-                self.show_error("Заполните все обязательные поля")
-        except Exception as e:
-            logging.error(f"Error inserting record: {e}")
-            self.show_error("Ошибка добавления записи")
+        data = self.collect_form_data()
+        if not self.validate_data(data):
+            self.show_error("Заполните все обязательные поля")
+            return
+
+        self.set_busy(True)
+        self.executor.submit(
+            None, self.db.insert_record, data,
+            on_finished=self.on_saved,
+            on_failed=self.on_save_failed
+        )
+
+    def on_saved(self, _result):
+        self.set_busy(False)
+        super().accept()
+
+    def on_save_failed(self, message: str):
+        self.set_busy(False)
+        logging.error(f"Error inserting record: {message}")
+        self.show_error("Ошибка добавления записи")
+
+    def set_busy(self, busy: bool):
+        """Блокировка формы на время фоновой операции"""
+        self.ok_button.setEnabled(not busy)
+        self.setCursor(QtCore.Qt.BusyCursor if busy else QtCore.Qt.ArrowCursor)
 
     def collect_form_data(self) -> PersonData:
         """Сбор данных с формы"""
@@ -87,14 +158,15 @@ class InsertDialog(QDialog):
         for field in self.fields:
             widget = self.form_manager.widgets[field.name]
             if field.field_type == FieldTypes.COMBO:
-                data[field.name] = widget.currentText()
+                # Текст справочника (пустой - NULL); в id его переводит DatabaseManager
+                data[ReferenceTables.from_key(field.name).person_field] = widget.currentText() or None
             else:
                 data[field.name] = widget.text()
         return PersonData(**data)
 
     def validate_data(self, data: PersonData) -> bool:
         """Валидация данных формы"""
-        required_fields = ['fam', 'name', 'street', 'building']
+        required_fields = ['fam_id', 'name_id', 'street_id', 'building']
         return all(getattr(data, field) for field in required_fields)
 
     def show_error(self, message: str):
@@ -1,13 +1,56 @@
-from PyQt5.QtWidgets import (QMainWindow, QWidget, QPushButton, QTableWidget,
+from PyQt5.QtWidgets import (QMainWindow, QWidget, QPushButton, QTableView,
                              QVBoxLayout, QHBoxLayout, QFrame, QLabel,
-                             QTableWidgetItem, QSpacerItem, QSizePolicy)
-from PyQt5.QtCore import Qt, QSize
-from PyQt5.QtGui import QFont, QColor, QPalette
+                             QProgressBar, QMessageBox, QShortcut, QLineEdit, QDialog)
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QFont, QKeySequence
+from typing import Optional
+from utils.table_models import PersonTableModel
+from utils.enums import TableColumns, ReferenceTables, FieldLabels
+from utils.db_worker import DatabaseExecutor
+from database_config import DatabaseManager, DatabaseError
+from utils.local_snapshot import LocalSnapshot, SyncResult
+import itertools
+import logging
+
+# Ключ фоновой загрузки таблицы: новая загрузка или поиск вытесняет предыдущую
+LISTING_TASK = "main_window:listing"
+# Ключ фоновой синхронизации локального снимка
+SYNC_TASK = "main_window:sync"
+# Пауза после ввода перед поиском и минимальная длина строки поиска
+# (триграммные индексы работают начиная с трех символов)
+SEARCH_DEBOUNCE_MS = 300
+SEARCH_MIN_LENGTH = 3
+
+
+def read_head(open_cursor, count: int, *args):
+    """Открытие курсора и чтение первых count строк (в фоновом потоке)"""
+    cursor = open_cursor(*args, prefetch=count)
+    return cursor.fetch(count), cursor
 
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, db_manager: Optional[DatabaseManager] = None,
+                 executor: Optional[DatabaseExecutor] = None,
+                 snapshot: Optional[LocalSnapshot] = None):
         super().__init__()
+        self.db = db_manager
+        self.executor = executor or DatabaseExecutor.instance()
+        self.snapshot = snapshot
+        # Показан ли сейчас полный список из снимка (к нему применяются изменения)
+        self.showing_snapshot = False
+        # Метка запросов текущей загрузки списка: при замене загрузки ее
+        # запросы прерываются на сервере (DatabaseManager.cancel_queries)
+        self.listing_tags = itertools.count(1)
+        self.listing_tag: Optional[str] = None
+        # Уведомления об изменениях других клиентов и открытые справочники,
+        # которые по ним обновляются
+        self.change_listener = None
+        self.reference_dialogs = []
+        # Сортировка (TableColumns.db_field) и фильтры по колонкам, которые
+        # выполняет сервер
+        self.sort_field: Optional[str] = None
+        self.sort_descending = False
+        self.filters = {}
         self.setWindowTitle("Система управления базой данных")
         self.setMinimumSize(1000, 600)
         self.setup_ui()
@@ -34,6 +77,21 @@ class MainWindow(QMainWindow):
         button_layout = QHBoxLayout(button_frame)
         button_layout.setSpacing(10)
 
+        # Поиск по мере ввода
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Фамилия, имя, улица или телефон")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.setMinimumHeight(40)
+        self.search_edit.setFont(QFont("Arial", 10))
+        button_layout.addWidget(self.search_edit, 1)
+
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.run_search)
+        self.search_edit.textChanged.connect(self.search_timer.start)
+        self.search_edit.returnPressed.connect(self.run_search)
+
         # Создаем кнопки
         buttons = {
             'select': ('Поиск', '#4CAF50'),
@@ -62,9 +120,41 @@ class MainWindow(QMainWindow):
             setattr(self, f'btn_{name}', button)
 
         main_layout.addWidget(button_frame)
+        self.btn_select.clicked.connect(self.run_search)
+        self.btn_insert.clicked.connect(self.open_insert_dialog)
+        self.btn_update.clicked.connect(self.open_update_dialog)
+
+        # Меню справочников
+        references_menu = self.menuBar().addMenu("Справочники")
+        for ref in ReferenceTables:
+            action = references_menu.addAction(FieldLabels[ref.name].value)
+            action.triggered.connect(lambda _, key=ref.key: self.open_reference_dialog(key))
 
-        # Создаем таблицу
-        self.table = QTableWidget()
+        # Строка фильтров по колонкам таблицы
+        filter_layout = QHBoxLayout()
+        filter_layout.setSpacing(2)
+        self.filter_edits = {}
+        for column in TableColumns:
+            edit = QLineEdit()
+            edit.setPlaceholderText(column.title)
+            edit.setClearButtonEnabled(True)
+            edit.textChanged.connect(lambda _: self.filter_timer.start())
+            filter_layout.addWidget(edit)
+            self.filter_edits[column.db_field] = edit
+        main_layout.addLayout(filter_layout)
+
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.filter_timer.timeout.connect(self.apply_filters)
+
+        # Создаем таблицу: модель отдает только видимые строки
+        self.table = QTableView()
+        # Порции при прокрутке читаются в фоне, поток GUI не ждет сервер
+        self.model = PersonTableModel(parent=self, executor=self.executor)
+        self.model.rowsInserted.connect(self.on_rows_changed)
+        self.model.rowsRemoved.connect(self.on_rows_changed)
+        self.model.modelReset.connect(self.on_rows_changed)
         self.setup_table()
         main_layout.addWidget(self.table)
 
@@ -73,53 +163,339 @@ class MainWindow(QMainWindow):
         self.status_label = QLabel("Всего записей: 0")
         status_layout.addWidget(self.status_label)
 
+        # Индикатор фоновых операций с базой
+        self.progress = QProgressBar()
+        self.progress.setRange(0, 0)
+        self.progress.setMaximumWidth(150)
+        self.progress.setVisible(False)
+        self.executor.busy_changed.connect(self.progress.setVisible)
+        status_layout.addWidget(self.progress)
+
         # Кнопка обновления
-        refresh_button = QPushButton("Обновить")
-        refresh_button.setMaximumWidth(100)
-        status_layout.addWidget(refresh_button)
+        self.btn_refresh = QPushButton("Обновить")
+        self.btn_refresh.setMaximumWidth(100)
+        self.btn_refresh.clicked.connect(self.refresh_data)
+        status_layout.addWidget(self.btn_refresh)
 
         main_layout.addLayout(status_layout)
 
+        # Статистика запросов к базе
+        self.stats_shortcut = QShortcut(QKeySequence("Ctrl+Shift+D"), self)
+        self.stats_shortcut.activated.connect(self.show_query_stats)
+
     def setup_table(self):
         # Настройка таблицы
-        headers = ['Фамилия', 'Имя', 'Отчество', 'Улица',
-                   'Дом', 'Корпус', 'Квартира', 'Телефон']
-
-        self.table.setColumnCount(len(headers))
-        self.table.setHorizontalHeaderLabels(headers)
+        self.table.setModel(self.model)
 
         # Настройка внешнего вида таблицы
         self.table.setFrameShape(QFrame.NoFrame)
         self.table.setAlternatingRowColors(True)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setSelectionMode(QTableView.SingleSelection)
 
         # Растягиваем столбцы
         header = self.table.horizontalHeader()
-        for i in range(len(headers)):
+        for i in range(len(TableColumns)):
             header.setSectionResizeMode(i, header.Stretch)
 
         # Настройка заголовков
         header.setFont(QFont("Arial", 10, QFont.Bold))
         header.setFixedHeight(40)
 
-        # Настройка строк
-        self.table.verticalHeader().setVisible(False)
-        self.table.setRowHeight(0, 35)
+        # Щелчок по заголовку сортирует список на сервере; модель сама не сортирует
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(-1, Qt.AscendingOrder)
+        header.sortIndicatorChanged.connect(self.on_sort_changed)
 
-    def add_row_to_table(self, data):
-        """Добавление строки в таблицу"""
-        row = self.table.rowCount()
-        self.table.insertRow(row)
+        # Настройка строк: фиксированная высота, чтобы не измерять каждую строку
+        vertical_header = self.table.verticalHeader()
+        vertical_header.setVisible(False)
+        vertical_header.setSectionResizeMode(vertical_header.Fixed)
+        vertical_header.setDefaultSectionSize(35)
+
+    def load_snapshot(self) -> bool:
+        """Мгновенный показ списка из локального снимка, без обращения к серверу"""
+        if self.snapshot is None:
+            return False
+        try:
+            cursor = self.snapshot.open_listing()
+        except DatabaseError as e:
+            logging.warning(f"Local snapshot unavailable: {e}")
+            return False
+        if cursor is None:
+            return False
+        self.executor.cancel(LISTING_TASK)
+        self.interrupt_listing()
+        self.model.set_cursor(cursor)
+        self.showing_snapshot = True
+        return True
+
+    def load_data(self):
+        """Загрузка списка (с учетом поиска, сортировки и фильтров) с ленивой
+        подгрузкой строк
+
+        При наличии снимка полный список берется из него, а с сервера в фоне
+        приходят только изменения.
+        """
+        if self.db is None:
+            return
+        search = self.search_text()
+        if self.snapshot is not None and not search:
+            self.executor.submit(
+                SYNC_TASK, self.snapshot.sync, self.db,
+                on_finished=self.on_snapshot_synced,
+                on_failed=self.on_sync_failed
+            )
+            if not self.view_customized() and (self.showing_snapshot or self.load_snapshot()):
+                return
+        # Курсор и первая порция открываются в фоне; дальнейшие порции модель читает сама
+        open_cursor, args = self.listing_source()
+        self.executor.submit(
+            LISTING_TASK, self.db.run_cancellable, self.interrupt_listing(), open_cursor, *args,
+            prefetch=self.model.batch_size,
+            on_finished=self.set_server_cursor,
+            on_failed=self.on_load_failed,
+            on_stale=self.close_stale_cursor
+        )
+
+    def interrupt_listing(self) -> str:
+        """Прерывание на сервере запроса прежней загрузки списка
+
+        Вытесненный запрос иначе дочитывал бы ненужный результат. Прерывание
+        выполняется в фоне; возвращается метка для запросов новой загрузки.
+        """
+        if self.listing_tag is not None and self.db is not None:
+            self.executor.submit(None, self.db.cancel_queries, self.listing_tag)
+        self.listing_tag = f"{LISTING_TASK}:{next(self.listing_tags)}"
+        return self.listing_tag
+
+    def search_text(self) -> str:
+        """Строка поиска, если она достаточно длинная для выполнения"""
+        text = self.search_edit.text().strip()
+        return text if len(text) >= SEARCH_MIN_LENGTH else ""
+
+    def listing_source(self):
+        """Функция открытия курсора для того, что сейчас показано, и ее аргументы
+
+        Поиск, сортировка и фильтры выполняются сервером одним запросом.
+        """
+        search = self.search_text()
+        if self.view_customized():
+            # Строки читаются страницами
+            return self.db.open_person_view, (self.sort_field, self.sort_descending,
+                                              dict(self.filters), search)
+        if search:
+            return self.db.open_person_search, (search,)
+        return self.db.open_person_listing, ()
+
+    def refresh_data(self):
+        """Перечитывание показанного списка с изменением только отличающихся строк
+
+        Заново читается уже загруженная часть (не меньше одной порции);
+        остальное, как и раньше, подгружается при прокрутке.
+        """
+        if self.db is None:
+            return
+        if self.showing_snapshot:
+            # Изменения принесет синхронизация снимка
+            self.load_data()
+            return
+        open_cursor, args = self.listing_source()
+        count = max(self.model.rowCount(), self.model.batch_size)
+        self.executor.submit(
+            LISTING_TASK, self.db.run_cancellable, self.interrupt_listing(),
+            read_head, open_cursor, count, *args,
+            on_finished=self.on_refreshed,
+            on_failed=self.on_load_failed,
+            on_stale=lambda result: result[1].close()
+        )
+
+    def on_refreshed(self, result):
+        rows, cursor = result
+        self.showing_snapshot = False
+        self.model.update_rows(rows, None if cursor.exhausted else cursor)
 
-        for col, value in enumerate(data):
-            item = QTableWidgetItem(str(value))
-            item.setTextAlignment(Qt.AlignCenter)
-            self.table.setItem(row, col, item)
+    def view_customized(self) -> bool:
+        """Заданы ли сортировка или фильтры по колонкам"""
+        return self.sort_field is not None or bool(self.filters)
+
+    def on_sort_changed(self, section: int, order):
+        """Сортировка по колонке, заголовок которой выбран"""
+        if not 0 <= section < len(TableColumns):
+            return
+        self.sort_field = list(TableColumns)[section].db_field
+        self.sort_descending = order == Qt.DescendingOrder
+        self.load_data()
+
+    def apply_filters(self):
+        """Перечитывание списка с фильтрами из строки фильтров"""
+        self.filter_timer.stop()
+        filters = {field: edit.text().strip() for field, edit in self.filter_edits.items()
+                   if edit.text().strip()}
+        if filters != self.filters:
+            self.filters = filters
+            self.load_data()
+
+    def run_search(self):
+        """Поиск по введенной строке вместе с сортировкой и фильтрами;
+        устаревшие запросы вытесняются новыми"""
+        self.search_timer.stop()
+        if self.db is None:
+            return
+        text = self.search_edit.text().strip()
+        if text and len(text) < SEARCH_MIN_LENGTH:
+            self.executor.cancel(LISTING_TASK)
+            self.interrupt_listing()
+            return
+        self.load_data()
+
+    def set_server_cursor(self, cursor):
+        """Показ результата, загружаемого с сервера (список или поиск)"""
+        self.showing_snapshot = False
+        self.model.set_cursor(cursor)
+
+    def on_snapshot_synced(self, result: SyncResult):
+        """Применение изменений, принесенных синхронизацией снимка"""
+        if not self.showing_snapshot:
+            # Показан поиск или список с сервера; снимок пригодится при следующем запуске
+            return
+        if result.reload:
+            self.load_snapshot()
+        else:
+            self.model.apply_delta(result.upserts, result.deleted)
+
+    def on_sync_failed(self, message: str):
+        logging.warning(f"Local snapshot sync failed: {message}")
+
+    @staticmethod
+    def close_stale_cursor(cursor):
+        """Закрытие курсора, результат которого уже не нужен"""
+        cursor.close()
+
+    def on_load_failed(self, message: str):
+        logging.error(f"Error loading table data: {message}")
+        self.status_label.setText("Ошибка загрузки данных")
+
+    def on_startup_failed(self, message: str):
+        """Ошибка проверки подключения при запуске"""
+        logging.error(f"Database initialization failed: {message}")
+        QMessageBox.critical(self, "Ошибка", f"Не удалось подключиться к базе данных:\n{message}")
+
+    # Модули диалогов импортируются при первом открытии, а не при запуске
+
+    def open_insert_dialog(self):
+        """Добавление записи"""
+        if self.db is None:
+            return
+        from windows.insert_dialog import InsertDialog
+        dialog = InsertDialog(self.db, self, self.executor)
+        if dialog.exec_() == QDialog.Accepted:
+            self.refresh_data()
+
+    def open_update_dialog(self):
+        """Изменение выбранной записи"""
+        if self.db is None:
+            return
+        rows = self.table.selectionModel().selectedRows()
+        if not rows:
+            QMessageBox.information(self, "Изменение", "Выберите запись в таблице")
+            return
+        row = rows[0].row()
+        from windows.update_dialog import UpdateDialog
+        dialog = UpdateDialog(self.db, self.model.row_values(row), self, self.executor,
+                              person_id=self.model.row_id(row))
+        if dialog.exec_() == QDialog.Accepted:
+            self.refresh_data()
+
+    def open_reference_dialog(self, ref_type: str):
+        """Редактирование справочника"""
+        if self.db is None:
+            return
+        from windows.reference_dialog import ReferenceDialog
+        dialog = ReferenceDialog(self.db, ref_type, self, self.executor)
+        self.reference_dialogs.append(dialog)
+        try:
+            dialog.exec_()
+        finally:
+            self.reference_dialogs.remove(dialog)
+        self.refresh_data()
+
+    def start_change_listener(self):
+        """Подписка на уведомления об изменениях в базе (только PostgreSQL)"""
+        config = self.db.config if self.db is not None else None
+        if (config is None or self.change_listener is not None or config.driver != "postgresql"
+                or not config.change_notifications_enabled):
+            return
+        from utils.change_listener import ChangeListener
+        self.change_listener = ChangeListener(config, config.change_notify_debounce_ms, parent=self)
+        self.change_listener.changed.connect(self.on_remote_changes)
+        # Пока соединения не было, уведомления терялись
+        self.change_listener.reconnected.connect(self.refresh_data)
+        self.change_listener.start()
+
+    def on_remote_changes(self, batch):
+        """Точечное применение пачки изменений, пришедших по уведомлениям"""
+        for key in batch.references:
+            self.db.reference_changed(key)
+        if batch.upserted or batch.deleted or batch.reload:
+            self.db.tables_changed("person")
+        for dialog in self.reference_dialogs:
+            if dialog.ref_type in batch.references:
+                dialog.load_reference_data()
+
+        if batch.reload or batch.renamed:
+            # Изменилось отображение многих строк: перечитываем текущий вид
+            self.refresh_data()
+        elif batch.upserted or batch.deleted:
+            if self.showing_snapshot:
+                # Синхронизация снимка принесет ровно эти изменения
+                self.load_data()
+                return
+            upserted, deleted = set(batch.upserted), set(batch.deleted)
+            self.executor.submit(
+                None, self.db.get_person_rows, upserted,
+                on_finished=lambda rows: self.apply_remote_rows(rows, upserted, deleted),
+                on_failed=self.on_load_failed
+            )
+
+    def apply_remote_rows(self, rows, upserted, deleted):
+        """Применение перечитанных строк к показанному списку или результату поиска"""
+        # Строки, которые уже не удалось прочитать, удалены
+        deleted = deleted | (upserted - {row[0] for row in rows})
+        if self.search_edit.text().strip() or self.view_customized():
+            # В результат поиска или отфильтрованный и отсортированный список новые
+            # строки не добавляются: они могут ему не соответствовать
+            loaded = set(self.model.loaded_keys())
+            rows = [row for row in rows if row[0] in loaded]
+        self.model.apply_delta(rows, deleted)
+
+    def closeEvent(self, event):
+        if self.change_listener is not None:
+            self.change_listener.stop()
+        super().closeEvent(event)
+
+    def add_row_to_table(self, data, row_id=None):
+        """Добавление строки в таблицу"""
+        self.model.append_row(data, row_id)
 
     def clear_table(self):
         """Очистка таблицы"""
-        self.table.setRowCount(0)
+        self.model.clear()
+
+    def on_rows_changed(self, *args):
+        """Обновление счетчика загруженных строк"""
+        self.update_status(self.model.rowCount())
+
+    def show_query_stats(self):
+        """Вывод текущей статистики запросов в журнал и в окно"""
+        if self.db is None:
+            return
+        report = self.db.dump_query_stats()
+        logging.info(f"Query statistics:\n{report}")
+        box = QMessageBox(QMessageBox.Information, "Статистика запросов", report, parent=self)
+        box.setStyleSheet("QLabel { font-family: monospace; }")
+        box.exec_()
 
     def update_status(self, count):
         """Обновление статуса"""
@@ -4,19 +4,23 @@ from PyQt5.QtCore import Qt
 from utils.form_managers import FormManager
 from models.window_configs import ReferenceDialogConfig
 from utils.enums import FieldTypes
+from utils.db_worker import DatabaseExecutor
 from database_config import DatabaseManager
+from typing import Optional
 import logging
 
 
 class ReferenceDialog(QDialog):
     """Диалог для работы со справочниками"""
 
-    def __init__(self, db_manager: DatabaseManager, ref_type: str, parent=None):
+    def __init__(self, db_manager: DatabaseManager, ref_type: str, parent=None,
+                 executor: Optional[DatabaseExecutor] = None):
         super().__init__(parent)
         self.db = db_manager
+        self.executor = executor or DatabaseExecutor.instance()
         self.ref_type = ref_type
         self.config = ReferenceDialogConfig()
-        self.form_manager = FormManager(self.config)
+        self.form_manager = FormManager()
         self.setup_ui()
         self.load_reference_data()
 
@@ -87,64 +91,77 @@ class ReferenceDialog(QDialog):
 
     def load_reference_data(self):
         """Загрузка данных справочника"""
-        try:
-            data = self.db.get_reference_data(self.ref_type)
-            self.where_combo.clear()
-            self.where_combo.addItems([item[1] for item in data])
-        except Exception as e:
-            logging.error(f"Error loading reference data: {e}")
-            self.show_error("Ошибка загрузки данных справочника")
+        self.executor.submit(
+            f"reference_dialog:{self.ref_type}", self.db.get_reference_data, self.ref_type,
+            on_finished=self.fill_reference_data,
+            on_failed=self.on_load_failed
+        )
 
-    def update_reference(self):
-        """Обновление значения в справочнике"""
-        try:
-            old_value = self.where_combo.currentText()
-            new_value = self.new_value_edit.text().strip()
+    def fill_reference_data(self, data: list):
+        """Заполнение списка значений справочника"""
+        self.where_combo.set_values([item[1] for item in data])
 
-            if not old_value or not new_value:
-                self.show_error("Выберите значение для обновления и введите новое значение")
-                return
+    def on_load_failed(self, message: str):
+        logging.error(f"Error loading reference data: {message}")
+        self.show_error("Ошибка загрузки данных справочника")
 
-            if self.confirm_operation("обновить"):
-                self.db.update_reference(self.ref_type, old_value, new_value)
-                self.load_reference_data()
+    def run_operation(self, func, *args, error_message: str, clear_input: bool = True):
+        """Фоновое изменение справочника с последующим обновлением списка"""
+        def on_finished(_result):
+            self.set_busy(False)
+            if clear_input:
                 self.new_value_edit.clear()
+            self.load_reference_data()
+
+        def on_failed(message: str):
+            self.set_busy(False)
+            logging.error(f"Error changing reference: {message}")
+            self.show_error(error_message)
+
+        self.set_busy(True)
+        self.executor.submit(None, func, self.ref_type, *args,
+                             on_finished=on_finished, on_failed=on_failed)
+
+    def set_busy(self, busy: bool):
+        """Блокировка кнопок на время фоновой операции"""
+        for button in (self.update_button, self.delete_button, self.insert_button):
+            button.setEnabled(not busy)
+        self.setCursor(Qt.BusyCursor if busy else Qt.ArrowCursor)
 
-        except Exception as e:
-            logging.error(f"Error updating reference: {e}")
-            self.show_error("Ошибка обновления значения")
+    def update_reference(self):
+        """Обновление значения в справочнике"""
+        old_value = self.where_combo.currentText()
+        new_value = self.new_value_edit.text().strip()
+
+        if not old_value or not new_value:
+            self.show_error("Выберите значение для обновления и введите новое значение")
+            return
+
+        if self.confirm_operation("обновить"):
+            self.run_operation(self.db.update_reference, old_value, new_value,
+                               error_message="Ошибка обновления значения")
 
     def delete_reference(self):
         """Удаление значения из справочника"""
-        try:
-            value = self.where_combo.currentText()
-            if not value:
-                self.show_error("Выберите значение для удаления")
-                return
+        value = self.where_combo.currentText()
+        if not value:
+            self.show_error("Выберите значение для удаления")
+            return
 
-            if self.confirm_operation("удалить"):
-                self.db.delete_reference(self.ref_type, value)
-                self.load_reference_data()
-
-        except Exception as e:
-            logging.error(f"Error deleting reference: {e}")
-            self.show_error("Ошибка удаления значения")
+        if self.confirm_operation("удалить"):
+            self.run_operation(self.db.delete_reference, value,
+                               error_message="Ошибка удаления значения",
+                               clear_input=False)
 
     def insert_reference(self):
         """Добавление нового значения в справочник"""
-        try:
-            value = self.new_value_edit.text().strip()
-            if not value:
-                self.show_error("Введите новое значение")
-                return
-
-            self.db.insert_reference(self.ref_type, value)
-            self.load_reference_data()
-            self.new_value_edit.clear()
+        value = self.new_value_edit.text().strip()
+        if not value:
+            self.show_error("Введите новое значение")
+            return
 
-        except Exception as e:
-            logging.error(f"Error inserting reference: {e}")
-            self.show_error("Ошибка добавления значения")
+        self.run_operation(self.db.insert_reference, value,
+                           error_message="Ошибка добавления значения")
 
     def confirm_operation(self, operation: str) -> bool:
         """Подтверждение операции"""
@@ -1,25 +1,38 @@
 from PyQt5 import QtCore
-from PyQt5.QtWidgets import QDialog, QMessageBox
+from PyQt5.QtWidgets import QComboBox, QDialog, QMessageBox
 from utils.form_managers import FormManager
 from models.window_configs import UpdateDialogConfig
-from models.data_models import PersonData
-from utils.enums import FieldTypes, FieldLabels
-from database_config import DatabaseManager
+from models.data_models import FormField, PersonData
+from utils.enums import FieldTypes, FieldLabels, ReferenceTables
+from utils.db_worker import DatabaseExecutor
+from database_config import DatabaseManager, ConcurrentModificationError
+from dataclasses import fields
+from typing import Optional
 import logging
 
 
 class UpdateDialog(QDialog):
     """Диалог обновления записи"""
 
-    def __init__(self, db_manager: DatabaseManager, current_data: list, parent=None):
+    def __init__(self, db_manager: DatabaseManager, current_data: list, parent=None,
+                 executor: Optional[DatabaseExecutor] = None,
+                 person_id: Optional[int] = None):
         super().__init__(parent)
         self.db = db_manager
+        self.executor = executor or DatabaseExecutor.instance()
         self.current_data = current_data
+        # Первичный ключ изменяемой записи и версия строки на момент открытия
+        self.person_id = person_id
+        self.row_version: Optional[int] = None
+        # Сохранение по ключу доступно только после чтения версии строки,
+        # иначе изменение прошло бы без проверки одновременных изменений
+        self.version_loaded = person_id is None
         self.config = UpdateDialogConfig()
-        self.form_manager = FormManager(self.config)
+        self.form_manager = FormManager()
         self.setup_ui()
         self.load_reference_data()
         self.fill_current_data()
+        self.load_row_version()
 
     def setup_ui(self):
         """Настройка интерфейса"""
@@ -38,51 +51,199 @@ class UpdateDialog(QDialog):
         # Подключение обработчиков
         self.ok_button.clicked.connect(self.accept)
         self.cancel_button.clicked.connect(self.reject)
+        self.ok_button.setEnabled(self.version_loaded)
 
     def create_headers(self):
         """Создание заголовков для старых и новых значений"""
         self.old_values_label = self.form_manager.create_label(
             self, "Текущие значения",
-            QtCore.QRect(180, 10, 200, 30),
+            QtCore.QRect(170, 10, 160, 30),
             font_size=11
         )
         self.new_values_label = self.form_manager.create_label(
             self, "Новые значения",
-            QtCore.QRect(370, 10, 200, 30),
+            QtCore.QRect(340, 10, 160, 30),
             font_size=11
         )
 
+    def create_form_fields(self):
+        """Создание полей: слева текущие значения (только чтение), справа новые"""
+        self.fields = [
+            FormField("fam", FieldLabels.FAM.value, FieldTypes.COMBO, 170, 50, 160, 25),
+            FormField("name", FieldLabels.NAME.value, FieldTypes.COMBO, 170, 90, 160, 25),
+            FormField("second_name", FieldLabels.SECOND_NAME.value, FieldTypes.COMBO, 170, 130, 160, 25),
+            FormField("street", FieldLabels.STREET.value, FieldTypes.COMBO, 170, 170, 160, 25),
+            FormField("building", FieldLabels.BUILDING.value, FieldTypes.LINE, 170, 210, 160, 25),
+            FormField("building_korp", FieldLabels.BUILDING_KORP.value, FieldTypes.LINE, 170, 250, 160, 25),
+            FormField("apartment", FieldLabels.APARTMENT.value, FieldTypes.LINE, 170, 290, 160, 25),
+            FormField("phone", FieldLabels.PHONE.value, FieldTypes.LINE, 170, 330, 160, 25),
+        ]
+
+        for field in self.fields:
+            self.form_manager.create_label(
+                self, field.label_text, QtCore.QRect(20, field.y, 140, field.height)
+            )
+            # Текущее значение - текст строки списка, справочник для него не нужен
+            old_widget = self.form_manager.create_input_field(
+                self, FieldTypes.LINE, f"{field.name}_old",
+                QtCore.QRect(field.x, field.y, field.width, field.height)
+            )
+            old_widget.setReadOnly(True)
+            self.form_manager.create_input_field(
+                self, field.field_type, f"{field.name}_new",
+                QtCore.QRect(field.x + field.width + 10, field.y, field.width, field.height)
+            )
+
+    def create_buttons(self):
+        """Создание кнопок сохранения и отмены"""
+        button_width = self.form_manager.config.button_min_width
+        button_height = self.form_manager.config.button_min_height
+        spacing = 20
+        start_x = (self.config.width - button_width * 2 - spacing) // 2
+        y = self.config.height - button_height - 20
+        self.ok_button = self.form_manager.create_button(
+            self, "Сохранить", QtCore.QRect(start_x, y, button_width, button_height),
+            is_action_button=True
+        )
+        self.cancel_button = self.form_manager.create_button(
+            self, "Отмена",
+            QtCore.QRect(start_x + button_width + spacing, y, button_width, button_height),
+            color="#9E9E9E"
+        )
+
+    def load_reference_data(self):
+        """Загрузка справочников для новых значений (одним запросом в фоне)"""
+        combo_fields = [field.name for field in self.fields
+                        if field.field_type == FieldTypes.COMBO]
+        self.executor.submit(
+            "update_dialog:references", self.db.get_reference_bundle, combo_fields,
+            on_finished=self.fill_reference_data,
+            on_failed=self.on_reference_data_failed
+        )
+
+    def fill_reference_data(self, bundle: dict):
+        """Заполнение списков; в них выбираются текущие значения записи"""
+        for name, data in bundle.items():
+            combo = self.form_manager.widgets[f"{name}_new"]
+            combo.set_values([str(item[1]) for item in data], add_empty=True)
+        self.fill_current_data()
+
+    def on_reference_data_failed(self, message: str):
+        logging.error(f"Error loading reference data: {message}")
+        self.show_error("Ошибка загрузки справочных данных")
+
     def fill_current_data(self):
-        """Заполнение текущих значений"""
+        """Заполнение текущих значений; новые значения по умолчанию равны им"""
         for i, field in enumerate(self.fields):
             if i < len(self.current_data):
-                old_widget = self.form_manager.widgets[f"{field.name}_old"]
+                value = self.current_data[i] or ""
+                self.form_manager.widgets[f"{field.name}_old"].setText(value)
+                new_widget = self.form_manager.widgets[f"{field.name}_new"]
                 if field.field_type == FieldTypes.COMBO:
-                    index = old_widget.findText(self.current_data[i])
-                    old_widget.setCurrentIndex(index if index >= 0 else 0)
+                    new_widget.set_current_value(value)
                 else:
-                    old_widget.setText(self.current_data[i])
+                    new_widget.setText(value)
+
+    def collect_form_data(self, side: str) -> PersonData:
+        """Сбор значений одной колонки формы (side: old - текущие, new - новые)"""
+        data = {}
+        for field in self.fields:
+            widget = self.form_manager.widgets[f"{field.name}_{side}"]
+            text = widget.currentText() if isinstance(widget, QComboBox) else widget.text()
+            if field.field_type == FieldTypes.COMBO:
+                # Текст справочника (пустой - NULL); в id его переводит DatabaseManager
+                data[ReferenceTables.from_key(field.name).person_field] = text or None
+            else:
+                data[field.name] = text
+        return PersonData(**data)
+
+    def load_row_version(self):
+        """Чтение версии строки для проверки одновременных изменений"""
+        if self.person_id is None:
+            return
+        self.executor.submit(
+            f"update_dialog:version:{self.person_id}", self.db.get_person, self.person_id,
+            on_finished=self.on_row_version_loaded,
+            on_failed=self.on_row_version_failed
+        )
+
+    def on_row_version_loaded(self, person):
+        if person is None:
+            self.show_error("Запись удалена другим пользователем. Обновите список")
+            return
+        # None - версий строк в схеме нет, проверять нечего
+        self.row_version = person[1]
+        self.version_loaded = True
+        self.ok_button.setEnabled(True)
+
+    def on_row_version_failed(self, message: str):
+        logging.error(f"Row version unavailable: {message}")
+        self.show_error("Не удалось прочитать запись. Закройте окно и повторите изменение")
 
     def accept(self):
         """Обработка принятия диалога"""
+        if not self.version_loaded:
+            return
+        old_data = self.collect_form_data("old")
+        new_data = self.collect_form_data("new")
+
+        if not self.validate_changes(old_data, new_data):
+            self.show_error("Нет изменений для сохранения")
+            return
+
+        self.set_busy(True)
+        if self.person_id is None:
+            # Запись без ключа ищется по всем старым значениям
+            self.executor.submit(
+                None, self.db.update_record, old_data, new_data,
+                on_finished=self.on_saved,
+                on_failed=self.on_save_failed
+            )
+            return
+
+        # Изменение по первичному ключу: отправляются только изменившиеся поля
+        changes = {
+            field.name: getattr(new_data, field.name)
+            for field in fields(new_data)
+            if getattr(old_data, field.name) != getattr(new_data, field.name)
+        }
+        self.executor.submit(
+            None, self.save_changes, changes,
+            on_finished=self.on_saved,
+            on_failed=self.on_save_failed
+        )
+
+    def save_changes(self, changes: dict) -> bool:
+        """Изменение записи по ключу (в фоне); False - запись уже изменил другой клиент"""
         try:
-            old_data = self.collect_form_data("old")
-            new_data = self.collect_form_data("new")
+            self.db.update_person(self.person_id, changes, self.row_version)
+        except ConcurrentModificationError as e:
+            logging.warning(f"Update rejected: {e}")
+            return False
+        return True
 
-            if self.validate_changes(old_data, new_data):
-                self.db.update_record(old_data, new_data)
-                super().accept()
-            else:
-                self.show_error("Нет изменений для сохранения")
-        except Exception as e:
-            logging.error(f"Error updating record: {e}")
-            self.show_error("Ошибка обновления записи")
+    def on_saved(self, result):
+        self.set_busy(False)
+        if self.person_id is not None and result is False:
+            self.show_error("Запись изменена другим пользователем. Обновите список и повторите изменение")
+            return
+        super().accept()
+
+    def on_save_failed(self, message: str):
+        self.set_busy(False)
+        logging.error(f"Error updating record: {message}")
+        self.show_error("Ошибка обновления записи")
+
+    def set_busy(self, busy: bool):
+        """Блокировка формы на время фоновой операции"""
+        self.ok_button.setEnabled(not busy and self.version_loaded)
+        self.setCursor(QtCore.Qt.BusyCursor if busy else QtCore.Qt.ArrowCursor)
 
     def validate_changes(self, old_data: PersonData, new_data: PersonData) -> bool:
         """Проверка наличия изменений"""
         return any(
-            getattr(old_data, field) != getattr(new_data, field)
-            for field in vars(old_data)
+            getattr(old_data, field.name) != getattr(new_data, field.name)
+            for field in fields(old_data)
         )
 
     def show_error(self, message: str):